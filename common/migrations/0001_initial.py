@@ -0,0 +1,25 @@
+# Generated by Django 5.1.1 on 2026-10-18 05:37
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    initial = True
+
+    dependencies = []
+
+    operations = [
+        migrations.CreateModel(
+            name="MediaBlob",
+            fields=[
+                ("id", models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name="ID")),
+                ("name", models.CharField(max_length=255, unique=True)),
+                ("references", models.PositiveIntegerField(default=0)),
+            ],
+            options={
+                "verbose_name": "Media blob",
+                "verbose_name_plural": "Media blobs",
+                "db_table": "media_blobs",
+            },
+        ),
+    ]
@@ -0,0 +1,16 @@
+from django.db import models
+from django.utils.translation import gettext_lazy as _
+
+
+class MediaBlob(models.Model):
+    name = models.CharField(max_length=255, unique=True)
+    references = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        verbose_name = _("Media blob")
+        verbose_name_plural = _("Media blobs")
+
+        db_table = "media_blobs"
+
+    def __str__(self):
+        return f"{self.name} ({self.references} references)"
@@ -0,0 +1,104 @@
+import json
+import typing
+
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+from rest_framework import pagination
+from rest_framework.exceptions import NotFound
+
+UNIQUE_ORDERINGS = {"id", "-id", "pk", "-pk"}
+
+
+class CursorPagination(pagination.CursorPagination):
+    # Positions hold a value of every ordering field and non-unique orderings get the primary key as the last one,
+    # so pages are split by `(value, pk)` keys instead of DRF's offsets over ties.
+    ordering = "-id"
+
+    def get_ordering(self, request, queryset, view) -> typing.Tuple[str, ...]:
+        ordering = getattr(view, "pagination_ordering", self.ordering)
+        ordering = (ordering,) if isinstance(ordering, str) else tuple(ordering)
+        if UNIQUE_ORDERINGS & set(ordering):
+            return ordering
+        return *ordering, "-pk" if ordering[0].startswith("-") else "pk"
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        if not self.page_size:
+            return None
+
+        self.base_url = request.build_absolute_uri()
+        self.ordering = self.get_ordering(request, queryset, view)
+        self.cursor = self.decode_cursor(request)
+        reverse, current_position = (self.cursor.reverse, self.cursor.position) if self.cursor else (False, None)
+
+        ordering = pagination._reverse_ordering(self.ordering) if reverse else self.ordering
+        queryset = queryset.order_by(*ordering)
+        if current_position is not None:
+            try:
+                queryset = queryset.filter(self._get_keyset_lookup(current_position, reverse))
+            except (TypeError, ValueError, ValidationError):
+                raise NotFound(self.invalid_cursor_message)
+
+        results = list(queryset[: self.page_size + 1])
+        self.page = results[: self.page_size]
+        following_position = (
+            self._get_position_from_instance(results[-1], self.ordering) if len(results) > len(self.page) else None
+        )
+
+        if reverse:
+            self.page.reverse()
+            self.has_next, self.next_position = current_position is not None, current_position
+            self.has_previous, self.previous_position = following_position is not None, following_position
+        else:
+            self.has_next, self.next_position = following_position is not None, following_position
+            self.has_previous, self.previous_position = current_position is not None, current_position
+
+        if (self.has_previous or self.has_next) and self.template is not None:
+            self.display_page_controls = True
+        return self.page
+
+    def get_next_link(self) -> typing.Optional[str]:
+        if not self.has_next:
+            return None
+        position = self.next_position
+        if self.page:
+            position = self._get_position_from_instance(self.page[-1], self.ordering)
+        return self.encode_cursor(pagination.Cursor(offset=0, reverse=False, position=position))
+
+    def get_previous_link(self) -> typing.Optional[str]:
+        if not self.has_previous:
+            return None
+        position = (
+            self._get_position_from_instance(self.page[0], self.ordering) if self.page else self.previous_position
+        )
+        return self.encode_cursor(pagination.Cursor(offset=0, reverse=True, position=position))
+
+    def decode_cursor(self, request) -> typing.Optional[pagination.Cursor]:
+        cursor = super().decode_cursor(request)
+        if cursor is None or cursor.position is None:
+            return cursor
+
+        try:
+            values = json.loads(cursor.position)
+        except ValueError:
+            raise NotFound(self.invalid_cursor_message)
+        if not isinstance(values, list) or len(values) != len(self.ordering):
+            raise NotFound(self.invalid_cursor_message)
+        return cursor
+
+    def _get_keyset_lookup(self, position: str, reverse: bool) -> Q:
+        # Row comparison `(a, b, pk) < (x, y, z)` spelled out per field, so every field keeps its own direction.
+        values = json.loads(position)
+        lookup, equal = Q(), Q()
+        for field, value in zip(self.ordering, values):
+            operator = "lt" if field.startswith("-") != reverse else "gt"
+            field = field.lstrip("-")
+            lookup |= equal & Q(**{f"{field}__{operator}": value})
+            equal &= Q(**{field: value})
+        return lookup
+
+    def _get_position_from_instance(self, instance, ordering) -> str:
+        fields = (field.lstrip("-") for field in ordering)
+        values = (instance[field] if isinstance(instance, dict) else getattr(instance, field) for field in fields)
+        return json.dumps([str(value) for value in values])
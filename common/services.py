@@ -1,7 +1,13 @@
+import time
 import typing
 from datetime import datetime
 
 import pytz
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Count, F, Model, OuterRef, Q, Subquery, Value
+from django.db.models.functions import Coalesce, Greatest
 from django.utils.timesince import timesince
 
 
@@ -11,3 +17,68 @@ def datetime_to_timezone(
     dt = pytz.timezone(timezone).localize(datetime(dt.year, dt.month, dt.day, dt.hour, dt.minute, dt.second))
     time = timesince(dt + dt.utcoffset()) if to_timesince else (dt + dt.utcoffset()).strftime("%H:%M %d.%m.%Y")
     return {attribute_name: time, "timezone": timezone}
+
+
+def increment_counter(model: typing.Type[Model], pk: int, field: str, delta: int) -> None:
+    model.objects.filter(pk=pk).update(**{field: Greatest(F(field) + delta, Value(0))})  # noqa
+
+
+def related_count_subquery(model: typing.Type[Model], field: str) -> Coalesce:
+    count = (
+        model.objects.filter(**{field: OuterRef("pk")})  # noqa
+        .order_by()
+        .values(field)
+        .annotate(count=Count("pk"))
+        .values("count")
+    )
+    return Coalesce(Subquery(count), Value(0))
+
+
+def reconcile_counters(model: typing.Type[Model], counters: typing.Dict[str, Coalesce], batch_size: int = 1000) -> int:
+    repaired = 0
+    last_pk = 0
+
+    while True:
+        pks = list(
+            model.objects.filter(pk__gt=last_pk).order_by("pk").values_list("pk", flat=True)[:batch_size]  # noqa
+        )
+        if not pks:
+            return repaired
+        last_pk = pks[-1]
+
+        drift = Q()
+        for field, expression in counters.items():
+            drift |= ~Q(**{field: expression})
+
+        with transaction.atomic():
+            repaired += model.objects.filter(drift, pk__in=pks).update(**counters)  # noqa
+
+
+def get_cache_version_key(name: str, pk: int) -> str:
+    return f"{name}{settings.USER_RELATED_CACHE_NAME_SEP}{pk}"
+
+
+def bump_cache_version(name: str, pk: int) -> None:
+    key = get_cache_version_key(name, pk)
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.set(key, time.time_ns(), settings.CACHE_VERSIONS_TIME)
+
+
+def get_cache_versions(name: str, pks: typing.Iterable[int]) -> typing.Dict[int, int]:
+    keys = {pk: get_cache_version_key(name, pk) for pk in set(pks)}
+    if not keys:
+        return {}
+
+    versions = cache.get_many(keys.values())
+
+    for key in keys.values():
+        if key not in versions:
+            # Seeded from the clock rather than 0, so an evicted version never matches data cached under the old one.
+            version = time.time_ns()
+            versions[key] = (
+                version if cache.add(key, version, settings.CACHE_VERSIONS_TIME) else cache.get(key, version)
+            )
+
+    return {pk: versions[key] for pk, key in keys.items()}
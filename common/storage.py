@@ -0,0 +1,64 @@
+import functools
+import hashlib
+import os
+import posixpath
+
+from django.conf import settings
+from django.core.files import File
+from django.core.files.storage import FileSystemStorage
+from django.core.files.utils import validate_file_name
+from django.db import transaction
+from django.db.models import F
+from django.utils.deconstruct import deconstructible
+
+from common.models import MediaBlob
+
+
+@deconstructible
+class ContentAddressedStorage(FileSystemStorage):
+    def get_content_name(self, name: str, content: File) -> str:
+        digest = hashlib.sha256()
+        for chunk in content.chunks():
+            digest.update(chunk)
+        digest = digest.hexdigest()
+
+        width = settings.MEDIA_SHARD_WIDTH
+        shards = (digest[index * width : (index + 1) * width] for index in range(settings.MEDIA_SHARD_DEPTH))
+        extension = os.path.splitext(name)[1].lower()
+        return posixpath.join(posixpath.dirname(name), *shards, f"{digest}{extension}")
+
+    def save(self, name, content, max_length=None):
+        if name is None:
+            name = content.name
+        if not hasattr(content, "chunks"):
+            content = File(content, name)
+
+        # Same content always gets the same name, so reposted files are stored once and only referenced again.
+        name = self.get_content_name(name, content)
+        validate_file_name(name, allow_relative_path=True)
+
+        with transaction.atomic():
+            blob, _ = MediaBlob.objects.select_for_update().get_or_create(name=name)  # noqa
+            if not self.exists(name):
+                name = self._save(name, content)
+            MediaBlob.objects.filter(pk=blob.pk).update(references=F("references") + 1)  # noqa
+
+        return name
+
+    def delete(self, name):
+        with transaction.atomic():
+            blob = MediaBlob.objects.select_for_update().filter(name=name).first()  # noqa
+            if blob is not None and blob.references > 1:
+                MediaBlob.objects.filter(pk=blob.pk).update(references=F("references") - 1)  # noqa
+                return
+            if blob is not None:
+                blob.delete()
+
+        transaction.on_commit(functools.partial(self._delete_unreferenced, name))
+
+    def _delete_unreferenced(self, name: str) -> None:
+        if not MediaBlob.objects.filter(name=name).exists():  # noqa
+            super().delete(name)
+
+
+content_addressed_storage = ContentAddressedStorage()
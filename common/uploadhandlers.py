@@ -0,0 +1,16 @@
+from django.conf import settings
+from django.core.files.uploadhandler import FileUploadHandler
+from rest_framework import serializers
+
+
+class MaxSizeUploadHandler(FileUploadHandler):
+    # Goes first, so oversized files are refused while the body is streamed instead of after it is fully stored.
+    def receive_data_chunk(self, raw_data, start):
+        if start + len(raw_data) > settings.IMAGE_UPLOAD_MAX_SIZE:
+            raise serializers.ValidationError(
+                {"detail": f"Image must be at most {settings.IMAGE_UPLOAD_MAX_SIZE} bytes.", "code": "invalid"}
+            )
+        return raw_data
+
+    def file_complete(self, file_size):
+        return None
@@ -7,7 +7,7 @@ os.environ.setdefault("DJANGO_SETTINGS_MODULE", "core.settings")
 
 app = Celery(
     "eXwonder",
-    include=["users.tasks", "notifications.tasks"],
+    include=["users.tasks", "notifications.tasks", "posts.tasks", "uploads.tasks", "media.tasks", "messenger.tasks"],
     broker=settings.CELERY_BROKER_URL,
     backend=settings.CELERY_RESULT_BACKEND,
 )
@@ -25,13 +25,52 @@ app.conf.task_queues = {
         "exchange": "low_priority",
         "routing_key": "low_priority",
     },
+    "images": {
+        "exchange": "images",
+        "routing_key": "images",
+    },
 }
 
 app.conf.task_routes = {
-    "users.tasks.make_center_crop": {"queue": "high_priority"},
+    "users.tasks.make_image_derivatives": {"queue": "images"},
     "users.tasks.send_reset_password_mail": {"queue": "normal_priority"},
     "users.tasks.send_2fa_code_mail_message": {"queue": "normal_priority"},
     "notifications.tasks.send_notifications": {"queue": "low_priority"},
+    "posts.tasks.fan_out_post": {"queue": "low_priority"},
+    "posts.tasks.publish_post": {"queue": "normal_priority"},
+    "posts.tasks.refresh_posts_liked_tops": {"queue": "low_priority"},
+    "posts.tasks.trim_posts_timelines": {"queue": "low_priority"},
+    "posts.tasks.build_posts_recommendations": {"queue": "low_priority"},
+    "uploads.tasks.remove_expired_upload_sessions": {"queue": "low_priority"},
+    "media.tasks.trim_image_resize_cache": {"queue": "low_priority"},
+    "messenger.tasks.flush_presence_changes": {"queue": "high_priority"},
+}
+
+app.conf.beat_schedule = {
+    "refresh-posts-liked-tops": {
+        "task": "posts.tasks.refresh_posts_liked_tops",
+        "schedule": settings.POSTS_LIKED_TOP_REFRESH_TIME,
+    },
+    "trim-posts-timelines": {
+        "task": "posts.tasks.trim_posts_timelines",
+        "schedule": settings.TIMELINE_TRIM_TIME,
+    },
+    "build-posts-recommendations": {
+        "task": "posts.tasks.build_posts_recommendations",
+        "schedule": settings.RECOMMENDATIONS_REFRESH_TIME,
+    },
+    "remove-expired-upload-sessions": {
+        "task": "uploads.tasks.remove_expired_upload_sessions",
+        "schedule": settings.UPLOADS_CLEANUP_TIME,
+    },
+    "trim-image-resize-cache": {
+        "task": "media.tasks.trim_image_resize_cache",
+        "schedule": settings.IMAGE_RESIZE_CACHE_TRIM_TIME,
+    },
+    "flush-presence-changes": {
+        "task": "messenger.tasks.flush_presence_changes",
+        "schedule": settings.PRESENCE_FLUSH_TIME,
+    },
 }
 
 app.autodiscover_tasks()
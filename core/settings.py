@@ -41,6 +41,8 @@ INSTALLED_APPS = [
     "posts.apps.PostsConfig",
     "notifications.apps.NotificationsConfig",
     "messenger.apps.MessengerConfig",
+    "uploads.apps.UploadsConfig",
+    "media.apps.MediaConfig",
 ]
 
 MIDDLEWARE = [
@@ -145,13 +147,43 @@ POSTS_RECENT_TOP_CACHE_NAME = "posts:recent"
 
 USER_UPDATES_CACHE_TIME = 60 * 10
 POSTS_RECENT_TOP_CACHE_TIME = 60 * 60
+POSTS_LIKED_TOP_CACHE_TIME = 60 * 15
+
+POSTS_LIKED_TOP_SIZE = 50
+POSTS_RECENT_TOP_SIZE = 50
+POSTS_LIKED_TOP_REFRESH_TIME = 60 * 5
+POSTS_LIKED_TOP_DEFAULT_WINDOW = "all"
+POSTS_LIKED_TOP_WINDOWS = {"24h": timedelta(hours=24), "7d": timedelta(days=7), "all": None}
+LEADERBOARD_REDIS_URL = env("LEADERBOARD_REDIS_URL", default="redis://localhost:6379/5")
+
+POSTS_FRAGMENT_CACHE_NAME = "posts:fragment"
+POSTS_FRAGMENT_VERSION_CACHE_NAME = "posts:version"
+USERS_FRAGMENT_VERSION_CACHE_NAME = "users:version"
+POSTS_FRAGMENT_CACHE_TIME = 60 * 60
+CACHE_VERSIONS_TIME = 60 * 60 * 24
+
+RECOMMENDED_CACHE_NAME = "recommended"
+RECOMMENDATIONS_CACHE_TIME = 60 * 60 * 6
+RECOMMENDATIONS_REFRESH_TIME = 60 * 60
+RECOMMENDATIONS_USER_REFRESH_DELAY = 60
+RECOMMENDATIONS_SIZE = 250
+RECOMMENDATIONS_CANDIDATES_COUNT = 5000
+RECOMMENDATIONS_USERS_BATCH_SIZE = 500
+RECOMMENDATIONS_LIKES_PERIOD = timedelta(days=90)
+RECOMMENDATIONS_POPULARITY_WEIGHT = 0.01
+
+SOCIAL_GRAPH_REDIS_URL = env("SOCIAL_GRAPH_REDIS_URL", default="redis://localhost:6379/3")
+SOCIAL_GRAPH_CACHE_NAME = "graph"
+SOCIAL_GRAPH_CACHE_TIME = 60 * 60 * 24
+SOCIAL_GRAPH_LOCAL_CACHE_SIZE = 10000
+SOCIAL_GRAPH_LOCAL_CACHE_TIME = 5
 
 REST_FRAMEWORK = {
     "DEFAULT_RENDERER_CLASSES": [
         "rest_framework.renderers.JSONRenderer",
     ],
     "DEFAULT_SCHEMA_CLASS": "drf_spectacular.openapi.AutoSchema",
-    "DEFAULT_PAGINATION_CLASS": "rest_framework.pagination.PageNumberPagination",
+    "DEFAULT_PAGINATION_CLASS": "common.pagination.CursorPagination",
     "DEFAULT_AUTHENTICATION_CLASSES": [
         "users.authentication.TokenAuthentication",
         "rest_framework.authentication.SessionAuthentication",
@@ -179,6 +211,8 @@ CUSTOM_USER_AVATARS_DIR = "avatars"
 POSTS_IMAGES_DIR = "posts_images"
 TEST_IMAGES_DIR = "test_images"
 MESSAGES_ATTACHMENTS_DIR = "messages_attachments"
+MEDIA_SHARD_DEPTH = 2
+MEDIA_SHARD_WIDTH = 2
 
 TOKEN_EXP_TIME = timedelta(days=30)
 LAST_LOGIN_UPDATE_TIME = timedelta(hours=1)
@@ -186,6 +220,68 @@ TWO_FACTOR_AUTHENTICATION_CODE_LENGTH = 5
 TWO_FACTOR_AUTHENTICATION_CODE_LIVETIME = 60 * 10  # seconds
 
 CROPPED_IMAGE_POSTFIX = "_crop"
+IMAGE_DERIVATIVES_DIR = "derivatives"
+IMAGE_DERIVATIVE_SIZES = {"thumb": 320, "feed": 1080, "full": 2048}
+IMAGE_DERIVATIVE_FORMATS = {"webp": "webp", "jpeg": "jpg"}
+IMAGE_DERIVATIVE_QUALITY = 80
+IMAGE_PLACEHOLDER_SIZE = 32
+IMAGE_PLACEHOLDER_COMPONENTS = (4, 3)
+IMAGE_DOMINANT_COLOR_PALETTE_SIZE = 8
+IMAGE_METADATA_BACKFILL_BATCH_SIZE = 500
+IMAGE_UPLOAD_FORMATS = ("JPEG", "PNG", "WEBP")
+IMAGE_UPLOAD_MAX_SIZE = 1024 * 1024 * 20
+FILE_UPLOAD_HANDLERS = [
+    "common.uploadhandlers.MaxSizeUploadHandler",
+    "django.core.files.uploadhandler.MemoryFileUploadHandler",
+    "django.core.files.uploadhandler.TemporaryFileUploadHandler",
+]
+IMAGE_MAX_PIXELS = 50_000_000
+IMAGE_PHASH_MAX_DISTANCE = 3
+IMAGE_COPIES_LIMIT = 100
+SIMILAR_INDEX_DIR = env("SIMILAR_INDEX_DIR", default=str(BASE_DIR / "similarindex"))
+SIMILAR_INDEX_SHARD_SIZE = 65536
+SIMILAR_INDEX_OVERFETCH = 4
+SIMILAR_POSTS_COUNT = 10
+IMAGE_RESIZE_WIDTHS = (64, 128, 256, 320, 480, 640, 828, 1080, 1280, 1600, 2048)
+IMAGE_RESIZE_CACHE_DIR = env("IMAGE_RESIZE_CACHE_DIR", default=str(BASE_DIR / "resizecache"))
+IMAGE_RESIZE_CACHE_MAX_SIZE = 1024 * 1024 * 1024 * 2
+IMAGE_RESIZE_CACHE_TRIM_RATIO = 0.9
+IMAGE_RESIZE_CACHE_TOUCH_INTERVAL = 60 * 60
+IMAGE_RESIZE_CACHE_SIZE_CACHE_NAME = "image_resize_cache_size"
+IMAGE_RESIZE_CACHE_TRIM_LOCK_NAME = "image_resize_cache_trim"
+IMAGE_RESIZE_CACHE_TRIM_LOCK_TIME = 60 * 10
+IMAGE_RESIZE_CACHE_TRIM_TIME = 60 * 60
+IMAGE_RESIZE_SENDFILE_INTERNAL_URL = "/internal/resizecache/"
+MEDIA_SENDFILE_HEADER = env("MEDIA_SENDFILE_HEADER", default="")
+MEDIA_SENDFILE_INTERNAL_URL = "/internal/media/"
+MEDIA_STREAM_BUFFER_SIZE = 1024 * 64
+
+UPLOADS_TEMP_DIR = env("UPLOADS_TEMP_DIR", default=str(BASE_DIR / "uploadfiles"))
+UPLOADS_MAX_SIZE = 1024 * 1024 * 50
+UPLOADS_MAX_CHUNK_SIZE = 1024 * 1024 * 8
+UPLOADS_STREAM_BUFFER_SIZE = 1024 * 64
+UPLOADS_SESSION_LIFETIME = timedelta(days=1)
+UPLOADS_CLEANUP_TIME = 60 * 60
+
+POSTS_STAGING_DIR = env("POSTS_STAGING_DIR", default=str(BASE_DIR / "stagingfiles"))
+
+COUNTERS_RECONCILE_BATCH_SIZE = 1000
+
+MESSAGES_HISTORY_PAGE_SIZE = 50
+MESSAGES_HISTORY_MAX_PAGE_SIZE = 200
+MESSAGES_UPLOAD_CHUNK_SIZE = 1024 * 256
+MESSAGES_INLINE_ATTACHMENTS = False
+
+PRESENCE_REDIS_URL = env("PRESENCE_REDIS_URL", default="redis://localhost:6379/4")
+PRESENCE_CACHE_NAME = "presence"
+PRESENCE_HEARTBEAT_INTERVAL = 30
+PRESENCE_TTL = PRESENCE_HEARTBEAT_INTERVAL * 3
+PRESENCE_FLUSH_TIME = 5
+
+TIMELINE_MAX_LENGTH = 500
+TIMELINE_FANOUT_BATCH_SIZE = 1000
+TIMELINE_TRIM_TIME = 60 * 60
+TIMELINE_FANOUT_FOLLOWERS_THRESHOLD = 10000
 
 EMAIL_HOST = "smtp.gmail.com"
 EMAIL_USE_TLS = True
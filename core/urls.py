@@ -4,16 +4,20 @@ from django.contrib import admin
 from django.urls import include, path
 from drf_spectacular.views import SpectacularAPIView, SpectacularSwaggerView
 
+from media.views import MediaFileAPIView
+
 urlpatterns = [
     path("admin/", admin.site.urls),
     path("api/v1/account/", include("users.urls")),
     path("api/v1/posts/", include("posts.urls")),
+    path("api/v1/uploads/", include("uploads.urls")),
+    path("api/v1/media/", include("media.urls")),
     path("api/v1/schema/", SpectacularAPIView.as_view(), name="schema"),
     path("api/v1/schema/docs/", SpectacularSwaggerView.as_view(url_name="schema"), name="schema-docs"),
+    path(f"{settings.MEDIA_URL.lstrip('/')}<path:path>", MediaFileAPIView.as_view(), name="media-file"),
 ]
 
 urlpatterns += static(settings.STATIC_URL, document_root=settings.STATIC_ROOT)
-urlpatterns += static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
 
 admin.site.site_header = "eXwonder administration"
 admin.site.index_title = "eXwonder"
@@ -0,0 +1,238 @@
+import fcntl
+import hashlib
+import mimetypes
+import os
+import posixpath
+import re
+import time
+import typing
+import uuid
+
+from django.conf import settings
+from django.core.cache import cache
+from django.http import FileResponse, Http404, HttpResponse, HttpResponseNotModified, StreamingHttpResponse
+from django.utils.http import http_date, parse_etags
+from rest_framework import serializers
+from rest_framework.request import Request
+
+from users.images import SAVE_OPTIONS, get_media_path, open_downscaled, resize_to_width
+from users.services import PathImageTypeEnum
+
+RESIZE_CONTENT_TYPES = {"webp": "image/webp", "jpeg": "image/jpeg"}
+PUBLIC_CACHE_CONTROL = "public, max-age=31536000, immutable"
+PRIVATE_CACHE_CONTROL = "private, max-age=3600"
+RANGE_PATTERN = re.compile(r"^bytes=(\d*)-(\d*)$")
+
+
+def normalize_image_path(path: str) -> str:
+    path = posixpath.normpath(path.lstrip("/"))
+    if path.startswith("..") or path.split("/", 1)[0] not in set(PathImageTypeEnum):
+        raise serializers.ValidationError({"detail": "Invalid image path.", "code": "invalid"})
+    if not os.path.isfile(get_media_path(path)):
+        raise Http404
+    return path
+
+
+def validate_resize_params(width: typing.Any, image_format: typing.Any) -> typing.Tuple[int, str]:
+    try:
+        width = int(width)
+    except (TypeError, ValueError):
+        width = 0
+
+    # Only fixed breakpoints are resized, so the cache holds a bounded number of variants of every image.
+    if width not in settings.IMAGE_RESIZE_WIDTHS:
+        raise serializers.ValidationError(
+            {"detail": f"Width must be one of {', '.join(map(str, settings.IMAGE_RESIZE_WIDTHS))}.", "code": "invalid"}
+        )
+    if image_format not in RESIZE_CONTENT_TYPES:
+        raise serializers.ValidationError(
+            {"detail": f"Format must be one of {', '.join(RESIZE_CONTENT_TYPES)}.", "code": "invalid"}
+        )
+
+    return width, image_format
+
+
+def get_resize_cache_key(path: str, width: int, image_format: str) -> str:
+    return hashlib.sha256(f"{path}:{width}:{image_format}".encode()).hexdigest()
+
+
+def get_resize_cache_path(key: str, image_format: str) -> str:
+    extension = settings.IMAGE_DERIVATIVE_FORMATS[image_format]
+    return os.path.join(settings.IMAGE_RESIZE_CACHE_DIR, key[:2], key[2:4], f"{key}.{extension}")
+
+
+def _touch(cache_path: str) -> bool:
+    # Modification time is the LRU clock. It is refreshed coarsely, so hot files don't write metadata on every hit.
+    try:
+        if time.time() - os.path.getmtime(cache_path) > settings.IMAGE_RESIZE_CACHE_TOUCH_INTERVAL:
+            os.utime(cache_path)
+    except FileNotFoundError:
+        return False
+    return True
+
+
+def _account_cache_size(size: int) -> None:
+    from media.tasks import trim_image_resize_cache
+
+    cache.add(settings.IMAGE_RESIZE_CACHE_SIZE_CACHE_NAME, 0, None)
+    total = cache.incr(settings.IMAGE_RESIZE_CACHE_SIZE_CACHE_NAME, size)
+    if total > settings.IMAGE_RESIZE_CACHE_MAX_SIZE and cache.add(
+        settings.IMAGE_RESIZE_CACHE_TRIM_LOCK_NAME, 1, settings.IMAGE_RESIZE_CACHE_TRIM_LOCK_TIME
+    ):
+        trim_image_resize_cache.apply_async(queue="low_priority")
+
+
+def _unlink_lock(lock: typing.IO, lock_path: str) -> None:
+    # Removed while still held and only if the path is still this lock, a waiter may have created a newer one.
+    try:
+        if os.path.samestat(os.fstat(lock.fileno()), os.stat(lock_path)):
+            os.unlink(lock_path)
+    except FileNotFoundError:
+        pass
+
+
+def get_resized_image(path: str, width: int, image_format: str) -> typing.Tuple[str, str]:
+    key = get_resize_cache_key(path, width, image_format)
+    cache_path = get_resize_cache_path(key, image_format)
+    if _touch(cache_path):
+        return cache_path, key
+
+    os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+    lock_path = f"{cache_path}.lock"
+
+    # Concurrent misses of the same derivative wait for the first one instead of decoding the original again.
+    with open(lock_path, "a") as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        try:
+            if not os.path.exists(cache_path):
+                image, _ = open_downscaled(path, width)
+                temp_path = f"{cache_path}.{uuid.uuid4().hex}.tmp"
+                resize_to_width(image, width).save(temp_path, **SAVE_OPTIONS[image_format])
+                os.replace(temp_path, cache_path)
+                _account_cache_size(os.path.getsize(cache_path))
+        finally:
+            _unlink_lock(lock, lock_path)
+            fcntl.flock(lock, fcntl.LOCK_UN)
+
+    return cache_path, key
+
+
+def trim_resize_cache() -> int:
+    files = []
+    for root, _, names in os.walk(settings.IMAGE_RESIZE_CACHE_DIR):
+        for name in names:
+            if name.endswith((".lock", ".tmp")):
+                continue
+            path = os.path.join(root, name)
+            try:
+                stat = os.stat(path)
+            except FileNotFoundError:
+                continue
+            files.append((stat.st_mtime, stat.st_size, path))
+
+    total = sum(size for _, size, _ in files)
+    limit = settings.IMAGE_RESIZE_CACHE_MAX_SIZE * settings.IMAGE_RESIZE_CACHE_TRIM_RATIO
+    removed = 0
+
+    for _, size, path in sorted(files):
+        if total <= limit:
+            break
+        try:
+            os.unlink(path)
+        except FileNotFoundError:
+            pass
+        total -= size
+        removed += 1
+
+    cache.set(settings.IMAGE_RESIZE_CACHE_SIZE_CACHE_NAME, total, None)
+    cache.delete(settings.IMAGE_RESIZE_CACHE_TRIM_LOCK_NAME)
+    return removed
+
+
+def can_access_media(request: Request, path: str) -> bool:
+    from messenger.models import Message
+
+    if path == settings.DEFAULT_USER_AVATAR_PATH or path.split("/", 1)[0] in set(PathImageTypeEnum):
+        return True
+    if path.startswith(f"{settings.MESSAGES_ATTACHMENTS_DIR}/") and request.user.is_authenticated:
+        return Message.objects.filter(attachment=path, chat__members=request.user).exists()  # noqa
+    return False
+
+
+def _parse_range(header: str, size: int) -> typing.Optional[typing.Tuple[int, int]]:
+    # Only single ranges are served partially; anything else is ignored and the whole file is returned.
+    match = RANGE_PATTERN.match(header.strip())
+    if match is None or match.groups() == ("", ""):
+        return None
+
+    start, end = match.groups()
+    if not start:
+        return max(size - int(end), 0), size - 1
+    return int(start), min(int(end), size - 1) if end else size - 1
+
+
+def _read_range(path: str, start: int, end: int) -> typing.Iterator[bytes]:
+    with open(path, "rb") as file:
+        file.seek(start)
+        remaining = end - start + 1
+        while remaining > 0:
+            chunk = file.read(min(settings.MEDIA_STREAM_BUFFER_SIZE, remaining))
+            if not chunk:
+                break
+            remaining -= len(chunk)
+            yield chunk
+
+
+def serve_file(
+    request: Request,
+    path: str,
+    internal_url: str,
+    cache_control: str,
+    content_type: typing.Optional[str] = None,
+    etag: typing.Optional[str] = None,
+) -> HttpResponse:
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        raise Http404
+
+    content_type = content_type or mimetypes.guess_type(path)[0] or "application/octet-stream"
+
+    # Front server streams the file itself with its own Range and conditional requests handling.
+    if settings.MEDIA_SENDFILE_HEADER:
+        response = HttpResponse(content_type=content_type)
+        response[settings.MEDIA_SENDFILE_HEADER] = (
+            path if settings.MEDIA_SENDFILE_HEADER == "X-Sendfile" else internal_url
+        )
+        response["Cache-Control"] = cache_control
+        return response
+
+    etag = etag or f'"{int(stat.st_mtime):x}-{stat.st_size:x}"'
+    etags = parse_etags(request.headers.get("If-None-Match", ""))
+    if etag in etags or "*" in etags:
+        response = HttpResponseNotModified()
+    else:
+        byte_range = None
+        if_range = request.headers.get("If-Range")
+        if request.headers.get("Range") and (not if_range or if_range.strip() == etag):
+            byte_range = _parse_range(request.headers["Range"], stat.st_size)
+            if byte_range is not None and byte_range[0] > byte_range[1]:
+                response = HttpResponse(status=416)
+                response["Content-Range"] = f"bytes */{stat.st_size}"
+                return response
+
+        if byte_range is None:
+            # Without Range whole file is passed to the server file wrapper, which uses sendfile when available.
+            response = FileResponse(open(path, "rb"), content_type=content_type)
+        else:
+            start, end = byte_range
+            response = StreamingHttpResponse(_read_range(path, start, end), status=206, content_type=content_type)
+            response["Content-Range"] = f"bytes {start}-{end}/{stat.st_size}"
+            response["Content-Length"] = str(end - start + 1)
+
+        response["Accept-Ranges"] = "bytes"
+        response["Last-Modified"] = http_date(stat.st_mtime)
+
+    response["ETag"] = etag
+    response["Cache-Control"] = cache_control
+    return response
@@ -0,0 +1,8 @@
+from celery import shared_task
+
+from media.services import trim_resize_cache
+
+
+@shared_task
+def trim_image_resize_cache() -> None:
+    trim_resize_cache()
@@ -0,0 +1,9 @@
+from django.urls import path
+
+from media.views import ImageResizeAPIView
+
+app_name = "media"
+
+urlpatterns = [
+    path("resize/<path:path>", ImageResizeAPIView.as_view(), name="resize"),
+]
@@ -0,0 +1,99 @@
+import os
+import posixpath
+
+from django.conf import settings
+from django.http import Http404
+from drf_spectacular.utils import OpenApiParameter, extend_schema
+from rest_framework import permissions, status, views
+from rest_framework.request import Request
+
+from media.services import (
+    PRIVATE_CACHE_CONTROL,
+    PUBLIC_CACHE_CONTROL,
+    RESIZE_CONTENT_TYPES,
+    can_access_media,
+    get_resized_image,
+    normalize_image_path,
+    serve_file,
+    validate_resize_params,
+)
+from users.images import get_media_path
+from users.serializers import DetailedCodeSerializer
+
+
+class ImageResizeAPIView(views.APIView):
+    permission_classes = (permissions.AllowAny,)
+    authentication_classes = ()
+
+    @extend_schema(
+        request=None,
+        parameters=[
+            OpenApiParameter(
+                name="width",
+                description="Width of image in pixels. "
+                f"Valid values is {', '.join(map(str, settings.IMAGE_RESIZE_WIDTHS))}.",
+                type=int,
+                required=True,
+            ),
+            OpenApiParameter(
+                name="image_format",
+                description="Format of image. Valid values is 'webp' and 'jpeg'.",
+                type=str,
+                required=True,
+            ),
+        ],
+        responses={
+            (status.HTTP_200_OK, "image/*"): bytes,
+            status.HTTP_400_BAD_REQUEST: DetailedCodeSerializer,
+            status.HTTP_404_NOT_FOUND: DetailedCodeSerializer,
+        },
+        description="Endpoint to get post image or avatar resized to one of the fixed widths. "
+        "Originals are never changed, so responses can be cached forever.",
+    )
+    def get(self, request: Request, path: str):
+        width, image_format = validate_resize_params(
+            request.query_params.get("width"), request.query_params.get("image_format")
+        )
+        cache_path, key = get_resized_image(normalize_image_path(path), width, image_format)
+        internal_url = os.path.relpath(cache_path, settings.IMAGE_RESIZE_CACHE_DIR)
+
+        return serve_file(
+            request,
+            cache_path,
+            f"{settings.IMAGE_RESIZE_SENDFILE_INTERNAL_URL}{internal_url}",
+            PUBLIC_CACHE_CONTROL,
+            RESIZE_CONTENT_TYPES[image_format],
+            f'"{key}"',
+        )
+
+
+class MediaFileAPIView(views.APIView):
+    permission_classes = (permissions.AllowAny,)
+
+    def perform_authentication(self, request: Request) -> None:
+        # User is resolved lazily, only for files which are not public.
+        pass
+
+    @extend_schema(
+        request=None,
+        responses={
+            (status.HTTP_200_OK, "*/*"): bytes,
+            (status.HTTP_206_PARTIAL_CONTENT, "*/*"): bytes,
+            status.HTTP_304_NOT_MODIFIED: None,
+            status.HTTP_404_NOT_FOUND: DetailedCodeSerializer,
+        },
+        description="Endpoint to get media file. Supports Range and If-None-Match. "
+        "Messages attachments are available only for members of chat.",
+    )
+    def get(self, request: Request, path: str):
+        path = posixpath.normpath(path.lstrip("/"))
+        if path.startswith("..") or not can_access_media(request, path):
+            raise Http404
+
+        is_public = not path.startswith(f"{settings.MESSAGES_ATTACHMENTS_DIR}/")
+        return serve_file(
+            request,
+            get_media_path(path),
+            f"{settings.MEDIA_SENDFILE_INTERNAL_URL}{path}",
+            PUBLIC_CACHE_CONTROL if is_public else PRIVATE_CACHE_CONTROL,
+        )
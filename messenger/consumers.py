@@ -1,10 +1,14 @@
-import base64
+import asyncio
 import json
 import typing
 
 from channels.db import database_sync_to_async
+from django.conf import settings
+from django.http import Http404
+from rest_framework import serializers
 
 from common.consumers import CommonConsumer
+from messenger.presence import add_connection, remove_connection
 from messenger.services import (
     create_chat,
     create_message,
@@ -12,41 +16,64 @@ from messenger.services import (
     get_chat,
     get_chats,
     get_current_user,
-    get_message,
     get_messages_in_chat,
-    get_new_chat_entity,
+    localize_chat,
+    localize_message,
     mark_chat,
     mark_message,
-    set_user_offline,
+    serialize_chat_event,
+    serialize_message_event,
+    start_attachment_upload,
+    write_attachment_frame,
 )
 
 
 class MessengerConsumer(CommonConsumer):
     chats: typing.List[str]
     user: "User"
+    closed: asyncio.Event
+    presence_task: asyncio.Task | None
 
     async def connect(self):
         self.chats = []
+        self.closed = asyncio.Event()
+        self.presence_task = None
         await self.accept()
 
     async def disconnect(self, close_code):
-        from users.serializers import UserDefaultSerializer
-
+        self.closed.set()
         if not hasattr(self, "user"):
             return
 
-        self.user = await database_sync_to_async(set_user_offline)(self.user)
+        # Refresh in flight finishes first, so it never adds the connection back after it is removed.
+        if self.presence_task is not None:
+            await self.presence_task
+        # Other devices keep the user online, offline state is flushed and broadcast by the presence task.
+        await database_sync_to_async(remove_connection)(self.user.id, self.channel_name)
+        await self.channel_layer.group_discard(f"user_{self.user.id}_messenger", self.channel_name)
         for chat in self.chats:
-            await self.channel_layer.group_send(
-                chat, {"type": "user_offline", "user": UserDefaultSerializer(instance=self.user).data}
-            )
             await self.channel_layer.group_discard(chat, self.channel_name)
 
     async def create_group(self, user_id: int):
-        self.user = await database_sync_to_async(get_current_user)(user_id, True)
+        self.user = await database_sync_to_async(get_current_user)(user_id)
+        await database_sync_to_async(add_connection)(self.user.id, self.channel_name)
         await self.channel_layer.group_add(f"user_{self.user.id}_messenger", self.channel_name)
+        if self.presence_task is None:
+            self.presence_task = asyncio.create_task(self.keep_presence())
+
+    async def keep_presence(self):
+        # Open sockets are kept alive by the server itself, so only connections of dead workers expire.
+        while not self.closed.is_set():
+            try:
+                await asyncio.wait_for(self.closed.wait(), settings.PRESENCE_HEARTBEAT_INTERVAL)
+            except asyncio.TimeoutError:
+                await database_sync_to_async(add_connection)(self.user.id, self.channel_name)
 
     async def receive(self, text_data=None, bytes_data=None):
+        if bytes_data is not None:
+            await self.receive_upload_chunk(bytes_data)
+            return
+
         data = json.loads(text_data)
         type_ = data.get("type")
 
@@ -55,12 +82,18 @@ class MessengerConsumer(CommonConsumer):
                 await self.authenticate(data.get("token"), data.get("user_id"))
             case "connect_to_chats":
                 await self.connect_to_chats()
+            case "heartbeat":
+                await self.send(
+                    text_data=json.dumps({"type": "heartbeat", "interval": settings.PRESENCE_HEARTBEAT_INTERVAL})
+                )
             case "get_chat_history":
                 await self.get_chat_history(data)
             case "start_chat":
                 await self.start_chat(data)
             case "send_message":
                 await self.send_message(data)
+            case "start_upload":
+                await self.start_upload(data)
             case "read_chat":
                 chat = await self.mark_as(data, mark_chat, is_read=True)
                 await self.channel_layer.group_send(
@@ -78,14 +111,11 @@ class MessengerConsumer(CommonConsumer):
                     {
                         "type": "send_delete_message",
                         "message": message.id,
+                        "chat": await database_sync_to_async(serialize_chat_event)(message.id),
                     },
                 )
             case "edit_message":
-                message = await self.edit_message(data)
-                await self.send(text_data=json.dumps({"success": True}))
-                await self.channel_layer.group_send(
-                    f"chat_{message.chat.id}", {"type": "send_edit_message", "message": message.id}
-                )
+                await self.edit_message(data)
             case "delete_chat":
                 chat = await self.mark_as(data, mark_chat, is_delete=True)
                 await self.send(text_data=json.dumps({"success": True}))
@@ -101,31 +131,20 @@ class MessengerConsumer(CommonConsumer):
         await self.send(text_data=json.dumps({"type": "send_read_chat", "chat": event["chat"]}))
 
     async def send_delete_message(self, event):
-        from messenger.serializers import ChatSerializer
-
-        new_chat_entity = await database_sync_to_async(get_new_chat_entity)(event["message"])
         await self.send(
             text_data=json.dumps(
                 {
                     "type": "send_delete_message",
                     "message": event["message"],
-                    "chat": await database_sync_to_async(
-                        lambda: ChatSerializer(instance=new_chat_entity, context={"user": self.user}).data
-                    )(),
+                    "chat": localize_chat(event["chat"], self.user),
                 }
             )
         )
 
     async def send_edit_message(self, event):
-        from messenger.serializers import MessageSerializer
-
-        message = await database_sync_to_async(get_message)(event["message"])
         await self.send(
             text_data=json.dumps(
-                {
-                    "type": "send_edit_message",
-                    "message": MessageSerializer(instance=message, context={"user": self.user}).data,
-                }
+                {"type": "send_edit_message", "message": localize_message(event["message"], self.user)}
             )
         )
 
@@ -134,16 +153,12 @@ class MessengerConsumer(CommonConsumer):
 
     async def connect_to_chats(self):
         from messenger.serializers import ChatSerializer
-        from users.serializers import UserDefaultSerializer
 
         chats = await database_sync_to_async(get_chats)(self.user)
 
         for chat in chats:
             self.chats.append(f"chat_{chat.id}")
             await self.channel_layer.group_add(f"chat_{chat.id}", self.channel_name)
-            await self.channel_layer.group_send(
-                f"chat_{chat.id}", {"type": "user_online", "user": UserDefaultSerializer(instance=self.user).data}
-            )
 
         payload = await database_sync_to_async(
             lambda: ChatSerializer(chats, many=True, context={"user": self.user}).data
@@ -163,9 +178,13 @@ class MessengerConsumer(CommonConsumer):
         from messenger.serializers import MessageSerializer
 
         chat = data["chat"]
-        messages = await database_sync_to_async(get_messages_in_chat)(chat)
+        messages, has_more = await database_sync_to_async(get_messages_in_chat)(
+            chat, data.get("before"), data.get("after"), data.get("limit")
+        )
         payload = MessageSerializer(messages, many=True, context={"user": self.user}).data
-        await self.send(text_data=json.dumps({"type": "get_chat_history", "chat": chat, "payload": payload}))
+        await self.send(
+            text_data=json.dumps({"type": "get_chat_history", "chat": chat, "payload": payload, "has_more": has_more})
+        )
 
     async def start_chat(self, data: dict):
         from messenger.serializers import ChatSerializer
@@ -194,7 +213,7 @@ class MessengerConsumer(CommonConsumer):
         chat = event["chat"]
         self.chats.append(f"chat_{chat}")
         await self.channel_layer.group_add(f"chat_{chat}", self.channel_name)
-        chat = await database_sync_to_async(get_chat)(chat)
+        chat = await database_sync_to_async(get_chat)(chat, self.user)
         payload = await database_sync_to_async(lambda: ChatSerializer(chat, context={"user": self.user}).data)()
         await self.send(text_data=json.dumps({"type": "connect_to_chat", "payload": payload}))
 
@@ -202,30 +221,92 @@ class MessengerConsumer(CommonConsumer):
         chat_id = data["chat_id"]
         receiver = data["receiver"]
         body = data.get("body", None)
-        attachment = base64.b64decode(data["attachment"]) if data.get("attachment", None) else None
+        attachment = data.get("attachment", None)
         name = data.get("attachment_name", None)
-        message = await database_sync_to_async(create_message)(chat_id, receiver, body, attachment, name, self.user)
+        upload_id = data.get("upload_id", None)
+        try:
+            message = await database_sync_to_async(create_message)(
+                chat_id, receiver, body, attachment, name, self.user, upload_id
+            )
+        except serializers.ValidationError as error:
+            await self.send_upload_error(error.detail)
+            return
         await self.send(text_data=json.dumps({"success": True}))
         await self.channel_layer.group_send(
             f"chat_{chat_id}",
             {
                 "type": "on_message",
-                "message": message.id,
+                "message": await database_sync_to_async(serialize_message_event)(message.id),
             },
         )
 
     async def edit_message(self, data: dict):
         message = data["message"]
         body = data["body"]
-        attachment = base64.b64decode(data["attachment"]) if data.get("attachment", None) else None
+        attachment = data.get("attachment", None)
         name = data.get("attachment_name", None)
-        return await database_sync_to_async(edit_message)(message, body, attachment, name)
+        upload_id = data.get("upload_id", None)
+        try:
+            message = await database_sync_to_async(edit_message)(message, body, attachment, name, self.user, upload_id)
+        except serializers.ValidationError as error:
+            await self.send_upload_error(error.detail)
+            return
+        await self.send(text_data=json.dumps({"success": True}))
+        await self.channel_layer.group_send(
+            f"chat_{message.chat.id}",
+            {
+                "type": "send_edit_message",
+                "message": await database_sync_to_async(serialize_message_event)(message.id),
+            },
+        )
 
-    async def on_message(self, event: dict):
-        from messenger.serializers import MessageSerializer
+    async def start_upload(self, data: dict):
+        try:
+            session = await database_sync_to_async(start_attachment_upload)(
+                self.user, data.get("filename"), data.get("size")
+            )
+        except serializers.ValidationError as error:
+            await self.send_upload_error(error.detail)
+            return
+
+        await self.send(
+            text_data=json.dumps(
+                {
+                    "type": "upload_started",
+                    "upload_id": str(session.pk),
+                    "chunk_size": settings.MESSAGES_UPLOAD_CHUNK_SIZE,
+                }
+            )
+        )
 
-        message = await database_sync_to_async(get_message)(event["message"])
-        payload = MessageSerializer(instance=message, context={"user": self.user}).data
+    async def receive_upload_chunk(self, frame: bytes):
+        # Every chunk is acknowledged with the received offset and clients send the next one only after it.
+        try:
+            session = await database_sync_to_async(write_attachment_frame)(self.user, frame)
+        except serializers.ValidationError as error:
+            await self.send_upload_error(error.detail)
+            return
+        except Http404:
+            await self.send_upload_error({"detail": "Not found.", "code": "not_found"})
+            return
+
+        await self.send(
+            text_data=json.dumps(
+                {
+                    "type": "upload_progress",
+                    "upload_id": str(session.pk),
+                    "received": session.received,
+                    "status": session.status,
+                }
+            )
+        )
+
+    async def send_upload_error(self, errors: typing.Any):
+        await self.send(text_data=json.dumps({"type": "upload_error", "errors": errors}))
+
+    async def on_message(self, event: dict):
+        # Payload is serialized once by the sender, so receiving sockets don't touch the database.
+        payload = localize_message(event["message"], self.user)
         await self.send(text_data=json.dumps({"type": "on_message", "payload": payload}))
 
     async def mark_as(self, data: dict, callback: typing.Callable, **kwargs):
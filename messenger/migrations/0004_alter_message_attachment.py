@@ -0,0 +1,24 @@
+# Generated by Django 5.1.1 on 2026-10-18 05:37
+
+from django.db import migrations, models
+
+import common.storage
+import messenger.models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("messenger", "0003_message_is_edit"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="message",
+            name="attachment",
+            field=models.FileField(
+                null=True,
+                storage=common.storage.ContentAddressedStorage(),
+                upload_to=messenger.models.message_attachments_upload,
+            ),
+        ),
+    ]
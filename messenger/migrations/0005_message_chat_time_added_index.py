@@ -0,0 +1,18 @@
+# Generated by Django 5.1.1 on 2026-10-18 06:00
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("messenger", "0004_alter_message_attachment"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="message",
+            index=models.Index(fields=["chat", "time_added", "id"], name="message_chat_time_added_index"),
+        ),
+    ]
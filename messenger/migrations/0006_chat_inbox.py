@@ -0,0 +1,88 @@
+# Generated by Django 5.1.1 on 2026-10-18 06:02
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+
+
+def fill_inbox(apps, schema_editor):
+    Chat = apps.get_model("messenger", "Chat")
+    Message = apps.get_model("messenger", "Message")
+    ChatUnread = apps.get_model("messenger", "ChatUnread")
+
+    last_message = Message.objects.filter(chat=OuterRef("pk"), is_delete=False).order_by("-time_added", "-id")
+    Chat.objects.update(
+        last_message=Subquery(last_message.values("pk")[:1]),
+        last_activity_at=Subquery(last_message.values("time_added")[:1]),
+    )
+
+    members = Chat.members.through.objects.values_list("chat_id", "exwonderuser_id")
+    ChatUnread.objects.bulk_create(
+        [ChatUnread(chat_id=chat_id, user_id=user_id) for chat_id, user_id in members.iterator()],
+        batch_size=1000,
+        ignore_conflicts=True,
+    )
+    unread = (
+        Message.objects.filter(chat=OuterRef("chat"), receiver=OuterRef("user"), is_read=False, is_delete=False)
+        .order_by()
+        .values("chat")
+        .annotate(count=Count("pk"))
+        .values("count")
+    )
+    ChatUnread.objects.update(count=Coalesce(Subquery(unread), Value(0)))
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("messenger", "0005_message_chat_time_added_index"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="chat",
+            name="last_activity_at",
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name="chat",
+            name="last_message",
+            field=models.ForeignKey(
+                blank=True,
+                null=True,
+                on_delete=django.db.models.deletion.SET_NULL,
+                related_name="+",
+                to="messenger.message",
+            ),
+        ),
+        migrations.CreateModel(
+            name="ChatUnread",
+            fields=[
+                ("id", models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name="ID")),
+                ("count", models.PositiveIntegerField(default=0)),
+                (
+                    "chat",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE, related_name="unread_counters", to="messenger.chat"
+                    ),
+                ),
+                (
+                    "user",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="chats_unread_counters",
+                        to=settings.AUTH_USER_MODEL,
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "Chat unread counter",
+                "verbose_name_plural": "Chats unread counters",
+                "db_table": "chats_unread",
+                "constraints": [models.UniqueConstraint(fields=("chat", "user"), name="unique_chat_unread")],
+            },
+        ),
+        migrations.RunPython(fill_inbox, migrations.RunPython.noop),
+    ]
@@ -3,8 +3,12 @@ from django.contrib.auth import get_user_model
 from django.core.exceptions import ValidationError
 from django.db import models
 from django.db.models import Q
+from django.db.models.signals import m2m_changed
+from django.dispatch.dispatcher import receiver
 from django.utils.translation import gettext_lazy as _
 
+from common.storage import content_addressed_storage
+
 User = get_user_model()
 
 
@@ -16,6 +20,8 @@ class Chat(models.Model):
     members = models.ManyToManyField(User, related_name="chats")
     is_read = models.BooleanField(default=False)
     is_delete = models.BooleanField(default=False)
+    last_message = models.ForeignKey("Message", related_name="+", null=True, blank=True, on_delete=models.SET_NULL)
+    last_activity_at = models.DateTimeField(null=True, blank=True)
 
     class Meta:
         verbose_name = _("Chat")
@@ -37,7 +43,7 @@ class Message(models.Model):
     sender = models.ForeignKey(User, related_name="sended_messages", on_delete=models.CASCADE)
     receiver = models.ForeignKey(User, related_name="recieved_messages", on_delete=models.CASCADE)
     body = models.TextField(max_length=4096, null=True)
-    attachment = models.FileField(upload_to=message_attachments_upload, null=True)
+    attachment = models.FileField(upload_to=message_attachments_upload, storage=content_addressed_storage, null=True)
     time_added = models.DateTimeField(auto_now_add=True)
     time_updated = models.DateTimeField(auto_now=True)
     is_edit = models.BooleanField(default=False)
@@ -51,6 +57,7 @@ class Message(models.Model):
 
         db_table = "messages"
 
+        indexes = (models.Index(fields=("chat", "time_added", "id"), name="message_chat_time_added_index"),)
         constraints = [
             models.CheckConstraint(
                 check=Q(body__isnull=False) | Q(attachment__isnull=False), name="body_or_attachment_required"
@@ -59,3 +66,31 @@ class Message(models.Model):
 
     def __str__(self) -> str:
         return f"{self.sender} message to {self.receiver} at {self.time_added}"
+
+
+class ChatUnread(models.Model):
+    chat = models.ForeignKey(Chat, related_name="unread_counters", on_delete=models.CASCADE)
+    user = models.ForeignKey(User, related_name="chats_unread_counters", on_delete=models.CASCADE)
+    count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        verbose_name = _("Chat unread counter")
+        verbose_name_plural = _("Chats unread counters")
+
+        db_table = "chats_unread"
+
+        constraints = [models.UniqueConstraint(fields=("chat", "user"), name="unique_chat_unread")]
+
+    def __str__(self) -> str:
+        return f"{self.count} unread in {self.chat_id} chat for {self.user_id}"
+
+
+@receiver(m2m_changed, sender=Chat.members.through)
+def chat_members_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    if action != "post_add" or not pk_set:
+        return
+
+    pairs = [(chat_id, instance.pk) for chat_id in pk_set] if reverse else [(instance.pk, pk) for pk in pk_set]
+    ChatUnread.objects.bulk_create(  # noqa
+        [ChatUnread(chat_id=chat_id, user_id=user_id) for chat_id, user_id in pairs], ignore_conflicts=True
+    )
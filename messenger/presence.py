@@ -0,0 +1,89 @@
+import functools
+import time
+import typing
+
+import redis
+from django.conf import settings
+
+USERS_KEY = "users"
+CONNECTIONS_KEY = "connections"
+CHANGES_KEY = "changes"
+
+
+@functools.cache
+def get_presence_client() -> redis.Redis:
+    return redis.Redis.from_url(settings.PRESENCE_REDIS_URL)
+
+
+def get_presence_key(*parts: typing.Any) -> str:
+    return settings.USER_RELATED_CACHE_NAME_SEP.join(map(str, (settings.PRESENCE_CACHE_NAME, *parts)))
+
+
+def _update_connections(
+    user_id: int, add: typing.Optional[str] = None, remove: typing.Optional[str] = None
+) -> typing.Optional[bool]:
+    # Returns new state of the user when the update turned them online or offline, None otherwise.
+    key = get_presence_key(CONNECTIONS_KEY, user_id)
+    users_key = get_presence_key(USERS_KEY)
+    result = None
+
+    def update(pipe: redis.client.Pipeline) -> None:
+        nonlocal result
+        now = time.time()
+        # Connections without a heartbeat for the whole TTL belong to crashed sockets and don't count.
+        alive = {member.decode() for member in pipe.zrangebyscore(key, now - settings.PRESENCE_TTL, "+inf")}
+        was_online = pipe.zscore(users_key, user_id) is not None
+        connections = (alive | {add}) - {remove, None}
+
+        pipe.multi()
+        pipe.zremrangebyscore(key, "-inf", now - settings.PRESENCE_TTL)
+        if remove:
+            pipe.zrem(key, remove)
+        if add:
+            pipe.zadd(key, {add: now})
+            pipe.pexpire(key, int(settings.PRESENCE_TTL * 1000))
+        if connections:
+            pipe.zadd(users_key, {user_id: now})
+        else:
+            pipe.zrem(users_key, user_id)
+
+        result = None
+        if bool(connections) != was_online:
+            result = bool(connections)
+            pipe.hset(get_presence_key(CHANGES_KEY), user_id, int(result))
+
+    get_presence_client().transaction(update, key)
+    return result
+
+
+def add_connection(user_id: int, channel_name: str) -> typing.Optional[bool]:
+    return _update_connections(user_id, add=channel_name)
+
+
+def remove_connection(user_id: int, channel_name: str) -> typing.Optional[bool]:
+    return _update_connections(user_id, remove=channel_name)
+
+
+def remove_expired_users() -> typing.List[int]:
+    # Users whose every socket stopped sending heartbeats are checked one by one, like a regular disconnect.
+    stale = get_presence_client().zrangebyscore(
+        get_presence_key(USERS_KEY), "-inf", time.time() - settings.PRESENCE_TTL
+    )
+    return [int(user_id) for user_id in stale if _update_connections(int(user_id)) is False]
+
+
+def get_online_users(user_ids: typing.Iterable[int]) -> typing.Set[int]:
+    user_ids = list(user_ids)
+    if not user_ids:
+        return set()
+
+    scores = get_presence_client().zmscore(get_presence_key(USERS_KEY), user_ids)
+    deadline = time.time() - settings.PRESENCE_TTL
+    return {user_id for user_id, score in zip(user_ids, scores) if score is not None and score >= deadline}
+
+
+def pop_presence_changes() -> typing.Dict[int, bool]:
+    key = get_presence_key(CHANGES_KEY)
+    with get_presence_client().pipeline() as pipe:
+        changes, _ = pipe.hgetall(key).delete(key).execute()
+    return {int(user_id): state == b"1" for user_id, state in changes.items()}
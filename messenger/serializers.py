@@ -1,11 +1,12 @@
 import os
+import typing
 import urllib.parse
 
 from django.conf import settings
 from rest_framework import serializers
 
 from common.services import datetime_to_timezone
-from messenger.models import Chat, Message
+from messenger.models import Chat, ChatUnread, Message
 from users.serializers import UserDefaultSerializer
 
 
@@ -48,18 +49,45 @@ class MessageSerializer(serializers.ModelSerializer):
         )
 
 
+class MessageEventSerializer(MessageSerializer):
+    # Serialized once per event, every receiving socket only localizes timestamps for its viewer.
+    time_added = serializers.DateTimeField()
+    time_updated = serializers.DateTimeField()
+
+
 class ChatSerializer(serializers.ModelSerializer):
     user = serializers.SerializerMethodField()
     last_message = serializers.SerializerMethodField()
+    unread_count = serializers.SerializerMethodField()
 
     class Meta:
         model = Chat
-        fields = "id", "user", "last_message", "is_read"
+        fields = "id", "user", "last_message", "is_read", "unread_count"
 
     def get_user(self, instance: Chat) -> dict:
-        user = instance.members.exclude(id=self.context["user"].id)[0]
+        user = next(member for member in instance.members.all() if member.id != self.context["user"].id)
         return UserDefaultSerializer(instance=user).data
 
-    def get_last_message(self, instance: Chat) -> dict:
-        message = instance.messages.filter(is_delete=False).order_by("-time_added").first()  # noqa
-        return MessageSerializer(instance=message, context=self.context).data
+    def get_last_message(self, instance: Chat) -> typing.Optional[dict]:
+        if instance.last_message is None:
+            return None
+        return MessageSerializer(instance=instance.last_message, context=self.context).data
+
+    def get_unread_count(self, instance: Chat) -> int:
+        if hasattr(instance, "unread_count"):
+            return instance.unread_count
+        counter = ChatUnread.objects.filter(chat=instance, user=self.context["user"])  # noqa
+        return counter.values_list("count", flat=True).first() or 0
+
+
+class ChatEventSerializer(serializers.ModelSerializer):
+    members = UserDefaultSerializer(many=True)
+    last_message = MessageEventSerializer(allow_null=True)
+    unread = serializers.SerializerMethodField()
+
+    class Meta:
+        model = Chat
+        fields = "id", "members", "last_message", "is_read", "unread"
+
+    def get_unread(self, instance: Chat) -> dict:
+        return {str(counter.user_id): counter.count for counter in instance.unread_counters.all()}
@@ -1,25 +1,83 @@
+import base64
+import io
+import struct
 import typing
+import uuid
 
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+from django.conf import settings
 from django.contrib.auth import get_user_model
 from django.core.files.base import ContentFile
-from django.db.models import Q
+from django.db import transaction
+from django.db.models import F, OuterRef, Prefetch, Q, QuerySet, Subquery, Value
+from django.db.models.functions import Coalesce, Greatest
+from django.utils.dateparse import parse_datetime
+from rest_framework import serializers
 
+from common.services import datetime_to_timezone
+from messenger.presence import get_online_users, pop_presence_changes, remove_expired_users
 
-def get_current_user(user_id: int, set_online: bool = False) -> "User":
+UPLOAD_FRAME_HEADER = struct.Struct(">16sQ")
+
+
+def decode_attachment(attachment: str | bytes) -> bytes:
+    # Inline attachments arrive base64 encoded in text frames and are decoded in the worker thread.
+    return base64.b64decode(attachment) if isinstance(attachment, str) else attachment
+
+
+def get_inline_attachment(attachment: typing.Any, attachment_name: str | None) -> ContentFile | None:
+    if not attachment:
+        return None
+    # Legacy clients only, attachments are uploaded in binary frames and referenced by upload id.
+    if not settings.MESSAGES_INLINE_ATTACHMENTS:
+        raise serializers.ValidationError({"detail": "Attachments must be uploaded.", "code": "invalid"})
+    return ContentFile(decode_attachment(attachment), name=attachment_name)
+
+
+def get_current_user(user_id: int) -> "User":
     User = get_user_model()
-    user = User.objects.get(pk=user_id)
-    if set_online:
-        user.is_online = True
-        user.save()
-    return user
+    return User.objects.get(pk=user_id)
 
 
-def set_user_offline(user: "User") -> "User":
+def flush_presence() -> None:
+    from messenger.models import Chat
+    from users.serializers import UserDefaultSerializer
+
     User = get_user_model()
-    user = User.objects.get(pk=user.id)
-    user.is_online = False
-    user.save()
-    return user
+    remove_expired_users()
+    changes = pop_presence_changes()
+    if not changes:
+        return
+
+    # Reconnects within one flush cancel out, so only real transitions reach the database and contacts.
+    users = [user for user in User.objects.filter(pk__in=changes) if user.is_online != changes[user.pk]]
+    for is_online in (True, False):
+        User.objects.filter(pk__in=[user.pk for user in users if changes[user.pk] is is_online]).update(
+            is_online=is_online
+        )
+
+    contacts = {user.pk: set() for user in users}
+    chats = (
+        Chat.objects.filter(members__in=contacts, is_delete=False)  # noqa
+        .prefetch_related(Prefetch("members", queryset=User.objects.only("id")))
+        .distinct()
+    )
+    for chat in chats:
+        members = {member.pk for member in chat.members.all()}
+        for user_id in members & contacts.keys():
+            contacts[user_id] |= members - {user_id}
+
+    online = get_online_users(set().union(*contacts.values()))
+    channel_layer = get_channel_layer()
+    for user in users:
+        user.is_online = changes[user.pk]
+        event = {
+            "type": "user_online" if user.is_online else "user_offline",
+            "user": UserDefaultSerializer(instance=user).data,
+        }
+        for contact_id in contacts[user.pk] & online:
+            async_to_sync(channel_layer.group_send)(f"user_{contact_id}_messenger", event)
 
 
 def get_message(pk: int) -> "Message":
@@ -28,26 +86,101 @@ def get_message(pk: int) -> "Message":
     return Message.objects.select_related("chat", "sender", "receiver").get(pk=pk)  # noqa
 
 
-def get_new_chat_entity(message_pk: int) -> "Chat":
-    from messenger.models import Message
+def get_inbox_queryset(user: "User") -> QuerySet:
+    from messenger.models import Chat, ChatUnread
 
-    return Message.objects.select_related("chat").prefetch_related("chat__members").get(pk=message_pk).chat  # noqa
+    unread = ChatUnread.objects.filter(chat=OuterRef("pk"), user=user).values("count")  # noqa
+    return (
+        Chat.objects.select_related("last_message__sender", "last_message__receiver")  # noqa
+        .prefetch_related("members")
+        .annotate(unread_count=Coalesce(Subquery(unread), Value(0)))
+    )
 
 
-def get_chats(user: "User") -> list["Chat"]:
-    return list(user.chats.prefetch_related("members", "messages").filter(is_delete=False))
+def serialize_message_event(pk: int) -> dict:
+    from messenger.serializers import MessageEventSerializer
+
+    return MessageEventSerializer(instance=get_message(pk)).data
 
 
-def get_chat(pk: int) -> "Chat":
+def serialize_chat_event(message_pk: int) -> dict:
     from messenger.models import Chat
+    from messenger.serializers import ChatEventSerializer
 
-    return Chat.objects.prefetch_related("members", "messages").get(pk=pk)  # noqa
+    chat = (
+        Chat.objects.select_related("last_message__sender", "last_message__receiver")  # noqa
+        .prefetch_related("members", "unread_counters")
+        .get(messages=message_pk)
+    )
+    return ChatEventSerializer(instance=chat).data
 
 
-def get_messages_in_chat(chat: int) -> list["Messages"]:
-    from messenger.models import Chat
+def localize_message(payload: dict | None, user: "User") -> dict | None:
+    if payload is None:
+        return None
+
+    return {
+        **payload,
+        "time_added": datetime_to_timezone(parse_datetime(payload["time_added"]), user.timezone, to_timesince=False),
+        "time_updated": datetime_to_timezone(
+            parse_datetime(payload["time_updated"]), user.timezone, attribute_name="time_updated", to_timesince=False
+        ),
+    }
+
+
+def localize_chat(payload: dict, user: "User") -> dict:
+    return {
+        "id": payload["id"],
+        "user": next(member for member in payload["members"] if member["id"] != user.id),
+        "last_message": localize_message(payload["last_message"], user),
+        "is_read": payload["is_read"],
+        "unread_count": payload["unread"].get(str(user.id), 0),
+    }
+
 
-    return list(Chat.objects.get(pk=chat).messages.select_related("sender", "receiver").filter(is_delete=False))  # noqa
+def get_chats(user: "User") -> list["Chat"]:
+    # Last message and unread counter are denormalized on the chat, so messages themselves are never loaded here.
+    queryset = get_inbox_queryset(user).filter(members=user, is_delete=False)
+    return list(queryset.order_by(F("last_activity_at").desc(nulls_last=True), "-id"))
+
+
+def get_chat(pk: int, user: "User") -> "Chat":
+    return get_inbox_queryset(user).get(pk=pk)
+
+
+def get_messages_in_chat(
+    chat: int, before: int | None = None, after: int | None = None, limit: int | None = None
+) -> tuple[list["Message"], bool]:
+    from messenger.models import Message
+
+    try:
+        limit = int(limit or settings.MESSAGES_HISTORY_PAGE_SIZE)
+    except (TypeError, ValueError):
+        limit = settings.MESSAGES_HISTORY_PAGE_SIZE
+    limit = min(max(limit, 1), settings.MESSAGES_HISTORY_MAX_PAGE_SIZE)
+
+    queryset = Message.objects.select_related("sender", "receiver").filter(chat_id=chat, is_delete=False)  # noqa
+    ordering = ("-time_added", "-id")
+
+    # Keyset pagination over the (chat, time_added, id) index, so every page costs the same regardless of its depth.
+    cursor = after or before
+    if cursor:
+        time_added = Message.objects.filter(chat_id=chat, pk=cursor).values_list("time_added", flat=True).first()  # noqa
+        if time_added is None:
+            return [], False
+        if after:
+            queryset = queryset.filter(Q(time_added__gt=time_added) | Q(time_added=time_added, pk__gt=cursor))
+            ordering = ("time_added", "id")
+        else:
+            queryset = queryset.filter(Q(time_added__lt=time_added) | Q(time_added=time_added, pk__lt=cursor))
+
+    messages = list(queryset.order_by(*ordering)[: limit + 1])
+    has_more = len(messages) > limit
+    messages = messages[:limit]
+    if after:
+        messages.reverse()
+
+    return messages, has_more
 
 
 def create_chat(receiver: int | str, user: "User") -> tuple["Chat", "User"]:
@@ -76,31 +209,56 @@ def create_chat(receiver: int | str, user: "User") -> tuple["Chat", "User"]:
 
 
 def create_message(
-    chat: int, receiver: int, body: str | None, attachment: typing.Any, attachment_name: str | None, user: "User"
+    chat: int,
+    receiver: int,
+    body: str | None,
+    attachment: typing.Any,
+    attachment_name: str | None,
+    user: "User",
+    upload_id: str | None = None,
 ) -> "Message":
-    from messenger.models import Chat, Message
-
-    file = ContentFile(attachment, name=attachment_name) if attachment else None
+    from messenger.models import Chat, ChatUnread, Message
+    from uploads.services import open_finished_uploads
+
+    with transaction.atomic():
+        if upload_id:
+            with open_finished_uploads(user, [upload_id]) as files:
+                message = Message.objects.create(  # noqa
+                    chat_id=chat, sender=user, receiver_id=receiver, body=body, attachment=files[0]
+                )
+        else:
+            file = get_inline_attachment(attachment, attachment_name)
+            message = Message.objects.create(  # noqa
+                chat_id=chat, sender=user, receiver_id=receiver, body=body, attachment=file
+            )
+
+        Chat.objects.filter(pk=chat).update(  # noqa
+            is_read=False, last_message=message, last_activity_at=message.time_added
+        )
+        ChatUnread.objects.filter(chat_id=chat, user_id=receiver).update(count=F("count") + 1)  # noqa
 
-    chat = Chat.objects.get(pk=chat)
-    chat.is_read = False
-    chat.save()
-    return Message.objects.create(  # noqa
-        chat=chat, sender=user, receiver_id=receiver, body=body, attachment=file
-    )
+    return message
 
 
 def mark_message(pk: int, **kwargs) -> "Message":
-    from messenger.models import Message
+    from messenger.models import Chat, ChatUnread, Message
 
-    message = Message.objects.select_related("chat").prefetch_related("chat__messages").get(pk=pk)  # noqa
+    message = Message.objects.select_related("chat").get(pk=pk)  # noqa
+    was_unread = not message.is_read and not message.is_delete
     for key, value in kwargs.items():
         setattr(message, key, value)
     message.save()
+
+    if was_unread and (message.is_read or message.is_delete):
+        ChatUnread.objects.filter(chat_id=message.chat_id, user_id=message.receiver_id).update(  # noqa
+            count=Greatest(F("count") - 1, Value(0))
+        )
     if "is_delete" in kwargs:
-        new_last_message = message.chat.messages.filter(is_delete=False).order_by("-time_added").first()
-        message.chat.is_read = new_last_message.is_read if new_last_message else True
-        message.chat.save()
+        new_last_message = message.chat.messages.filter(is_delete=False).order_by("-time_added", "-id").first()
+        # Only deleting the last message changes the preview, and a message sent meanwhile is never overwritten.
+        Chat.objects.filter(pk=message.chat_id, last_message=message).update(  # noqa
+            is_read=new_last_message.is_read if new_last_message else True, last_message=new_last_message
+        )
 
     return message
 
@@ -110,20 +268,64 @@ def mark_chat(pk: int, **kwargs) -> "Chat":
 
     chat = Chat.objects.get(pk=pk)  # noqa
     chat.messages.update(**kwargs)
+    if kwargs.get("is_read") or kwargs.get("is_delete"):
+        chat.unread_counters.update(count=0)
+    if kwargs.get("is_delete"):
+        chat.last_message = None
     for key, value in kwargs.items():
         setattr(chat, key, value)
     chat.save()
     return chat
 
 
-def edit_message(message: int, body: str, attachment: typing.Any, attachment_name: str | None) -> "Message":
+def edit_message(
+    message: int,
+    body: str,
+    attachment: typing.Any,
+    attachment_name: str | None,
+    user: typing.Optional["User"] = None,
+    upload_id: str | None = None,
+) -> "Message":
     from messenger.models import Message
+    from uploads.services import open_finished_uploads
 
     message = Message.objects.select_related("chat").get(pk=message)  # noqa
     message.body = body
-    if attachment and attachment_name:
-        file = ContentFile(attachment, name=attachment_name)
-        message.attachment = file
     message.is_edit = True
+
+    if upload_id and user:
+        with transaction.atomic(), open_finished_uploads(user, [upload_id]) as files:
+            message.attachment = files[0]
+            message.save()
+        return message
+
+    if attachment and attachment_name:
+        message.attachment = get_inline_attachment(attachment, attachment_name)
     message.save()
     return message
+
+
+def start_attachment_upload(user: "User", filename: str, size: int) -> "UploadSession":
+    from uploads.serializers import UploadSessionSerializer
+
+    serializer = UploadSessionSerializer(data={"filename": filename, "size": size})
+    serializer.is_valid(raise_exception=True)
+    return serializer.save(owner=user)
+
+
+def write_attachment_frame(user: "User", frame: bytes) -> "UploadSession":
+    from uploads.services import finalize_upload, write_upload_range
+
+    # Frame is the upload id and the offset of the chunk followed by its raw bytes.
+    if len(frame) <= UPLOAD_FRAME_HEADER.size:
+        raise serializers.ValidationError({"detail": "Invalid upload frame.", "code": "invalid"})
+    if len(frame) - UPLOAD_FRAME_HEADER.size > settings.MESSAGES_UPLOAD_CHUNK_SIZE:
+        raise serializers.ValidationError({"detail": "Chunk is too large.", "code": "invalid"})
+
+    upload_id, start = UPLOAD_FRAME_HEADER.unpack_from(frame)
+    chunk = memoryview(frame)[UPLOAD_FRAME_HEADER.size :]
+    session = write_upload_range(uuid.UUID(bytes=upload_id), user, io.BytesIO(chunk), start, start + len(chunk) - 1)
+
+    if session.received == session.size:
+        session = finalize_upload(session)
+    return session
@@ -0,0 +1,8 @@
+from celery import shared_task
+
+from messenger.services import flush_presence
+
+
+@shared_task
+def flush_presence_changes() -> None:
+    flush_presence()
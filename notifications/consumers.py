@@ -68,3 +68,6 @@ class NotificationConsumer(CommonConsumer):
 
     async def notify(self, event):
         await self.send(text_data=json.dumps({"type": "notify", "payload": event["payload"]}))
+
+    async def post_status(self, event):
+        await self.send(text_data=json.dumps({"type": "post_status", "payload": event["payload"]}))
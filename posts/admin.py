@@ -1,6 +1,6 @@
 from django.contrib import admin
 
-from posts.models import Comment, CommentLike, Post, PostImage, PostLike, Saved, Tag
+from posts.models import Comment, CommentLike, PendingPost, Post, PostImage, PostLike, Saved, Tag
 
 
 class SignatureFilter(admin.SimpleListFilter):
@@ -47,6 +47,16 @@ class PostImageAdmin(admin.ModelAdmin):
     search_fields = "post__author", "post__signature"
 
 
+@admin.register(PendingPost)
+class PendingPostAdmin(admin.ModelAdmin):
+    list_display = "id", "author__username", "status", "post__id", "time_added"
+    list_display_links = "id", "author__username"
+    ordering = ("-time_added",)
+    list_per_page = 50
+    search_fields = "author__username", "signature"
+    list_filter = ("status",)
+
+
 @admin.register(PostLike)
 class PostLikeAdmin(admin.ModelAdmin):
     list_per_page = 50
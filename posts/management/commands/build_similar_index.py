@@ -0,0 +1,52 @@
+import os
+import typing
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from posts.models import PostImage
+from posts.services import add_images_to_similar_index
+from users.images import read_image_features
+
+
+def _read_image_features(image_path: str) -> typing.Optional[np.ndarray]:
+    try:
+        return read_image_features(image_path)
+    except OSError:
+        return None
+
+
+class Command(BaseCommand):
+    help = "Compute feature vectors of all post images and write them to the similar posts index."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--workers", type=int, default=os.cpu_count())
+        parser.add_argument("--batch-size", type=int, default=settings.IMAGE_METADATA_BACKFILL_BATCH_SIZE)
+
+    def handle(self, *args, **options):
+        indexed = failed = 0
+        last_pk = 0
+
+        with ProcessPoolExecutor(max_workers=options["workers"]) as executor:
+            while (
+                batch := list(
+                    PostImage.objects.filter(pk__gt=last_pk)  # noqa
+                    .order_by("pk")
+                    .values_list("pk", "post_id", "image")[: options["batch_size"]]
+                )
+            ):
+                last_pk = batch[-1][0]
+                results = executor.map(_read_image_features, [str(image) for *_, image in batch], chunksize=16)
+
+                rows = [
+                    (post_image_id, post_id, features)
+                    for (post_image_id, post_id, _), features in zip(batch, results)
+                    if features is not None
+                ]
+                add_images_to_similar_index(rows)
+                indexed += len(rows)
+                failed += len(batch) - len(rows)
+
+        self.stdout.write(self.style.SUCCESS(f"Indexed {indexed} post images, failed {failed} images."))
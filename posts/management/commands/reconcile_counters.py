@@ -0,0 +1,17 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from posts.services import reconcile_posts_counters
+
+
+class Command(BaseCommand):
+    help = "Recalculate likes and comments counters of posts and comments which drifted from real values."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=settings.COUNTERS_RECONCILE_BATCH_SIZE)
+
+    def handle(self, *args, **options):
+        posts_repaired, comments_repaired = reconcile_posts_counters(options["batch_size"])
+        self.stdout.write(
+            self.style.SUCCESS(f"Repaired counters of {posts_repaired} posts and {comments_repaired} comments.")
+        )
@@ -0,0 +1,47 @@
+# Generated by Django 5.1.1 on 2026-10-18 04:45
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+def fill_timelines(apps, schema_editor):
+    Follow = apps.get_model('users', 'Follow')
+    Post = apps.get_model('posts', 'Post')
+    TimelineEntry = apps.get_model('posts', 'TimelineEntry')
+
+    for follow in Follow.objects.all().iterator(chunk_size=settings.TIMELINE_FANOUT_BATCH_SIZE):
+        post_ids = Post.objects.filter(author_id=follow.following_id).order_by('-id').values_list('pk', flat=True)
+        entries = [
+            TimelineEntry(owner_id=follow.follower_id, post_id=pk) for pk in post_ids[:settings.TIMELINE_MAX_LENGTH]
+        ]
+        TimelineEntry.objects.bulk_create(entries, ignore_conflicts=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0014_post_likes_count_post_comments_count_and_more'),
+        ('users', '0017_exwonderuser_comments_private_status'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TimelineEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('owner', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='timeline', to=settings.AUTH_USER_MODEL)),
+                ('post', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='timeline_entries', to='posts.post')),
+            ],
+            options={
+                'verbose_name': 'Timeline entry',
+                'verbose_name_plural': 'Timeline entries',
+                'db_table': 'timeline_entries',
+                'ordering': ('-post',),
+                'indexes': [models.Index(fields=['owner', '-post'], name='timeline_owner_post_index')],
+                'constraints': [models.UniqueConstraint(fields=('owner', 'post'), name='unique_timeline_entry')],
+            },
+        ),
+        migrations.RunPython(fill_timelines, migrations.RunPython.noop),
+    ]
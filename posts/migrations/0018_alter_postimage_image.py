@@ -0,0 +1,20 @@
+# Generated by Django 5.1.1 on 2026-10-18 05:37
+
+import common.storage
+import posts.models
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0017_postimage_metadata'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='postimage',
+            name='image',
+            field=models.ImageField(storage=common.storage.ContentAddressedStorage(), upload_to=posts.models.post_images_upload),
+        ),
+    ]
@@ -0,0 +1,38 @@
+# Generated by Django 5.1.1 on 2026-10-18 05:53
+
+import django.db.models.deletion
+import uuid
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0019_postimage_phash'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PendingPost',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('signature', models.CharField(default='', max_length=512)),
+                ('tags', models.TextField(blank=True, default='')),
+                ('images', models.JSONField(blank=True, default=list)),
+                ('uploads', models.JSONField(blank=True, default=list)),
+                ('status', models.CharField(choices=[('pending', 'Pending'), ('published', 'Published'), ('failed', 'Failed')], default='pending', max_length=10)),
+                ('error', models.CharField(blank=True, default='', max_length=256)),
+                ('time_added', models.DateTimeField(auto_now_add=True)),
+                ('author', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='pending_posts', to=settings.AUTH_USER_MODEL)),
+                ('post', models.OneToOneField(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='pending', to='posts.post')),
+            ],
+            options={
+                'verbose_name': 'Pending post',
+                'verbose_name_plural': 'Pending posts',
+                'db_table': 'pending_posts',
+                'ordering': ('-time_added',),
+            },
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.1.1 on 2026-10-18 06:54
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0020_pendingpost'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='postimage',
+            name='has_derivatives',
+            field=models.BooleanField(default=False),
+        ),
+    ]
@@ -1,12 +1,19 @@
+import os
+import shutil
+import uuid
+
 from django.conf import settings
 from django.contrib.auth import get_user_model
 from django.core.validators import MinLengthValidator
-from django.db import models
-from django.db.models.signals import pre_delete
+from django.db import models, transaction
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_delete
 from django.dispatch.dispatcher import receiver
 from django.utils.translation import gettext_lazy as _
 from rest_framework import serializers
 
+from common.services import bump_cache_version, increment_counter
+from common.storage import content_addressed_storage
+
 User = get_user_model()
 
 
@@ -15,19 +22,38 @@ def post_images_upload(instance: "PostImage", filename: str) -> str:
 
 
 class PostImage(models.Model):
-    image = models.ImageField(upload_to=post_images_upload)
+    image = models.ImageField(upload_to=post_images_upload, storage=content_addressed_storage)
     post = models.ForeignKey("Post", related_name="images", on_delete=models.CASCADE)
+    width = models.PositiveIntegerField(null=True, blank=True)
+    height = models.PositiveIntegerField(null=True, blank=True)
+    dominant_color = models.CharField(max_length=7, default="", blank=True)
+    placeholder = models.CharField(max_length=64, default="", blank=True)
+    has_derivatives = models.BooleanField(default=False)
+    phash = models.BigIntegerField(null=True, blank=True)
+    phash_0 = models.IntegerField(null=True, blank=True)
+    phash_1 = models.IntegerField(null=True, blank=True)
+    phash_2 = models.IntegerField(null=True, blank=True)
+    phash_3 = models.IntegerField(null=True, blank=True)
 
     class Meta:
         verbose_name = _("Post image")
         verbose_name_plural = _("Posts images")
 
+        # Multi-index hashing: hashes within IMAGE_PHASH_MAX_DISTANCE share at least one exact 16 bit chunk.
+        indexes = (
+            models.Index(fields=("phash_0",), name="post_image_phash_0_index"),
+            models.Index(fields=("phash_1",), name="post_image_phash_1_index"),
+            models.Index(fields=("phash_2",), name="post_image_phash_2_index"),
+            models.Index(fields=("phash_3",), name="post_image_phash_3_index"),
+        )
+
     def __str__(self):
         return f"Image for {self.post.pk}."  # noqa
 
 
 @receiver(pre_delete, sender=PostImage)
 def mymodel_delete(sender, instance, **kwargs):
+    # Storage releases one reference and removes the blob only when no other image shares it.
     instance.image.delete(False)
 
 
@@ -36,6 +62,8 @@ class Post(models.Model):
     signature = models.CharField(max_length=512, default="")
     tags = models.ManyToManyField("Tag", related_name="posts", blank=True)
     pinned = models.BooleanField(default=False)
+    likes_count = models.PositiveIntegerField(default=0)
+    comments_count = models.PositiveIntegerField(default=0)
     time_added = models.DateTimeField(auto_now_add=True)
 
     class Meta:
@@ -45,6 +73,8 @@ class Post(models.Model):
 
         db_table = "posts"
 
+        indexes = (models.Index(fields=("-likes_count", "-id"), name="post_likes_count_index"),)
+
     def __str__(self):
         return f"{self.pk} post."
 
@@ -55,6 +85,46 @@ class Post(models.Model):
                 raise serializers.ValidationError({"pinned": "One author must have no more than 3 pinned posts."})
 
 
+class PendingPost(models.Model):
+    class Status(models.TextChoices):
+        PENDING = "pending", _("Pending")
+        PUBLISHED = "published", _("Published")
+        FAILED = "failed", _("Failed")
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    author = models.ForeignKey(User, related_name="pending_posts", on_delete=models.CASCADE)
+    signature = models.CharField(max_length=512, default="")
+    tags = models.TextField(default="", blank=True)
+    images = models.JSONField(default=list, blank=True)
+    uploads = models.JSONField(default=list, blank=True)
+    status = models.CharField(choices=Status.choices, max_length=10, default=Status.PENDING)
+    post = models.OneToOneField(Post, related_name="pending", null=True, blank=True, on_delete=models.SET_NULL)
+    error = models.CharField(max_length=256, default="", blank=True)
+    time_added = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ("-time_added",)
+        verbose_name = _("Pending post")
+        verbose_name_plural = _("Pending posts")
+
+        db_table = "pending_posts"
+
+    def __str__(self):
+        return f"Pending post {self.pk} by {self.author_id} ({self.status})"
+
+    @property
+    def staging_dir(self) -> str:
+        return os.path.join(settings.POSTS_STAGING_DIR, str(self.pk))
+
+    def get_staged_path(self, index: int) -> str:
+        return os.path.join(self.staging_dir, str(index))
+
+
+@receiver(post_delete, sender=PendingPost)
+def pending_post_deleted(sender, instance, **kwargs):
+    transaction.on_commit(lambda: shutil.rmtree(instance.staging_dir, ignore_errors=True))
+
+
 class Tag(models.Model):
     name = models.CharField(max_length=32, unique=True)
 
@@ -72,11 +142,14 @@ class Tag(models.Model):
 class PostLike(models.Model):
     author = models.ForeignKey(User, related_name="likes", on_delete=models.CASCADE)
     post = models.ForeignKey(Post, related_name="likes", on_delete=models.CASCADE)
+    time_added = models.DateTimeField(auto_now_add=True)
 
     class Meta:
         verbose_name = _("Post like")
         verbose_name_plural = _("Posts likes")
 
+        indexes = (models.Index(fields=("time_added",), name="post_like_time_added_index"),)
+
     def __str__(self):
         return f"{self.author.pk} like for {self.post.pk} post."  # noqa
 
@@ -85,6 +158,7 @@ class Comment(models.Model):
     author = models.ForeignKey(User, related_name="comments", on_delete=models.CASCADE)
     comment = models.TextField(max_length=2048, validators=(MinLengthValidator(10),))
     post = models.ForeignKey(Post, related_name="comments", on_delete=models.CASCADE)
+    likes_count = models.PositiveIntegerField(default=0)
     time_added = models.DateTimeField(auto_now_add=True)
 
     class Meta:
@@ -108,6 +182,89 @@ class CommentLike(models.Model):
         return f"{self.author.pk} like for {self.comment.pk} comment."  # noqa
 
 
+@receiver(post_save, sender=Post)
+def post_created(sender, instance, created, **kwargs):
+    if created:
+        increment_counter(User, instance.author_id, "posts_count", 1)
+    else:
+        bump_cache_version(settings.POSTS_FRAGMENT_VERSION_CACHE_NAME, instance.pk)
+
+
+@receiver(m2m_changed, sender=Post.tags.through)
+def post_tags_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    if action not in {"post_add", "post_remove", "post_clear"}:
+        return
+
+    for post_id in (pk_set or ()) if reverse else (instance.pk,):
+        bump_cache_version(settings.POSTS_FRAGMENT_VERSION_CACHE_NAME, post_id)
+
+
+@receiver(post_save, sender=PostImage)
+@receiver(post_delete, sender=PostImage)
+def post_image_changed(sender, instance, **kwargs):
+    bump_cache_version(settings.POSTS_FRAGMENT_VERSION_CACHE_NAME, instance.post_id)
+
+
+@receiver(post_delete, sender=PostImage)
+def post_image_deleted(sender, instance, **kwargs):
+    from posts.services.similar import remove_image_from_similar_index
+
+    remove_image_from_similar_index(instance.pk)
+
+
+@receiver(post_save, sender=User)
+def post_author_changed(sender, instance, **kwargs):
+    bump_cache_version(settings.USERS_FRAGMENT_VERSION_CACHE_NAME, instance.pk)
+
+
+@receiver(post_delete, sender=Post)
+def post_deleted(sender, instance, **kwargs):
+    increment_counter(User, instance.author_id, "posts_count", -1)
+
+
+@receiver(post_save, sender=PostLike)
+def post_like_created(sender, instance, created, **kwargs):
+    from posts.services.leaderboard import count_post_like
+
+    if created:
+        count_post_like(instance.post_id, instance.time_added, 1)
+        increment_counter(Post, instance.post_id, "likes_count", 1)
+        bump_cache_version(settings.POSTS_FRAGMENT_VERSION_CACHE_NAME, instance.post_id)
+
+
+@receiver(post_delete, sender=PostLike)
+def post_like_deleted(sender, instance, **kwargs):
+    from posts.services.leaderboard import count_post_like
+
+    count_post_like(instance.post_id, instance.time_added, -1)
+    increment_counter(Post, instance.post_id, "likes_count", -1)
+    bump_cache_version(settings.POSTS_FRAGMENT_VERSION_CACHE_NAME, instance.post_id)
+
+
+@receiver(post_save, sender=Comment)
+def comment_created(sender, instance, created, **kwargs):
+    if created:
+        increment_counter(Post, instance.post_id, "comments_count", 1)
+        bump_cache_version(settings.POSTS_FRAGMENT_VERSION_CACHE_NAME, instance.post_id)
+
+
+@receiver(post_delete, sender=Comment)
+def comment_deleted(sender, instance, **kwargs):
+    increment_counter(Post, instance.post_id, "comments_count", -1)
+    bump_cache_version(settings.POSTS_FRAGMENT_VERSION_CACHE_NAME, instance.post_id)
+
+
+@receiver(post_save, sender=CommentLike)
+def comment_like_created(sender, instance, created, **kwargs):
+    if created:
+        increment_counter(Comment, instance.comment_id, "likes_count", 1)
+
+
+@receiver(post_delete, sender=CommentLike)
+def comment_like_deleted(sender, instance, **kwargs):
+    increment_counter(Comment, instance.comment_id, "likes_count", -1)
+
+
 class Saved(models.Model):
     owner = models.ForeignKey(User, related_name="saved_posts", on_delete=models.CASCADE)
     post = models.ForeignKey(Post, related_name="saved_by", on_delete=models.CASCADE)
@@ -120,3 +277,21 @@ class Saved(models.Model):
 
     def __str__(self):
         return f"Saved post {self.post.pk} by {self.owner.pk}"  # noqa
+
+
+class TimelineEntry(models.Model):
+    owner = models.ForeignKey(User, related_name="timeline", on_delete=models.CASCADE)
+    post = models.ForeignKey(Post, related_name="timeline_entries", on_delete=models.CASCADE)
+
+    class Meta:
+        ordering = ("-post",)
+        verbose_name = _("Timeline entry")
+        verbose_name_plural = _("Timeline entries")
+
+        db_table = "timeline_entries"
+
+        constraints = [models.UniqueConstraint(fields=("owner", "post"), name="unique_timeline_entry")]
+        indexes = (models.Index(fields=("owner", "-post"), name="timeline_owner_post_index"),)
+
+    def __str__(self):
+        return f"Post {self.post.pk} in timeline of {self.owner.pk}"  # noqa
@@ -1,31 +1,58 @@
+import typing
 import urllib.parse
 
 from django.conf import settings
-from django.db import transaction
+from django.core.files import File
+from django.urls import reverse
 from rest_framework import serializers
+from rest_framework.fields import SkipField
 
 from common.services import datetime_to_timezone
-from notifications.tasks import send_notifications
-from posts.models import Comment, CommentLike, Post, PostImage, PostLike, Saved, Tag
-from posts.services import extract_post_images_from_request_data, get_or_create_tags
-from users.serializers import UserDefaultSerializer
+from posts.models import Comment, CommentLike, PendingPost, Post, PostImage, PostLike, Saved, Tag
+from posts.services import create_post, extract_images_from_request_data, stage_post
+from posts.tasks import schedule_user_recommendations_refresh
+from uploads.services import get_finished_uploads
+from users.images import validate_image_upload
+from users.serializers import ImageSrcsetField, UserDefaultSerializer
 from users.services import PathImageTypeEnum, get_upload_crop_path
-from users.tasks import make_center_crop
 
 
 class PostImageSerializer(serializers.ModelSerializer):
     image_crop = serializers.SerializerMethodField()
+    srcset = ImageSrcsetField(PathImageTypeEnum.POST, "image", "has_derivatives")
 
     class Meta:
         model = PostImage
-        fields = "id", "image", "image_crop"
-        read_only_fields = ("image",)
+        fields = "id", "image", "image_crop", "srcset", "width", "height", "dominant_color", "placeholder"
+        read_only_fields = "image", "width", "height", "dominant_color", "placeholder"
 
     def get_image_crop(self, instance):
         media_url = urllib.parse.urljoin(settings.HOST, settings.MEDIA_URL)
         return urllib.parse.urljoin(media_url, get_upload_crop_path(str(instance.image), PathImageTypeEnum.POST))
 
 
+class PostImageCopySerializer(PostImageSerializer):
+    distance = serializers.IntegerField(read_only=True)
+
+    class Meta(PostImageSerializer.Meta):
+        fields = *PostImageSerializer.Meta.fields, "post", "distance"
+
+
+class ViewerStateField(serializers.BooleanField):
+    def __init__(self, post_attribute: typing.Optional[str] = None, **kwargs):
+        self.post_attribute = post_attribute
+        kwargs["read_only"] = True
+        super().__init__(**kwargs)
+
+    def get_attribute(self, instance):
+        viewer_state = self.context.get("viewer_state")
+        if viewer_state is None:
+            raise SkipField()
+
+        post = getattr(instance, self.post_attribute) if self.post_attribute else instance
+        return getattr(viewer_state, self.field_name)(post)
+
+
 class TagSerializer(serializers.ModelSerializer):
     class Meta:
         model = Tag
@@ -50,9 +77,15 @@ class PostRequestSerializer(serializers.ModelSerializer):
         )
         read_only_fields = ("time_added",)
 
+    def get_upload_ids(self) -> typing.List[str]:
+        return [upload_id for upload_id in self.context["request"].data.get("uploads", "").split(",") if upload_id]
+
     def validate(self, attrs):
-        if "image0" not in list(self.context["request"].data.keys()):
-            raise serializers.ValidationError("No main image for post. Pass it in the 'image0' key.", code="invalid")
+        if "image0" not in list(self.context["request"].data.keys()) and not self.get_upload_ids():
+            raise serializers.ValidationError(
+                "No main image for post. Pass it in the 'image0' key or finished upload ids in 'uploads'.",
+                code="invalid",
+            )
 
         tags = self.context["request"].data.get("tags", "").split(",")
         invalid_tags = [tag for tag in tags if len(tag) > 32]
@@ -62,39 +95,76 @@ class PostRequestSerializer(serializers.ModelSerializer):
                 f"Invalid length for tags: '{','.join(invalid_tags)}' tag.", code="invalid"
             )
 
+        request = self.context["request"]
+        for image in extract_images_from_request_data(request.data):
+            validate_image_upload(image)
+        for session in get_finished_uploads(request.user, self.get_upload_ids()).values():
+            with File(open(session.part_path, "rb"), name=session.filename) as file:
+                validate_image_upload(file)
+
         return attrs
 
     def create(self, validated_data):
-        tags = self.context["request"].data.get("tags", "")
+        return create_post(
+            validated_data["author"],
+            validated_data.get("signature", ""),
+            self.context["request"].data.get("tags", ""),
+            extract_images_from_request_data(self.context["request"].data),
+            self.get_upload_ids(),
+        )
 
-        with transaction.atomic():
-            post = Post(author=validated_data["author"], signature=validated_data.get("signature", ""))
-            post.save()
-            post_images = extract_post_images_from_request_data(post, self.context["request"].data)
-            post_images = PostImage.objects.bulk_create(post_images)  # noqa
-            if len(tags):
-                tags = get_or_create_tags(list(set(tags.split(","))))
-                post.tags.add(*tags)
 
-        make_center_crop.apply_async(args=[str(post_images[0].image), PathImageTypeEnum.POST], queue="high_priority")
-        send_notifications.apply_async(args=[post.pk], queue="low_priority")
+class PendingPostSerializer(serializers.ModelSerializer):
+    status_url = serializers.SerializerMethodField()
+
+    class Meta:
+        model = PendingPost
+        fields = "id", "status", "post", "error", "status_url"
+        read_only_fields = "status", "post", "error"
 
-        return post
+    def get_status_url(self, instance: PendingPost) -> str:
+        url = reverse("posts:pending-posts-detail", kwargs={"id": instance.pk})
+        request = self.context.get("request")
+        return request.build_absolute_uri(url) if request else url
 
 
-class PostResponseSerializer(serializers.ModelSerializer):
+class PostPublishSerializer(PostRequestSerializer):
+    author = None
+    images = None
+
+    class Meta:
+        model = PendingPost
+        fields = ("signature", "tags")
+
+    def create(self, validated_data):
+        return stage_post(
+            validated_data["author"],
+            validated_data.get("signature", ""),
+            self.context["request"].data.get("tags", ""),
+            extract_images_from_request_data(self.context["request"].data),
+            self.get_upload_ids(),
+        )
+
+
+class PostFragmentSerializer(serializers.ModelSerializer):
     author = UserDefaultSerializer(read_only=True)
     images = PostImageSerializer(many=True, read_only=True)
+    tags = TagSerializer(many=True, read_only=True)
+
+    class Meta:
+        model = Post
+        fields = "id", "author", "signature", "images", "tags", "pinned", "likes_count", "comments_count"
+
+
+class PostResponseSerializer(PostFragmentSerializer):
     time_added = serializers.SerializerMethodField(read_only=True)
 
     likes_count = serializers.IntegerField(read_only=True)
     comments_count = serializers.IntegerField(read_only=True)
-    can_comment = serializers.BooleanField(read_only=True)
-    is_liked = serializers.BooleanField(read_only=True)
-    is_commented = serializers.BooleanField(read_only=True)
-    is_saved = serializers.BooleanField(read_only=True)
-
-    tags = TagSerializer(many=True, read_only=True)
+    can_comment = ViewerStateField()
+    is_liked = ViewerStateField()
+    is_commented = ViewerStateField()
+    is_saved = ViewerStateField()
 
     class Meta:
         model = Post
@@ -117,6 +187,23 @@ class PostResponseSerializer(serializers.ModelSerializer):
     def get_time_added(self, post):
         return datetime_to_timezone(post.time_added, self.context["request"].user.timezone)
 
+    def to_representation(self, instance):
+        fragment = self.context.get("post_fragments", {}).get(instance.pk)
+        if fragment is None:
+            return super().to_representation(instance)
+
+        representation = dict(fragment)
+        for field in self._readable_fields:
+            if field.field_name in representation:
+                continue
+            try:
+                attribute = field.get_attribute(instance)
+            except SkipField:
+                continue
+            representation[field.field_name] = field.to_representation(attribute)
+
+        return {field: representation[field] for field in self.Meta.fields if field in representation}
+
 
 class PostLikeSerializer(serializers.ModelSerializer):
     class Meta:
@@ -128,7 +215,9 @@ class PostLikeSerializer(serializers.ModelSerializer):
         like = PostLike.objects.filter(author=validated_data["author"], post=validated_data["post"])  # noqa
         if like.exists():
             return like.first()
-        return super().create(validated_data)
+        like = super().create(validated_data)
+        schedule_user_recommendations_refresh(like.author_id)
+        return like
 
 
 class CommentSerializer(serializers.ModelSerializer):
@@ -166,9 +255,9 @@ class SavedSerializer(serializers.ModelSerializer):
 
     likes_count = serializers.IntegerField(read_only=True)
     comments_count = serializers.IntegerField(read_only=True)
-    is_liked = serializers.BooleanField(read_only=True)
-    is_commented = serializers.BooleanField(read_only=True)
-    is_saved = serializers.BooleanField(read_only=True)
+    is_liked = ViewerStateField(post_attribute="post")
+    is_commented = ViewerStateField(post_attribute="post")
+    is_saved = ViewerStateField(post_attribute="post")
 
     class Meta:
         model = Saved
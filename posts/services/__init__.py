@@ -1,31 +1,86 @@
 from posts.services.base_viewsets import BaseLikeViewSet
-from posts.services.mixins import CreateModelMixin
+from posts.services.duplicates import find_image_copies, get_image_hash_fields
+from posts.services.fragments import get_post_fragments
+from posts.services.leaderboard import (
+    add_post_to_recent_top,
+    lock_liked_tops_refresh,
+    refresh_liked_tops,
+    remove_post_from_recent_top,
+)
+from posts.services.mixins import CreateModelMixin, ViewerPostsStateMixin
+from posts.services.publish import create_post, publish_pending_post, send_pending_post_status, stage_post
+from posts.services.recommendations import (
+    build_recommendations,
+    get_recommendations,
+    lock_user_recommendations_refresh,
+)
 from posts.services.services import (
     annotate_likes_and_comments_count_posts_queryset,
     annotate_likes_count_and_is_liked_comments_queryset,
-    annotate_with_user_data_posts_queryset,
+    extract_images_from_request_data,
     extract_post_images_from_request_data,
     filter_posts_queryset_by_author,
     filter_posts_queryset_by_likes,
     filter_posts_queryset_by_recent,
     filter_posts_queryset_by_top,
     filter_posts_queryset_by_updates,
-    get_full_annotated_posts_queryset,
     get_or_create_tags,
+    hydrate_posts_queryset,
+    order_queryset_by_ids,
+    reconcile_posts_counters,
+)
+from posts.services.similar import (
+    add_images_to_similar_index,
+    get_image_features,
+    get_similar_posts,
+    query_similar_posts,
+)
+from posts.services.timeline import (
+    add_author_posts_to_timeline,
+    fan_out_post_to_timelines,
+    remove_author_posts_from_timeline,
+    trim_timelines,
 )
+from posts.services.viewer import PostsViewerState
 
 __all__ = [
     "filter_posts_queryset_by_updates",
     "annotate_likes_and_comments_count_posts_queryset",
-    "annotate_with_user_data_posts_queryset",
-    "get_full_annotated_posts_queryset",
     "filter_posts_queryset_by_author",
     "filter_posts_queryset_by_likes",
     "filter_posts_queryset_by_recent",
     "filter_posts_queryset_by_top",
     "annotate_likes_count_and_is_liked_comments_queryset",
+    "extract_images_from_request_data",
     "extract_post_images_from_request_data",
     "get_or_create_tags",
+    "reconcile_posts_counters",
+    "order_queryset_by_ids",
+    "refresh_liked_tops",
+    "lock_liked_tops_refresh",
+    "add_post_to_recent_top",
+    "remove_post_from_recent_top",
+    "hydrate_posts_queryset",
+    "build_recommendations",
+    "get_recommendations",
+    "lock_user_recommendations_refresh",
+    "fan_out_post_to_timelines",
+    "add_author_posts_to_timeline",
+    "remove_author_posts_from_timeline",
+    "trim_timelines",
     "BaseLikeViewSet",
     "CreateModelMixin",
+    "ViewerPostsStateMixin",
+    "PostsViewerState",
+    "get_post_fragments",
+    "find_image_copies",
+    "get_image_hash_fields",
+    "add_images_to_similar_index",
+    "get_image_features",
+    "get_similar_posts",
+    "query_similar_posts",
+    "create_post",
+    "stage_post",
+    "publish_pending_post",
+    "send_pending_post_status",
 ]
@@ -0,0 +1,51 @@
+import typing
+
+from django.conf import settings
+from django.db.models import Q, QuerySet
+
+from posts.models import PostImage
+
+PHASH_CHUNKS = 4
+PHASH_CHUNK_BITS = 16
+
+
+def _to_unsigned(image_hash: int) -> int:
+    return image_hash & (2**64 - 1)
+
+
+def get_image_hash_fields(image_hash: int) -> typing.Dict[str, int]:
+    fields = {
+        f"phash_{index}": image_hash >> (PHASH_CHUNK_BITS * index) & (2**PHASH_CHUNK_BITS - 1)
+        for index in range(PHASH_CHUNKS)
+    }
+    fields["phash"] = image_hash - 2**64 if image_hash >= 2**63 else image_hash
+    return fields
+
+
+def get_hamming_distance(first_hash: int, second_hash: int) -> int:
+    return (_to_unsigned(first_hash) ^ _to_unsigned(second_hash)).bit_count()
+
+
+def find_image_copies(
+    image_hash: int,
+    queryset: typing.Optional[QuerySet] = None,
+    max_distance: typing.Optional[int] = None,
+) -> typing.List[typing.Tuple[PostImage, int]]:
+    if max_distance is None:
+        max_distance = settings.IMAGE_PHASH_MAX_DISTANCE
+    if queryset is None:
+        queryset = PostImage.objects.all()  # noqa
+
+    # Pigeonhole: with 4 chunks any hash at distance up to 3 matches one of them exactly, so only indexes are hit.
+    chunks = get_image_hash_fields(image_hash)
+    lookup = Q()
+    for index in range(PHASH_CHUNKS):
+        lookup |= Q(**{f"phash_{index}": chunks[f"phash_{index}"]})
+
+    copies = []
+    for post_image in queryset.filter(lookup).order_by("pk"):
+        distance = get_hamming_distance(image_hash, post_image.phash)
+        if distance <= max_distance:
+            copies.append((post_image, distance))
+
+    return sorted(copies, key=lambda copy: copy[1])
@@ -0,0 +1,42 @@
+import typing
+
+from django.conf import settings
+from django.core.cache import cache
+from rest_framework import serializers
+
+from common.services import get_cache_versions
+from posts.models import Post
+
+
+def get_post_fragment_cache_key(post_id: int, post_version: int, author_version: int) -> str:
+    sep = settings.USER_RELATED_CACHE_NAME_SEP
+    return f"{settings.POSTS_FRAGMENT_CACHE_NAME}{sep}{post_id}{sep}{post_version}{sep}{author_version}"
+
+
+def get_post_fragments(
+    posts: typing.Iterable[Post], serializer_class: typing.Type[serializers.ModelSerializer]
+) -> typing.Dict[int, typing.Dict]:
+    posts = list(posts)
+    if not posts:
+        return {}
+
+    post_versions = get_cache_versions(settings.POSTS_FRAGMENT_VERSION_CACHE_NAME, [post.pk for post in posts])
+    author_versions = get_cache_versions(settings.USERS_FRAGMENT_VERSION_CACHE_NAME, [post.author_id for post in posts])
+    keys = {
+        post.pk: get_post_fragment_cache_key(post.pk, post_versions[post.pk], author_versions[post.author_id])
+        for post in posts
+    }
+
+    cached = cache.get_many(keys.values())
+    fragments = {post_id: cached[key] for post_id, key in keys.items() if key in cached}
+    missing = [post_id for post_id in keys if post_id not in fragments]
+
+    if missing:
+        queryset = Post.objects.filter(pk__in=missing).select_related("author").prefetch_related("images", "tags")  # noqa
+        rendered = {fragment["id"]: dict(fragment) for fragment in serializer_class(queryset, many=True).data}
+        cache.set_many(
+            {keys[post_id]: fragment for post_id, fragment in rendered.items()}, settings.POSTS_FRAGMENT_CACHE_TIME
+        )
+        fragments.update(rendered)
+
+    return fragments
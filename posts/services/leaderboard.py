@@ -0,0 +1,161 @@
+import collections
+import functools
+import typing
+from datetime import datetime, timedelta
+
+import redis
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Count
+from django.db.models.functions import TruncHour
+from django.utils import timezone
+
+from posts.models import Post, PostLike
+
+ALL_KEY = "all"
+BUCKET_KEY = "bucket"
+SEEDED_KEY = "seeded"
+REFRESHED_KEY = "refreshed"
+# Hourly, so the database repair can group likes with TruncHour.
+BUCKET_TIME = 60 * 60
+
+
+@functools.cache
+def get_leaderboard_client() -> redis.Redis:
+    return redis.Redis.from_url(settings.LEADERBOARD_REDIS_URL)
+
+
+def _get_liked_top_key(*parts: typing.Any) -> str:
+    return settings.USER_RELATED_CACHE_NAME_SEP.join(map(str, (settings.POSTS_LIKED_TOP_CACHE_NAME, *parts)))
+
+
+def _get_bucket(moment: datetime) -> int:
+    return int(moment.timestamp() // BUCKET_TIME)
+
+
+def _get_buckets_period() -> timedelta:
+    return max(period for period in settings.POSTS_LIKED_TOP_WINDOWS.values() if period is not None)
+
+
+def _get_window_buckets(period: timedelta) -> typing.List[str]:
+    # Windows are rounded up to whole buckets, the oldest one is partially out of the window.
+    current = _get_bucket(timezone.now())
+    first = _get_bucket(timezone.now() - period)
+    return [_get_liked_top_key(BUCKET_KEY, bucket) for bucket in range(first, current + 1)]
+
+
+def count_post_like(post_id: int, time_added: datetime, amount: int) -> None:
+    key = _get_liked_top_key(ALL_KEY)
+    bucket_key = _get_liked_top_key(BUCKET_KEY, _get_bucket(time_added))
+    expire = int(_get_buckets_period().total_seconds()) + BUCKET_TIME
+
+    with get_leaderboard_client().pipeline() as pipe:
+        pipe.zincrby(key, amount, post_id)
+        if time_added >= timezone.now() - _get_buckets_period():
+            pipe.zincrby(bucket_key, amount, post_id).expire(bucket_key, expire)
+        if amount < 0:
+            pipe.zremrangebyscore(key, "-inf", 0)
+        pipe.execute()
+
+
+def rebuild_liked_tops() -> None:
+    # Repairs counters from the database in background, like events keep them up to date afterwards.
+    period = _get_buckets_period()
+    expire = int(period.total_seconds()) + BUCKET_TIME
+    totals = dict(Post.objects.filter(likes_count__gt=0).values_list("pk", "likes_count"))  # noqa
+    likes = (
+        PostLike.objects.filter(time_added__gte=timezone.now() - period)  # noqa
+        .annotate(hour=TruncHour("time_added"))
+        .order_by()
+        .values("post_id", "hour")
+        .annotate(likes=Count("id"))
+        .values_list("post_id", "hour", "likes")
+    )
+    buckets = collections.defaultdict(dict)
+    for post_id, hour, count in likes:
+        buckets[_get_liked_top_key(BUCKET_KEY, _get_bucket(hour))][post_id] = count
+
+    with get_leaderboard_client().pipeline() as pipe:
+        pipe.delete(_get_liked_top_key(ALL_KEY), *_get_window_buckets(period))
+        if totals:
+            pipe.zadd(_get_liked_top_key(ALL_KEY), totals)
+        for key, counts in buckets.items():
+            pipe.zadd(key, counts).expire(key, expire)
+        pipe.set(_get_liked_top_key(SEEDED_KEY), 1)
+        pipe.execute()
+
+
+def refresh_liked_tops() -> None:
+    client = get_leaderboard_client()
+    if not client.exists(_get_liked_top_key(SEEDED_KEY)):
+        rebuild_liked_tops()
+
+    with client.pipeline() as pipe:
+        for window, period in settings.POSTS_LIKED_TOP_WINDOWS.items():
+            if period is None:
+                continue
+            key = _get_liked_top_key(window)
+            pipe.zunionstore(key, _get_window_buckets(period))
+            pipe.zremrangebyscore(key, "-inf", 0)
+            pipe.zremrangebyrank(key, 0, -settings.POSTS_LIKED_TOP_SIZE - 1)
+        pipe.set(_get_liked_top_key(REFRESHED_KEY), 1, ex=settings.POSTS_LIKED_TOP_CACHE_TIME)
+        pipe.execute()
+
+
+def lock_liked_tops_refresh() -> bool:
+    if get_leaderboard_client().exists(_get_liked_top_key(REFRESHED_KEY)):
+        return False
+    key = _get_liked_top_key(REFRESHED_KEY, "lock")
+    return cache.add(key, True, settings.POSTS_LIKED_TOP_REFRESH_TIME)
+
+
+def get_liked_top(window: str) -> typing.List[int]:
+    if window not in settings.POSTS_LIKED_TOP_WINDOWS:
+        window = settings.POSTS_LIKED_TOP_DEFAULT_WINDOW
+
+    key = _get_liked_top_key(ALL_KEY if settings.POSTS_LIKED_TOP_WINDOWS[window] is None else window)
+    post_ids = get_leaderboard_client().zrevrangebyscore(key, "+inf", "(0", start=0, num=settings.POSTS_LIKED_TOP_SIZE)
+    return [int(post_id) for post_id in post_ids]
+
+
+def _get_recent_top_key(*parts: typing.Any) -> str:
+    return settings.USER_RELATED_CACHE_NAME_SEP.join(map(str, (settings.POSTS_RECENT_TOP_CACHE_NAME, *parts)))
+
+
+def compute_recent_top() -> typing.List[int]:
+    return list(Post.objects.order_by("-id").values_list("pk", flat=True)[: settings.POSTS_RECENT_TOP_SIZE])  # noqa
+
+
+def rebuild_recent_top() -> typing.List[int]:
+    post_ids = compute_recent_top()
+
+    with get_leaderboard_client().pipeline() as pipe:
+        pipe.delete(_get_recent_top_key())
+        if post_ids:
+            pipe.zadd(_get_recent_top_key(), {post_id: post_id for post_id in post_ids})
+        pipe.set(_get_recent_top_key(SEEDED_KEY), 1, ex=settings.POSTS_RECENT_TOP_CACHE_TIME)
+        pipe.execute()
+
+    return post_ids
+
+
+def get_recent_top() -> typing.List[int]:
+    client = get_leaderboard_client()
+    # Rebuilt from the database once the seed expires, posts publishing and deletion keep it up to date meanwhile.
+    if not client.exists(_get_recent_top_key(SEEDED_KEY)):
+        return rebuild_recent_top()
+
+    post_ids = client.zrevrange(_get_recent_top_key(), 0, settings.POSTS_RECENT_TOP_SIZE - 1)
+    return [int(post_id) for post_id in post_ids]
+
+
+def add_post_to_recent_top(post_id: int) -> None:
+    # Scored by id, so concurrent publishing is merged by Redis instead of overwriting a read list.
+    with get_leaderboard_client().pipeline() as pipe:
+        pipe.zadd(_get_recent_top_key(), {post_id: post_id})
+        pipe.zremrangebyrank(_get_recent_top_key(), 0, -settings.POSTS_RECENT_TOP_SIZE - 1)
+        pipe.execute()
+
+
+def remove_post_from_recent_top(post_id: int) -> None:
+    get_leaderboard_client().zrem(_get_recent_top_key(), post_id)
@@ -4,6 +4,8 @@ from rest_framework.request import Request
 from rest_framework.response import Response
 
 from posts.models import Post
+from posts.services.fragments import get_post_fragments
+from posts.services.viewer import PostsViewerState
 
 
 class CreateModelMixin(mixins.CreateModelMixin):
@@ -32,3 +34,18 @@ class CreateModelMixin(mixins.CreateModelMixin):
             **{self.author_field: request.user},
             **{self.entity_field: get_object_or_404(self.entity_model, pk=entity_pk)},
         )
+
+
+class ViewerPostsStateMixin:
+    post_field = None
+    fragment_serializer_class = None
+
+    def get_serializer(self, *args, **kwargs) -> serializers.BaseSerializer:
+        if args and args[0] is not None:
+            instances = args[0] if kwargs.get("many") else [args[0]]
+            posts = [getattr(instance, self.post_field) if self.post_field else instance for instance in instances]
+            kwargs["context"] = self.get_serializer_context()  # noqa
+            kwargs["context"]["viewer_state"] = PostsViewerState(self.request.user, posts)  # noqa
+            if self.fragment_serializer_class is not None and posts:
+                kwargs["context"]["post_fragments"] = get_post_fragments(posts, self.fragment_serializer_class)
+        return super().get_serializer(*args, **kwargs)  # noqa
@@ -0,0 +1,119 @@
+import os
+import shutil
+import typing
+
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+from django.contrib.auth import get_user_model
+from django.core.files import File
+from django.db import transaction
+from rest_framework import serializers
+
+from posts.models import PendingPost, Post, PostImage
+from posts.services.leaderboard import add_post_to_recent_top
+from posts.services.services import get_or_create_tags
+from uploads.services import open_finished_uploads
+
+User = get_user_model()
+
+
+def create_post(
+    author: User, signature: str, tags: str, images: typing.List[File], upload_ids: typing.List[str]
+) -> Post:
+    from notifications.tasks import send_notifications
+    from posts.tasks import fan_out_post
+    from users.images import validate_image_upload
+    from users.services import PathImageTypeEnum
+    from users.tasks import make_image_derivatives
+
+    with transaction.atomic():
+        post = Post(author=author, signature=signature)
+        post.save()
+        with open_finished_uploads(author, upload_ids) as files:
+            # Dimensions come from the validated headers, so clients can lay out the post before derivatives exist.
+            post_images = [PostImage(image=file, post=post, **validate_image_upload(file)) for file in images + files]
+            post_images = PostImage.objects.bulk_create(post_images)  # noqa
+        if len(tags):
+            post.tags.add(*get_or_create_tags(list(set(tags.split(",")))))
+
+    for post_image in post_images:
+        make_image_derivatives.apply_async(args=[str(post_image.image), PathImageTypeEnum.POST], queue="images")
+    send_notifications.apply_async(args=[post.pk], queue="low_priority")
+    fan_out_post.apply_async(args=[post.pk], queue="low_priority")
+    add_post_to_recent_top(post.pk)
+
+    return post
+
+
+def stage_post(
+    author: User, signature: str, tags: str, images: typing.List[typing.Any], upload_ids: typing.List[str]
+) -> PendingPost:
+    from posts.tasks import publish_post
+
+    with transaction.atomic():
+        pending_post = PendingPost.objects.create(  # noqa
+            author=author,
+            signature=signature,
+            tags=tags,
+            images=[os.path.basename(image.name) for image in images],
+            uploads=upload_ids,
+        )
+        # Raw files are only copied here, decoding, hashing and derivatives are left to the worker.
+        os.makedirs(pending_post.staging_dir, exist_ok=True)
+        for index, image in enumerate(images):
+            with open(pending_post.get_staged_path(index), "wb") as file:
+                for chunk in image.chunks():
+                    file.write(chunk)
+
+    publish_post.apply_async(args=[str(pending_post.pk)], queue="normal_priority")
+    return pending_post
+
+
+def send_pending_post_status(pending_post: PendingPost) -> None:
+    from posts.serializers import PendingPostSerializer
+
+    async_to_sync(get_channel_layer().group_send)(
+        f"user_{pending_post.author_id}_notifications",
+        {"type": "post_status", "payload": PendingPostSerializer(instance=pending_post).data},  # noqa
+    )
+
+
+def _get_error_message(detail: typing.Any) -> str:
+    # Validation errors are strings, lists or dicts of them, the first message is enough for the status.
+    while isinstance(detail, (dict, list)) and detail:
+        detail = detail.get("detail", next(iter(detail.values()))) if isinstance(detail, dict) else detail[0]
+    return str(detail) if detail else ""
+
+
+def publish_pending_post(pending_post_id: str) -> typing.Optional[Post]:
+    pending_post = (
+        PendingPost.objects.select_related("author")  # noqa
+        .filter(pk=pending_post_id, status=PendingPost.Status.PENDING)
+        .first()
+    )
+    if pending_post is None:
+        return None
+
+    images = []
+    try:
+        for index, name in enumerate(pending_post.images):
+            images.append(File(open(pending_post.get_staged_path(index), "rb"), name=name))
+        post = create_post(pending_post.author, pending_post.signature, pending_post.tags, images, pending_post.uploads)
+    except serializers.ValidationError as error:
+        pending_post.status, pending_post.error = PendingPost.Status.FAILED, _get_error_message(error.detail)
+    except OSError:
+        pending_post.status, pending_post.error = PendingPost.Status.FAILED, "Staged images are unavailable."
+    except Exception:
+        # Unexpected errors still fail the task, but the author is never left waiting on a pending post.
+        pending_post.status, pending_post.error = PendingPost.Status.FAILED, "Post could not be published."
+        raise
+    else:
+        pending_post.status, pending_post.post = PendingPost.Status.PUBLISHED, post
+    finally:
+        for image in images:
+            image.close()
+        pending_post.save(update_fields=("status", "post", "error"))
+        shutil.rmtree(pending_post.staging_dir, ignore_errors=True)
+        send_pending_post_status(pending_post)
+
+    return pending_post.post
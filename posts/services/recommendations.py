@@ -0,0 +1,112 @@
+import typing
+
+import numpy as np
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.utils import timezone
+
+from posts.models import Post, PostLike
+from users.graph import following_ids_many
+
+User = get_user_model()
+
+
+def get_recommendations_cache_key(user_id: int) -> str:
+    return f"{settings.RECOMMENDED_CACHE_NAME}{settings.USER_RELATED_CACHE_NAME_SEP}{user_id}"
+
+
+class _Candidates:
+    def __init__(self, count: int):
+        posts = list(Post.objects.order_by("-id").values_list("pk", "author_id", "likes_count")[:count])  # noqa
+        self.ids = np.array([post[0] for post in posts], dtype=np.int64)
+        self.authors = np.array([post[1] for post in posts], dtype=np.int64)
+        self.index = {pk: position for position, pk in enumerate(self.ids.tolist())}
+
+        likes = np.array([post[2] for post in posts], dtype=np.float32)
+        self.popularity = np.log1p(likes) / max(float(np.log1p(likes).max(initial=0)), 1.0)
+
+        post_tags = Post.tags.through.objects.filter(post_id__in=self.index.keys()).values_list("post_id", "tag_id")
+        post_tags = list(post_tags)
+        self.tags = {tag_id: position for position, tag_id in enumerate({tag_id for _, tag_id in post_tags})}
+
+        self.vectors = np.zeros((len(self.ids), len(self.tags)), dtype=np.float32)
+        if post_tags:
+            rows = [self.index[post_id] for post_id, _ in post_tags]
+            columns = [self.tags[tag_id] for _, tag_id in post_tags]
+            self.vectors[rows, columns] = 1.0
+        self.vectors /= np.maximum(np.linalg.norm(self.vectors, axis=1, keepdims=True), 1.0)
+
+
+def _get_affinities(candidates: _Candidates, user_ids: typing.List[int]) -> np.ndarray:
+    users = {user_id: position for position, user_id in enumerate(user_ids)}
+    affinities = np.zeros((len(user_ids), len(candidates.tags)), dtype=np.float32)
+
+    liked_tags = PostLike.objects.filter(  # noqa
+        author_id__in=user_ids,
+        time_added__gte=timezone.now() - settings.RECOMMENDATIONS_LIKES_PERIOD,
+        post__tags__isnull=False,
+    ).values_list("author_id", "post__tags")
+    pairs = [(users[user_id], candidates.tags[tag_id]) for user_id, tag_id in liked_tags if tag_id in candidates.tags]
+
+    if pairs:
+        rows, columns = zip(*pairs)
+        np.add.at(affinities, (list(rows), list(columns)), 1.0)
+    return affinities / np.maximum(np.linalg.norm(affinities, axis=1, keepdims=True), 1.0)
+
+
+def _get_excluded(candidates: _Candidates, user_ids: typing.List[int]) -> np.ndarray:
+    users = {user_id: position for position, user_id in enumerate(user_ids)}
+    excluded = candidates.authors[np.newaxis, :] == np.array(user_ids, dtype=np.int64)[:, np.newaxis]
+
+    liked = PostLike.objects.filter(author_id__in=user_ids, post_id__gte=int(candidates.ids.min())).values_list(  # noqa
+        "author_id", "post_id"
+    )
+    for user_id, post_id in liked:
+        if post_id in candidates.index:
+            excluded[users[user_id], candidates.index[post_id]] = True
+
+    for user_id, authors in following_ids_many(user_ids).items():
+        if authors:
+            excluded[users[user_id]] |= np.isin(candidates.authors, list(authors))
+
+    return excluded
+
+
+def _build_recommendations_batch(candidates: _Candidates, user_ids: typing.List[int]) -> None:
+    scores = _get_affinities(candidates, user_ids) @ candidates.vectors.T
+    scores += settings.RECOMMENDATIONS_POPULARITY_WEIGHT * candidates.popularity
+    scores[_get_excluded(candidates, user_ids)] = -np.inf
+
+    size = min(settings.RECOMMENDATIONS_SIZE, scores.shape[1])
+    top = np.argpartition(-scores, size - 1, axis=1)[:, :size]
+    recommendations = {}
+
+    for row, user_id in enumerate(user_ids):
+        positions = top[row][np.argsort(-scores[row, top[row]], kind="stable")]
+        positions = positions[np.isfinite(scores[row, positions])]
+        recommendations[get_recommendations_cache_key(user_id)] = candidates.ids[positions].tolist()
+
+    cache.set_many(recommendations, settings.RECOMMENDATIONS_CACHE_TIME)
+
+
+def build_recommendations(user_ids: typing.Optional[typing.List[int]] = None) -> None:
+    candidates = _Candidates(settings.RECOMMENDATIONS_CANDIDATES_COUNT)
+    if not len(candidates.ids):
+        return
+
+    if user_ids is None:
+        user_ids = list(User.objects.filter(is_active=True).order_by("pk").values_list("pk", flat=True))
+
+    batch_size = settings.RECOMMENDATIONS_USERS_BATCH_SIZE
+    for start in range(0, len(user_ids), batch_size):
+        _build_recommendations_batch(candidates, user_ids[start : start + batch_size])
+
+
+def get_recommendations(user: User) -> typing.Optional[typing.List[int]]:
+    return cache.get(get_recommendations_cache_key(user.pk))
+
+
+def lock_user_recommendations_refresh(user_id: int) -> bool:
+    key = f"{get_recommendations_cache_key(user_id)}{settings.USER_RELATED_CACHE_NAME_SEP}refresh"
+    return cache.add(key, True, settings.RECOMMENDATIONS_USER_REFRESH_DELAY)
@@ -0,0 +1,145 @@
+import functools
+import os
+import typing
+
+import numpy as np
+from django.conf import settings
+
+FEATURES_SIZE = 136
+VECTORS_FILE = "vectors"
+POSTS_FILE = "posts"
+
+
+def _get_shard_path(name: str, shard: int) -> str:
+    return os.path.join(settings.SIMILAR_INDEX_DIR, f"{name}_{shard:06d}.bin")
+
+
+def _open_shard(shard: int, mode: str) -> typing.Tuple[np.memmap, np.memmap]:
+    size = settings.SIMILAR_INDEX_SHARD_SIZE
+    if mode != "r":
+        os.makedirs(settings.SIMILAR_INDEX_DIR, exist_ok=True)
+        # Shards are preallocated sparse files, so concurrent workers writing other rows never resize them.
+        for name, row_size in ((VECTORS_FILE, FEATURES_SIZE * 4), (POSTS_FILE, 8)):
+            with open(_get_shard_path(name, shard), "ab") as file:
+                if file.tell() < size * row_size:
+                    file.truncate(size * row_size)
+
+    vectors = np.memmap(_get_shard_path(VECTORS_FILE, shard), dtype=np.float32, mode=mode, shape=(size, FEATURES_SIZE))
+    posts = np.memmap(_get_shard_path(POSTS_FILE, shard), dtype=np.int64, mode=mode, shape=(size,))
+    return vectors, posts
+
+
+@functools.cache
+def _get_readable_shard(shard: int) -> typing.Tuple[np.memmap, np.memmap]:
+    return _open_shard(shard, "r")
+
+
+def get_index_shards() -> typing.List[int]:
+    if not os.path.isdir(settings.SIMILAR_INDEX_DIR):
+        return []
+
+    prefix = f"{POSTS_FILE}_"
+    return sorted(
+        int(name.removeprefix(prefix).removesuffix(".bin"))
+        for name in os.listdir(settings.SIMILAR_INDEX_DIR)
+        if name.startswith(prefix)
+    )
+
+
+def add_images_to_similar_index(rows: typing.Iterable[typing.Tuple[int, int, np.ndarray]]) -> None:
+    shards = {}
+
+    for post_image_id, post_id, features in rows:
+        shard, row = divmod(post_image_id, settings.SIMILAR_INDEX_SHARD_SIZE)
+        if shard not in shards:
+            shards[shard] = _open_shard(shard, "r+")
+        vectors, posts = shards[shard]
+        vectors[row] = features
+        # Readers skip rows without post, so row is published only after its vector is written.
+        posts[row] = post_id
+
+    for vectors, posts in shards.values():
+        vectors.flush()
+        posts.flush()
+
+
+def remove_image_from_similar_index(post_image_id: int) -> None:
+    shard, row = divmod(post_image_id, settings.SIMILAR_INDEX_SHARD_SIZE)
+    if shard not in get_index_shards():
+        return
+
+    vectors, posts = _open_shard(shard, "r+")
+    posts[row] = 0
+    posts.flush()
+    vectors[row] = 0
+    vectors.flush()
+
+
+def get_image_features(post_image_id: int) -> typing.Optional[np.ndarray]:
+    shard, row = divmod(post_image_id, settings.SIMILAR_INDEX_SHARD_SIZE)
+    if shard not in get_index_shards() or not _get_readable_shard(shard)[1][row]:
+        return None
+    return np.array(_get_readable_shard(shard)[0][row])
+
+
+def get_post_vector(post_image_ids: typing.Iterable[int]) -> typing.Optional[np.ndarray]:
+    shards = set(get_index_shards())
+    rows = []
+
+    for post_image_id in post_image_ids:
+        shard, row = divmod(post_image_id, settings.SIMILAR_INDEX_SHARD_SIZE)
+        if shard in shards and _get_readable_shard(shard)[1][row]:
+            rows.append(_get_readable_shard(shard)[0][row])
+
+    if not rows:
+        return None
+
+    vector = np.mean(rows, axis=0)
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm else None
+
+
+def query_similar_posts(
+    vectors: np.ndarray, count: int, exclude: typing.Optional[typing.Sequence[typing.Set[int]]] = None
+) -> typing.List[typing.List[int]]:
+    vectors = np.atleast_2d(vectors).astype(np.float32)
+    exclude = exclude or [set() for _ in range(len(vectors))]
+    # Posts have several images, so every shard returns more rows than posts needed.
+    candidates_count = count * settings.SIMILAR_INDEX_OVERFETCH + max(map(len, exclude), default=0)
+
+    candidates = []
+    for shard in get_index_shards():
+        shard_vectors, shard_posts = _get_readable_shard(shard)
+        # Vectors are L2-normalized, so cosine similarity of the whole batch is a single matrix product.
+        scores = vectors @ shard_vectors.T
+        scores[:, shard_posts == 0] = -np.inf
+        top = min(candidates_count, len(shard_posts))
+        rows = np.argpartition(scores, -top, axis=1)[:, -top:]
+        candidates.append((np.take_along_axis(scores, rows, axis=1), shard_posts[rows]))
+
+    results = []
+    for index in range(len(vectors)):
+        if not candidates:
+            results.append([])
+            continue
+
+        scores = np.concatenate([shard_scores[index] for shard_scores, _ in candidates])
+        post_ids = np.concatenate([shard_post_ids[index] for _, shard_post_ids in candidates])
+
+        similar = []
+        for post_id in post_ids[np.argsort(-scores, kind="stable")].tolist():
+            if post_id and post_id not in exclude[index] and post_id not in similar:
+                similar.append(post_id)
+                if len(similar) == count:
+                    break
+        results.append(similar)
+
+    return results
+
+
+def get_similar_posts(post_id: int, post_image_ids: typing.Iterable[int]) -> typing.List[int]:
+    vector = get_post_vector(post_image_ids)
+    if vector is None:
+        return []
+
+    return query_similar_posts(vector, settings.SIMILAR_POSTS_COUNT, [{post_id}])[0]
@@ -0,0 +1,96 @@
+import typing
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db.models import Count
+
+from posts.models import Post, TimelineEntry
+from users.graph import follower_ids, following_ids
+
+User = get_user_model()
+
+
+def _get_merged_on_read_authors_cache_key(user: User) -> str:
+    return f"{settings.USER_UPDATES_CACHE_NAME}{settings.USER_RELATED_CACHE_NAME_SEP}{user.pk}"
+
+
+def is_author_merged_on_read(author: User) -> bool:
+    return author.followers_count > settings.TIMELINE_FANOUT_FOLLOWERS_THRESHOLD
+
+
+def get_merged_on_read_authors(user: User) -> typing.List[int]:
+    key = _get_merged_on_read_authors_cache_key(user)
+    authors = cache.get(key)
+
+    if authors is None:
+        authors = list(
+            User.objects.filter(
+                pk__in=following_ids(user.pk), followers_count__gt=settings.TIMELINE_FANOUT_FOLLOWERS_THRESHOLD
+            ).values_list("pk", flat=True)
+        )
+        cache.set(key, authors, settings.USER_UPDATES_CACHE_TIME)
+
+    return authors
+
+
+def get_timeline_post_ids(user: User) -> typing.List[int]:
+    # Both reads are index ranges bounded by the timeline length, so timelines are capped here instead of on write.
+    limit = settings.TIMELINE_MAX_LENGTH
+    timeline = TimelineEntry.objects.filter(owner=user).order_by("-post_id").values_list("post_id", flat=True)  # noqa
+    post_ids = set(timeline[:limit])
+
+    authors = get_merged_on_read_authors(user)
+    if authors:
+        merged = Post.objects.filter(author_id__in=authors).order_by("-id").values_list("pk", flat=True)  # noqa
+        post_ids.update(merged[:limit])
+
+    return sorted(post_ids, reverse=True)[:limit]
+
+
+def trim_timelines(batch_size: int) -> int:
+    overflowing = (
+        TimelineEntry.objects.order_by()  # noqa
+        .values("owner_id")
+        .annotate(entries=Count("id"))
+        .filter(entries__gt=settings.TIMELINE_MAX_LENGTH)
+        .values_list("owner_id", flat=True)
+    )
+    trimmed = 0
+
+    for owner_id in overflowing.iterator(chunk_size=batch_size):
+        timeline = TimelineEntry.objects.filter(owner_id=owner_id).order_by("-post_id")  # noqa
+        boundary = timeline.values_list("post_id", flat=True)[settings.TIMELINE_MAX_LENGTH]
+        trimmed += timeline.filter(post_id__lte=boundary).delete()[0]
+
+    return trimmed
+
+
+def _write_timeline_entries(post: Post, follower_ids: typing.List[int]) -> None:
+    entries = [TimelineEntry(owner_id=follower_id, post=post) for follower_id in follower_ids]
+    TimelineEntry.objects.bulk_create(entries, ignore_conflicts=True)  # noqa
+
+
+def fan_out_post_to_timelines(post: Post, batch_size: int) -> None:
+    if is_author_merged_on_read(post.author):
+        return
+
+    followers = sorted(follower_ids(post.author_id))
+
+    for start in range(0, len(followers), batch_size):
+        _write_timeline_entries(post, followers[start : start + batch_size])
+
+
+def add_author_posts_to_timeline(follower: User, author: User) -> None:
+    cache.delete(_get_merged_on_read_authors_cache_key(follower))
+    if is_author_merged_on_read(author):
+        return
+
+    post_ids = Post.objects.filter(author=author).order_by("-id").values_list("pk", flat=True)  # noqa
+    entries = [TimelineEntry(owner=follower, post_id=pk) for pk in post_ids[: settings.TIMELINE_MAX_LENGTH]]
+    TimelineEntry.objects.bulk_create(entries, ignore_conflicts=True)  # noqa
+
+
+def remove_author_posts_from_timeline(follower: User, author: User) -> None:
+    cache.delete(_get_merged_on_read_authors_cache_key(follower))
+    TimelineEntry.objects.filter(owner=follower, post__author=author).delete()  # noqa
@@ -0,0 +1,47 @@
+import typing
+
+from django.contrib.auth import get_user_model
+from django.db.models import QuerySet
+
+from posts.models import Comment, Post, PostLike, Saved
+from users.graph import is_following_many
+from users.models import ExwonderUser
+
+User = get_user_model()
+
+
+class PostsViewerState:
+    def __init__(self, user: User, posts: typing.Iterable[Post]):
+        posts = list(posts)
+        post_ids = [post.pk for post in posts]
+        author_ids = {post.author_id for post in posts}
+
+        self.liked = self.__get_post_ids(PostLike.objects.filter(author=user, post_id__in=post_ids))  # noqa
+        self.commented = self.__get_post_ids(Comment.objects.filter(author=user, post_id__in=post_ids))  # noqa
+        self.saved = self.__get_post_ids(Saved.objects.filter(owner=user, post_id__in=post_ids))  # noqa
+        self.followed_authors = is_following_many(user.pk, author_ids)
+        self.commentable = {post.pk for post in posts if self.__can_comment(post)}
+
+    @staticmethod
+    def __get_post_ids(queryset: QuerySet) -> typing.Set[int]:
+        return set(queryset.values_list("post_id", flat=True))
+
+    def __can_comment(self, post: Post) -> bool:
+        match post.author.comments_private_status:
+            case ExwonderUser.CommentsPrivateStatus.EVERYONE:
+                return True
+            case ExwonderUser.CommentsPrivateStatus.FOLLOWERS:
+                return post.author_id in self.followed_authors
+        return False
+
+    def is_liked(self, post: Post) -> bool:
+        return post.pk in self.liked
+
+    def is_commented(self, post: Post) -> bool:
+        return post.pk in self.commented
+
+    def is_saved(self, post: Post) -> bool:
+        return post.pk in self.saved
+
+    def can_comment(self, post: Post) -> bool:
+        return post.pk in self.commentable
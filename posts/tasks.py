@@ -0,0 +1,54 @@
+import typing
+
+from celery import shared_task
+from django.conf import settings
+
+from posts.models import Post
+from posts.services import (
+    build_recommendations,
+    fan_out_post_to_timelines,
+    lock_liked_tops_refresh,
+    lock_user_recommendations_refresh,
+    publish_pending_post,
+    refresh_liked_tops,
+    trim_timelines,
+)
+
+
+@shared_task
+def fan_out_post(post_id: int) -> None:
+    post = Post.objects.filter(pk=post_id).first()  # noqa
+    if post:
+        fan_out_post_to_timelines(post, settings.TIMELINE_FANOUT_BATCH_SIZE)
+
+
+@shared_task
+def publish_post(pending_post_id: str) -> None:
+    publish_pending_post(pending_post_id)
+
+
+@shared_task
+def trim_posts_timelines() -> None:
+    trim_timelines(settings.TIMELINE_FANOUT_BATCH_SIZE)
+
+
+@shared_task
+def refresh_posts_liked_tops() -> None:
+    refresh_liked_tops()
+
+
+@shared_task
+def build_posts_recommendations(user_ids: typing.Optional[typing.List[int]] = None) -> None:
+    build_recommendations(user_ids)
+
+
+def schedule_user_recommendations_refresh(user_id: int) -> None:
+    if lock_user_recommendations_refresh(user_id):
+        build_posts_recommendations.apply_async(
+            args=[[user_id]], countdown=settings.RECOMMENDATIONS_USER_REFRESH_DELAY, queue="low_priority"
+        )
+
+
+def schedule_liked_tops_refresh() -> None:
+    if lock_liked_tops_refresh():
+        refresh_posts_liked_tops.apply_async(queue="low_priority")
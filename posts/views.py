@@ -1,6 +1,5 @@
 from django.conf import settings
 from django.contrib.auth import get_user_model
-from django.core.cache import cache
 from django.shortcuts import get_object_or_404
 from drf_spectacular.utils import OpenApiParameter, extend_schema, extend_schema_view
 from rest_framework import mixins, permissions, serializers, status, viewsets
@@ -8,14 +7,18 @@ from rest_framework.decorators import action
 from rest_framework.request import Request
 from rest_framework.response import Response
 
-from posts.models import Comment, CommentLike, Post, PostLike, Saved
+from posts.models import Comment, CommentLike, PendingPost, Post, PostImage, PostLike, Saved
 from posts.permissions import IsOwnerOrCreateOnly, IsOwnerOrReadOnly
 from posts.serializers import (
     CommentIDSerializer,
     CommentLikeSerializer,
     CommentSerializer,
+    PendingPostSerializer,
+    PostFragmentSerializer,
     PostIDSerializer,
+    PostImageCopySerializer,
     PostLikeSerializer,
+    PostPublishSerializer,
     PostRequestSerializer,
     PostResponseSerializer,
     SavedSerializer,
@@ -23,11 +26,19 @@ from posts.serializers import (
 from posts.services import (
     BaseLikeViewSet,
     CreateModelMixin,
+    ViewerPostsStateMixin,
+    annotate_likes_and_comments_count_posts_queryset,
     annotate_likes_count_and_is_liked_comments_queryset,
     filter_posts_queryset_by_author,
     filter_posts_queryset_by_top,
-    get_full_annotated_posts_queryset,
+    find_image_copies,
+    get_recommendations,
+    get_similar_posts,
+    hydrate_posts_queryset,
+    remove_post_from_recent_top,
 )
+from posts.tasks import schedule_liked_tops_refresh, schedule_user_recommendations_refresh
+from users.graph import is_following
 from users.models import ExwonderUser
 from users.serializers import DetailedCodeSerializer
 
@@ -57,6 +68,11 @@ User = get_user_model()
                 "Cant be used with 'user'.",
                 type=str,
             ),
+            OpenApiParameter(
+                name="window",
+                description="Time window of 'likes' top. Valid values is '24h', '7d' and 'all'. Default is 'all'.",
+                type=str,
+            ),
         ],
         responses={status.HTTP_200_OK: PostResponseSerializer, status.HTTP_403_FORBIDDEN: DetailedCodeSerializer},
         description="Endpoint to get posts of user or you or some posts tops.",
@@ -79,8 +95,28 @@ User = get_user_model()
         },
         description="Endpoint to delete your post.",
     ),
+    publish=extend_schema(
+        request=PostPublishSerializer,
+        responses={
+            status.HTTP_202_ACCEPTED: PendingPostSerializer,
+            status.HTTP_400_BAD_REQUEST: DetailedCodeSerializer,
+            status.HTTP_403_FORBIDDEN: DetailedCodeSerializer,
+        },
+        description="Endpoint to create post in background. "
+        "Track it by 'status_url' or wait for 'post_status' event in notifications websocket.",
+    ),
+    similar=extend_schema(
+        request=None,
+        responses={
+            status.HTTP_200_OK: PostResponseSerializer(many=True),
+            status.HTTP_403_FORBIDDEN: DetailedCodeSerializer,
+            status.HTTP_404_NOT_FOUND: DetailedCodeSerializer,
+        },
+        description="Endpoint to get visually similar posts to show under post.",
+    ),
 )
 class PostViewSet(
+    ViewerPostsStateMixin,
     mixins.CreateModelMixin,
     mixins.ListModelMixin,
     mixins.RetrieveModelMixin,
@@ -88,31 +124,83 @@ class PostViewSet(
     viewsets.GenericViewSet,
 ):
     serializer_class = PostResponseSerializer
+    fragment_serializer_class = PostFragmentSerializer
     permission_classes = permissions.IsAuthenticated, IsOwnerOrReadOnly
     lookup_url_kwarg = "id"
 
+    @property
+    def pagination_ordering(self) -> str:
+        return "position" if self.request.query_params.get("top") in {"likes", "recommended"} else "-id"
+
     def get_queryset(self):
         queryset = Post.objects.filter()  # noqa
 
-        if self.action != "retrieve":
+        if self.action not in {"retrieve", "similar"}:
             queryset, has_filtered = filter_posts_queryset_by_top(self.request, queryset)
             if not has_filtered:
                 queryset = filter_posts_queryset_by_author(
                     self.request, queryset, self.request.query_params.get("user", None)
                 )
         else:
-            queryset = get_full_annotated_posts_queryset(self.request, queryset)
+            queryset = annotate_likes_and_comments_count_posts_queryset(queryset)
         return queryset
 
+    def list(self, request: Request, *args, **kwargs) -> Response:
+        top = request.query_params.get("top")
+        # Missing recommendations fall back to the likes top, meanwhile they are built in background.
+        if top == "recommended" and get_recommendations(request.user) is None:
+            schedule_user_recommendations_refresh(request.user.pk)
+            top = "likes"
+        # Tops are only read on requests, a missed scheduled refresh is caught up in background too.
+        if top == "likes":
+            schedule_liked_tops_refresh()
+        return super().list(request, *args, **kwargs)
+
     def get_serializer_class(self):
         if self.action == "create":
             return PostRequestSerializer
+        if self.action == "publish":
+            return PostPublishSerializer
         return self.serializer_class
 
     def perform_create(self, serializer):
         serializer.save(author=self.request.user)
-        key = settings.POSTS_RECENT_TOP_CACHE_NAME
-        cache.delete(key)
+
+    def perform_destroy(self, instance):
+        post_id = instance.pk
+        super().perform_destroy(instance)
+        remove_post_from_recent_top(post_id)
+
+    @action(methods=["post"], detail=False, url_name="publish")
+    def publish(self, request: Request) -> Response:
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        pending_post = serializer.save(author=request.user)
+        data = PendingPostSerializer(pending_post, context=self.get_serializer_context()).data
+        return Response(data, status=status.HTTP_202_ACCEPTED, headers={"Location": data["status_url"]})
+
+    @action(methods=["get"], detail=True, url_name="similar")
+    def similar(self, request: Request, id: int) -> Response:
+        post = self.get_object()
+        post_ids = get_similar_posts(post.pk, post.images.values_list("pk", flat=True))
+        posts = hydrate_posts_queryset(Post.objects.all(), post_ids).order_by("position")  # noqa
+        return Response(self.get_serializer(posts, many=True).data)
+
+
+@extend_schema_view(
+    retrieve=extend_schema(
+        request=None,
+        responses={status.HTTP_200_OK: PendingPostSerializer, status.HTTP_404_NOT_FOUND: DetailedCodeSerializer},
+        description="Endpoint to get status of post created in background.",
+    ),
+)
+class PendingPostViewSet(mixins.RetrieveModelMixin, viewsets.GenericViewSet):
+    serializer_class = PendingPostSerializer
+    permission_classes = (permissions.IsAuthenticated,)
+    lookup_url_kwarg = "id"
+
+    def get_queryset(self):
+        return PendingPost.objects.filter(author=self.request.user)  # noqa
 
 
 @extend_schema_view(
@@ -172,6 +260,7 @@ class CommentViewSet(CreateModelMixin, mixins.ListModelMixin, mixins.DestroyMode
     serializer_class = CommentSerializer
     permission_classes = permissions.IsAuthenticated, IsOwnerOrReadOnly
     lookup_url_kwarg = "id"
+    pagination_ordering = "-time_added"
 
     def get_queryset(self):
         if self.action == "list":
@@ -190,7 +279,7 @@ class CommentViewSet(CreateModelMixin, mixins.ListModelMixin, mixins.DestroyMode
 
         match author.comments_private_status:
             case ExwonderUser.CommentsPrivateStatus.FOLLOWERS:
-                if not author.followers.select_related("follower").filter(follower=request.user).exists():
+                if not is_following(request.user.pk, author.pk):
                     raise serializers.ValidationError(
                         "You can leave your comment here only if you are follower of author of this post."
                     )
@@ -242,16 +331,21 @@ class CommentLikeViewSet(BaseLikeViewSet):
         description="Endpoint to delete post from saved.",
     ),
 )
-class SavedViewSet(CreateModelMixin, mixins.ListModelMixin, mixins.DestroyModelMixin, viewsets.GenericViewSet):
+class SavedViewSet(
+    ViewerPostsStateMixin, CreateModelMixin, mixins.ListModelMixin, mixins.DestroyModelMixin, viewsets.GenericViewSet
+):
     author_field = "owner"
+    post_field = "post"
+    fragment_serializer_class = PostFragmentSerializer
 
     serializer_class = SavedSerializer
     permission_classes = permissions.IsAuthenticated, IsOwnerOrCreateOnly
     lookup_url_kwarg = "id"
+    pagination_ordering = "-time_added"
 
     def get_queryset(self):
         queryset = self.request.user.saved_posts.filter()
-        return get_full_annotated_posts_queryset(self.request, queryset, annotated_field_prefix="post").order_by(
+        return annotate_likes_and_comments_count_posts_queryset(queryset, annotated_field_prefix="post").order_by(
             "-time_added"
         )
 
@@ -311,3 +405,32 @@ class PinPostsViewSet(viewsets.GenericViewSet):
         post.clean()
         post.save()
         return Response(status=status.HTTP_204_NO_CONTENT)
+
+
+@extend_schema_view(
+    copies=extend_schema(
+        request=None,
+        responses={
+            status.HTTP_200_OK: PostImageCopySerializer(many=True),
+            status.HTTP_403_FORBIDDEN: DetailedCodeSerializer,
+            status.HTTP_404_NOT_FOUND: DetailedCodeSerializer,
+        },
+        description="Endpoint for moderators to find copies of post image. Sorted by hamming distance of hashes.",
+    ),
+)
+class PostImageViewSet(viewsets.GenericViewSet):
+    queryset = PostImage.objects.filter(phash__isnull=False)  # noqa
+    serializer_class = PostImageCopySerializer
+    permission_classes = (permissions.IsAdminUser,)
+    lookup_url_kwarg = "id"
+
+    @action(methods=["get"], detail=True, url_name="copies")
+    def copies(self, request: Request, id: int) -> Response:
+        post_image = self.get_object()
+        copies = find_image_copies(post_image.phash, PostImage.objects.exclude(pk=post_image.pk))  # noqa
+
+        for copy, distance in copies:
+            copy.distance = distance
+
+        serializer = self.get_serializer([copy for copy, _ in copies[: settings.IMAGE_COPIES_LIMIT]], many=True)
+        return Response(serializer.data)
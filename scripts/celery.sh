@@ -1 +1,2 @@
-uv run celery -A core.celery_setup worker -E --loglevel=info --hostname=worker.basic --concurrency=3
+uv run celery -A core.celery_setup worker -E --loglevel=info --hostname=worker.images --queues=images --concurrency="$(nproc)" &
+uv run celery -A core.celery_setup worker -B -E --loglevel=info --hostname=worker.basic --queues=high_priority,normal_priority,low_priority --concurrency=3
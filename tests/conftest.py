@@ -10,6 +10,7 @@ import pytest
 from django.contrib.auth import get_user_model
 from rest_framework.test import APIClient
 
+from posts.services.similar import _get_readable_shard
 from tests.factories import CommentFactory, PostFactory, UserFactory
 
 User = get_user_model()
@@ -33,3 +34,26 @@ def post_factory() -> typing.Type[PostFactory]:
 @pytest.fixture(scope="session")
 def comment_factory() -> typing.Type[CommentFactory]:
     return CommentFactory
+
+
+@pytest.fixture(autouse=True)
+def uploads_temp_dir(settings, tmp_path) -> None:
+    settings.UPLOADS_TEMP_DIR = str(tmp_path / "uploadfiles")
+
+
+@pytest.fixture(autouse=True)
+def similar_index_dir(settings, tmp_path) -> typing.Iterator[None]:
+    settings.SIMILAR_INDEX_DIR = str(tmp_path / "similarindex")
+    yield
+    # Readable shards are memoized by number, so maps of this test's files are never reused by the next one.
+    _get_readable_shard.cache_clear()
+
+
+@pytest.fixture(autouse=True)
+def image_resize_cache_dir(settings, tmp_path) -> None:
+    settings.IMAGE_RESIZE_CACHE_DIR = str(tmp_path / "resizecache")
+
+
+@pytest.fixture(autouse=True)
+def posts_staging_dir(settings, tmp_path) -> None:
+    settings.POSTS_STAGING_DIR = str(tmp_path / "stagingfiles")
@@ -0,0 +1,120 @@
+import io
+import os
+from unittest import mock
+
+import pytest
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.test import override_settings
+from django.urls import reverse_lazy
+from PIL import Image
+from rest_framework import status
+from rest_framework.response import Response
+from rest_framework.test import APIClient
+
+from media.services import get_resize_cache_key, get_resize_cache_path, get_resized_image
+from messenger.models import Chat
+from messenger.services import create_message
+from tests import GenericTest
+
+User = get_user_model()
+pytestmark = [pytest.mark.django_db]
+
+
+class TestImageResize(GenericTest):
+    endpoint_resize = "media:resize"
+
+    def test_image_resize(self, api_client):
+        super().make_test(api_client)
+
+    def case_test(self, client: APIClient, instance: User) -> Response:
+        post = self.register_post(client, instance)
+        url = reverse_lazy(self.endpoint_resize, kwargs={"path": post.images.first().image.name})
+
+        assert client.get(f"{url}?width=100&image_format=gif").status_code == status.HTTP_400_BAD_REQUEST
+        assert client.get(f"{url}?width=0&image_format=webp").status_code == status.HTTP_400_BAD_REQUEST
+        assert client.get(f"{url}?width=100&image_format=webp").status_code == status.HTTP_400_BAD_REQUEST
+        traversal_url = reverse_lazy(self.endpoint_resize, kwargs={"path": "posts_images/../../manage.py"})
+        assert client.get(f"{traversal_url}?width=100&image_format=webp").status_code == status.HTTP_400_BAD_REQUEST
+
+        response = client.get(f"{url}?width=128&image_format=webp")
+        assert response.status_code == status.HTTP_200_OK
+        assert "immutable" in response["Cache-Control"]
+        not_modified = client.get(f"{url}?width=128&image_format=webp", HTTP_IF_NONE_MATCH=response["ETag"])
+        assert not_modified.status_code == status.HTTP_304_NOT_MODIFIED
+        return response
+
+    def assert_case_test(self, response: Response, *args) -> None:
+        assert response["Content-Type"] == "image/webp"
+        image = Image.open(io.BytesIO(b"".join(response.streaming_content)))
+        assert image.format == "WEBP"
+        assert image.width == 128
+
+
+class TestImageResizeFailure(GenericTest):
+    def test_image_resize_failure(self, api_client):
+        super().make_test(api_client)
+
+    def case_test(self, client: APIClient, instance: User) -> None:
+        path = self.register_post(client, instance).images.first().image.name
+        width = settings.IMAGE_RESIZE_WIDTHS[0]
+        with mock.patch("media.services.open_downscaled", side_effect=OSError), pytest.raises(OSError):
+            get_resized_image(path, width, "webp")
+
+        # A failed resize releases its lock file too, so it isn't left behind for every failing path.
+        cache_path = get_resize_cache_path(get_resize_cache_key(path, width, "webp"), "webp")
+        assert not os.path.exists(cache_path)
+        assert not os.path.exists(f"{cache_path}.lock")
+
+
+class TestMediaFile(GenericTest):
+    endpoint_media = "media-file"
+
+    def test_media_file(self, api_client):
+        super().make_test(api_client)
+
+    def case_test(self, client: APIClient, instance: User) -> Response:
+        post = self.register_post(client, instance)
+        image = post.images.first().image
+        url = reverse_lazy(self.endpoint_media, kwargs={"path": image.name})
+
+        response = client.get(url)
+        assert response.status_code == status.HTTP_200_OK
+        assert b"".join(response.streaming_content) == image.read()
+        assert client.get(url, HTTP_IF_NONE_MATCH=response["ETag"]).status_code == status.HTTP_304_NOT_MODIFIED
+        assert client.get(url, HTTP_RANGE=f"bytes={image.size}-").status_code == 416
+
+        return client.get(url, HTTP_RANGE="bytes=10-109"), image
+
+    def assert_case_test(self, response: Response, *args) -> None:
+        image = args[0]
+        image.seek(10)
+        assert response.status_code == status.HTTP_206_PARTIAL_CONTENT
+        assert response["Content-Range"] == f"bytes 10-109/{image.size}"
+        assert b"".join(response.streaming_content) == image.read(100)
+
+
+class TestMediaAttachmentAccess(GenericTest):
+    endpoint_media = "media-file"
+
+    def test_media_attachment_access(self, api_client):
+        super().make_test(api_client)
+
+    def case_test(self, client: APIClient, instance: User) -> Response:
+        member, stranger = self.register_users(client, 2)
+        chat = Chat.objects.create()  # noqa
+        chat.members.add(instance, member)
+        with override_settings(MESSAGES_INLINE_ATTACHMENTS=True):
+            message = create_message(chat.pk, member.pk, None, b"attachment", "file.txt", instance)
+        url = reverse_lazy(self.endpoint_media, kwargs={"path": message.attachment.name})
+
+        assert client.get(url).status_code == status.HTTP_404_NOT_FOUND
+        client.force_authenticate(stranger)
+        assert client.get(url).status_code == status.HTTP_404_NOT_FOUND
+        client.force_authenticate(member)
+        return client.get(url)
+
+    def assert_case_test(self, response: Response, *args) -> None:
+        assert response.status_code == status.HTTP_200_OK
+        assert response["Cache-Control"].startswith("private")
+        assert b"".join(response.streaming_content) == b"attachment"
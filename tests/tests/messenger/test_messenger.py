@@ -1,3 +1,6 @@
+import asyncio
+import json
+import uuid
 from typing import NamedTuple
 
 import pytest
@@ -9,6 +12,8 @@ from rest_framework.authtoken.models import Token
 
 from messenger.consumers import MessengerConsumer
 from messenger.models import Chat, Message
+from messenger.serializers import MessageSerializer
+from messenger.services import UPLOAD_FRAME_HEADER, create_message, flush_presence, mark_chat
 from tests.factories import UserFactory
 
 User = get_user_model()
@@ -64,6 +69,122 @@ class TestMessengerConsumer:
         response = await communicator.receive_json_from(DEFAULT_TIMEOUT)
         assert response["success"]
 
+    async def test_send_message_with_binary_upload(self, user1: UserData, user2: UserData):
+        chat = await database_sync_to_async(Chat.objects.create)()  # noqa
+        await database_sync_to_async(chat.members.add)(user1.user, user2.user)
+        communicator = await self.get_authenticated_communicator(user1)
+        content = b"attachment" * 100
+        await communicator.send_json_to({"type": "start_upload", "filename": "notes.txt", "size": len(content)})
+        response = await communicator.receive_json_from(DEFAULT_TIMEOUT)
+        assert response["type"] == "upload_started"
+
+        upload_id = uuid.UUID(response["upload_id"])
+        for offset in range(0, len(content), 512):
+            chunk = content[offset : offset + 512]
+            await communicator.send_to(bytes_data=UPLOAD_FRAME_HEADER.pack(upload_id.bytes, offset) + chunk)
+            response = await communicator.receive_json_from(DEFAULT_TIMEOUT)
+            assert response["type"] == "upload_progress"
+            assert response["received"] == offset + len(chunk)
+        assert response["status"] == "complete"
+
+        await communicator.send_json_to(
+            {"type": "send_message", "chat_id": chat.id, "receiver": user2.user.id, "upload_id": str(upload_id)}
+        )
+        response = await communicator.receive_json_from(DEFAULT_TIMEOUT)
+        assert response["success"]
+        message = await database_sync_to_async(Message.objects.get)(chat=chat)  # noqa
+        with message.attachment.open("rb") as file:
+            assert file.read() == content
+
+    async def test_send_message_with_invalid_upload(self, user1: UserData, user2: UserData):
+        chat = await database_sync_to_async(Chat.objects.create)()  # noqa
+        await database_sync_to_async(chat.members.add)(user1.user, user2.user)
+        communicator = await self.get_authenticated_communicator(user1)
+        message = {"type": "send_message", "chat_id": chat.id, "receiver": user2.user.id}
+
+        # Unknown uploads and inline attachments are answered with an error and the socket stays open.
+        for data in ({"upload_id": str(uuid.uuid4())}, {"attachment": "YXR0YWNobWVudA==", "attachment_name": "a.txt"}):
+            await communicator.send_json_to({**message, **data})
+            response = await communicator.receive_json_from(DEFAULT_TIMEOUT)
+            assert response["type"] == "upload_error"
+
+        await communicator.send_json_to({**message, "body": "Hi"})
+        response = await communicator.receive_json_from(DEFAULT_TIMEOUT)
+        assert response["success"]
+        assert await database_sync_to_async(Message.objects.filter(chat=chat).count)() == 1  # noqa
+
+    async def test_on_message_payload(self, user1: UserData, user2: UserData):
+        chat = await database_sync_to_async(Chat.objects.create)()  # noqa
+        await database_sync_to_async(chat.members.add)(user1.user, user2.user)
+        sender = await self.get_authenticated_communicator(user1)
+        receiver = await self.get_authenticated_communicator(user2)
+        for communicator in (sender, receiver):
+            await communicator.send_json_to({"type": "connect_to_chats"})
+
+        await sender.send_json_to({"type": "send_message", "chat_id": chat.id, "receiver": user2.user.id, "body": "Hi"})
+        response = await receiver.receive_json_from(DEFAULT_TIMEOUT)
+        while response["type"] != "on_message":
+            response = await receiver.receive_json_from(DEFAULT_TIMEOUT)
+
+        message = await database_sync_to_async(Message.objects.select_related("sender", "receiver").get)(chat=chat)
+        assert response["payload"] == json.loads(
+            json.dumps(MessageSerializer(instance=message, context={"user": user2.user}).data)
+        )
+
+        await sender.send_json_to({"type": "delete_message", "id": message.id})
+        response = await receiver.receive_json_from(DEFAULT_TIMEOUT)
+        assert response["type"] == "send_delete_message"
+        assert response["chat"]["user"]["id"] == user1.user.id
+        assert response["chat"]["last_message"] is None
+        assert response["chat"]["unread_count"] == 0
+
+    async def test_presence_across_devices(self, user1: UserData, user2: UserData):
+        chat = await database_sync_to_async(Chat.objects.create)()  # noqa
+        await database_sync_to_async(chat.members.add)(user1.user, user2.user)
+        contact = await self.get_authenticated_communicator(user2)
+        await database_sync_to_async(flush_presence)()
+
+        devices = [await self.get_authenticated_communicator(user1) for _ in range(2)]
+        await database_sync_to_async(flush_presence)()
+        response = await contact.receive_json_from(DEFAULT_TIMEOUT)
+        assert response["type"] == "user_online" and response["user"]["id"] == user1.user.id
+        assert await contact.receive_nothing()
+
+        await devices[0].disconnect()
+        await database_sync_to_async(flush_presence)()
+        assert await contact.receive_nothing()
+        await database_sync_to_async(user1.user.refresh_from_db)()
+        assert user1.user.is_online
+
+        await devices[1].disconnect()
+        await database_sync_to_async(flush_presence)()
+        response = await contact.receive_json_from(DEFAULT_TIMEOUT)
+        assert response["type"] == "user_offline"
+        await database_sync_to_async(user1.user.refresh_from_db)()
+        assert not user1.user.is_online
+
+    async def test_presence_of_idle_socket(self, user1: UserData, user2: UserData, settings):
+        settings.PRESENCE_HEARTBEAT_INTERVAL, settings.PRESENCE_TTL = 0.05, 0.2
+        chat = await database_sync_to_async(Chat.objects.create)()  # noqa
+        await database_sync_to_async(chat.members.add)(user1.user, user2.user)
+        contact = await self.get_authenticated_communicator(user2)
+        await self.get_authenticated_communicator(user1)
+        await database_sync_to_async(flush_presence)()
+        response = await contact.receive_json_from(DEFAULT_TIMEOUT)
+        assert response["type"] == "user_online"
+
+        await asyncio.sleep(settings.PRESENCE_TTL * 3)
+        await database_sync_to_async(flush_presence)()
+        assert await contact.receive_nothing()
+        await database_sync_to_async(user1.user.refresh_from_db)()
+        assert user1.user.is_online
+
+    async def test_heartbeat_before_authentication(self, user1: UserData):
+        communicator = await self.get_communicator(user1.user)
+        await communicator.send_json_to({"type": "heartbeat"})
+        response = await communicator.receive_json_from(DEFAULT_TIMEOUT)
+        assert response["type"] == "heartbeat"
+
     async def test_get_chat_history(self, user1: UserData, user2: UserData):
         chat = await database_sync_to_async(Chat.objects.create)()  # noqa
         await database_sync_to_async(chat.members.add)(user1.user, user2.user)
@@ -75,6 +196,49 @@ class TestMessengerConsumer:
         response = await communicator.receive_json_from(DEFAULT_TIMEOUT)
         assert response["type"] == "get_chat_history"
 
+    async def test_get_chat_history_pages(self, user1: UserData, user2: UserData):
+        chat = await database_sync_to_async(Chat.objects.create)()  # noqa
+        await database_sync_to_async(chat.members.add)(user1.user, user2.user)
+        messages = [
+            await database_sync_to_async(Message.objects.create)(  # noqa
+                chat=chat, sender=user1.user, receiver=user2.user, body=f"Hi {index}"
+            )
+            for index in range(3)
+        ]
+        communicator = await self.get_authenticated_communicator(user1)
+
+        await communicator.send_json_to({"type": "get_chat_history", "chat": chat.id, "limit": 2})
+        response = await communicator.receive_json_from(DEFAULT_TIMEOUT)
+        assert [message["id"] for message in response["payload"]] == [messages[2].id, messages[1].id]
+        assert response["has_more"]
+
+        await communicator.send_json_to({"type": "get_chat_history", "chat": chat.id, "before": messages[1].id})
+        response = await communicator.receive_json_from(DEFAULT_TIMEOUT)
+        assert [message["id"] for message in response["payload"]] == [messages[0].id]
+        assert not response["has_more"]
+
+        await communicator.send_json_to({"type": "get_chat_history", "chat": chat.id, "after": messages[0].id})
+        response = await communicator.receive_json_from(DEFAULT_TIMEOUT)
+        assert [message["id"] for message in response["payload"]] == [messages[2].id, messages[1].id]
+
+    async def test_connect_to_chats_inbox(self, user1: UserData, user2: UserData):
+        chat = await database_sync_to_async(Chat.objects.create)()  # noqa
+        await database_sync_to_async(chat.members.add)(user1.user, user2.user)
+        for body in ("Hi", "Are you there?"):
+            await database_sync_to_async(create_message)(chat.id, user1.user.id, body, None, None, user2.user)
+        communicator = await self.get_authenticated_communicator(user1)
+
+        await communicator.send_json_to({"type": "connect_to_chats"})
+        response = await communicator.receive_json_from(DEFAULT_TIMEOUT)
+        assert response["payload"][0]["unread_count"] == 2
+        assert response["payload"][0]["last_message"]["body"] == "Are you there?"
+        assert response["payload"][0]["user"]["id"] == user2.user.id
+
+        await database_sync_to_async(mark_chat)(chat.id, is_read=True)
+        await communicator.send_json_to({"type": "connect_to_chats"})
+        response = await communicator.receive_json_from(DEFAULT_TIMEOUT)
+        assert response["payload"][0]["unread_count"] == 0
+
     async def test_delete_message(self, user1: UserData, user2: UserData):
         chat = await database_sync_to_async(Chat.objects.create)()  # noqa
         await database_sync_to_async(chat.members.add)(user1.user, user2.user)
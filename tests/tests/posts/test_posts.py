@@ -1,15 +1,39 @@
 import json
+import os
 import typing
+import urllib.parse
+from datetime import timedelta
+from unittest import mock
 
 import pytest
+from django.conf import settings
 from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse_lazy
+from django.utils import timezone
 from rest_framework import status
 from rest_framework.response import Response
 from rest_framework.test import APIClient
 
-from posts.models import Post
+from common.models import MediaBlob
+from posts.models import Comment, PendingPost, Post, PostImage, PostLike, Saved, TimelineEntry
+from posts.services.leaderboard import (
+    get_leaderboard_client,
+    get_liked_top,
+    get_recent_top,
+    rebuild_liked_tops,
+    refresh_liked_tops,
+)
+from posts.services.recommendations import build_recommendations, lock_user_recommendations_refresh
+from posts.services.similar import get_image_features
+from posts.services.timeline import trim_timelines
+from posts.tasks import refresh_posts_liked_tops
 from tests import AssertPaginatedResponseMixin, AssertResponseMixin, GenericTest, change_user_comments_private_status
+from users.images import open_downscaled
 from users.models import ExwonderUser
 
 User = get_user_model()
@@ -85,6 +109,32 @@ class TestPostsRetrieve(AssertResponseMixin, GenericTest):
         assert content["author"]["id"] == args[1].id
         assert content["signature"] == args[0].signature
         assert len(content["images"]) == 2
+        for image in content["images"]:
+            assert image["width"] > 0 and image["height"] > 0
+            assert image["dominant_color"].startswith("#")
+            assert image["placeholder"]
+
+
+class TestPostsImageDerivatives(GenericTest):
+    endpoint_detail = "posts:posts-detail"
+
+    def test_posts_image_derivatives(self, api_client):
+        super().make_test(api_client)
+
+    def case_test(self, client: APIClient, instance: User) -> Response:
+        post = self.register_post(client, instance)
+        client.force_authenticate(instance)
+        return client.get(reverse_lazy(self.endpoint_detail, kwargs={"id": post.pk}))
+
+    def assert_case_test(self, response: Response, *args) -> None:
+        media_url = urllib.parse.urljoin(settings.HOST, settings.MEDIA_URL)
+        for image in json.loads(response.content)["images"]:
+            assert set(image["srcset"]) == set(settings.IMAGE_DERIVATIVE_FORMATS)
+            for srcset in image["srcset"].values():
+                for source in srcset.split(", "):
+                    url, width = source.split(" ")
+                    assert width.removesuffix("w") in map(str, settings.IMAGE_DERIVATIVE_SIZES.values())
+                    assert os.path.isfile(os.path.join(settings.MEDIA_ROOT, url.removeprefix(media_url)))
 
 
 class TestPostsCanCommentField(AssertResponseMixin, GenericTest):
@@ -118,6 +168,46 @@ class TestPostsCanCommentField(AssertResponseMixin, GenericTest):
         self.__check_can_comment(client, post.id, False)
 
 
+class TestPostsViewerState(GenericTest):
+    endpoint_list = "posts:posts-list"
+    endpoint_follow = "users:followings-list"
+    endpoint_disfollow = "users:followings-disfollow"
+
+    def test_posts_viewer_state(self, api_client):
+        super().make_test(api_client)
+
+    def case_test(self, client: APIClient, instance: User) -> typing.Tuple[Response, typing.List[Post]]:
+        author = self.register_users(client, 1)[0]
+        posts = [self.register_post(client, author) for _ in range(4)]
+        change_user_comments_private_status(client, author, ExwonderUser.CommentsPrivateStatus.FOLLOWERS)
+
+        PostLike.objects.create(author=instance, post=posts[0])  # noqa
+        Comment.objects.create(author=instance, post=posts[1], comment="Viewer state comment")  # noqa
+        Saved.objects.create(owner=instance, post=posts[2])  # noqa
+
+        client.force_authenticate(instance)
+        response = client.post(reverse_lazy(self.endpoint_follow), data={"following": author.pk})
+        assert response.status_code == status.HTTP_201_CREATED
+        return client.get(f"{reverse_lazy(self.endpoint_list)}?user={author.username}"), posts
+
+    def assert_case_test(self, response: Response, *args) -> None:
+        fields = ("is_liked", "is_commented", "is_saved", "can_comment")
+        states = {
+            post["id"]: tuple(post[field] for field in fields) for post in json.loads(response.content)["results"]
+        }
+        assert states == {
+            args[0][0].pk: (True, False, False, True),
+            args[0][1].pk: (False, True, False, True),
+            args[0][2].pk: (False, False, True, True),
+            args[0][3].pk: (False, False, False, True),
+        }
+
+    def after_assert(self, client: APIClient, *args) -> None:
+        client.post(reverse_lazy(self.endpoint_disfollow), data={"following": args[0][0].author_id})
+        response = client.get(f"{reverse_lazy(self.endpoint_list)}?user={args[0][0].author.username}")
+        assert not any(post["can_comment"] for post in json.loads(response.content)["results"])
+
+
 class TestPostsDelete(GenericTest):
     endpoint_list = "posts:posts-list"
     endpoint_detail = "posts:posts-detail"
@@ -133,3 +223,346 @@ class TestPostsDelete(GenericTest):
     def assert_case_test(self, response: Response, *args) -> None:
         assert response.status_code == status.HTTP_204_NO_CONTENT
         assert Post.objects.count() == 0  # noqa
+
+
+class TestPostsPublish(GenericTest):
+    endpoint_publish = "posts:posts-publish"
+
+    def test_posts_publish(self, api_client):
+        super().make_test(api_client)
+
+    def case_test(self, client: APIClient, instance: User) -> typing.Tuple[Response, Response]:
+        image_path = os.path.join(settings.STATICFILES_DIRS[0], settings.TEST_IMAGES_DIR, "image_1.jpeg")
+        client.force_authenticate(instance)
+        with open(image_path, "rb") as image:
+            response = client.post(reverse_lazy(self.endpoint_publish), data={"signature": "Later", "image0": image})
+        return response, client.get(response["Location"])
+
+    def assert_case_test(self, response: Response, *args) -> None:
+        assert response.status_code == status.HTTP_202_ACCEPTED
+        assert args[0].status_code == status.HTTP_200_OK
+        content = json.loads(args[0].content)
+        assert content["status"] == PendingPost.Status.PUBLISHED
+        post = Post.objects.get(pk=content["post"])  # noqa
+        assert post.signature == "Later"
+        assert post.images.count() == 1
+        assert not os.path.exists(PendingPost.objects.get(pk=content["id"]).staging_dir)  # noqa
+
+
+class TestPostsInvalidImage(GenericTest):
+    endpoint_list = "posts:posts-list"
+
+    def test_posts_invalid_image(self, api_client):
+        super().make_test(api_client)
+
+    def case_test(self, client: APIClient, instance: User) -> Response:
+        client.force_authenticate(instance)
+        image = SimpleUploadedFile("image.jpg", b"GIF89a" + b"\x00" * 64, content_type="image/jpeg")
+        return client.post(reverse_lazy(self.endpoint_list), data={"signature": "Broken", "image0": image})
+
+    def assert_case_test(self, response: Response, *args) -> None:
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+        assert Post.objects.count() == 0  # noqa
+
+
+class TestPostsImagesDeduplication(GenericTest):
+    endpoint_detail = "posts:posts-detail"
+
+    def test_posts_images_deduplication(self, api_client):
+        super().make_test(api_client)
+
+    def case_test(self, client: APIClient, instance: User) -> typing.Tuple[Response, Post]:
+        first_post = self.register_post(client, instance)
+        second_post = self.register_post(client, instance)
+        client.force_authenticate(instance)
+        return client.delete(reverse_lazy(self.endpoint_detail, kwargs={"id": first_post.pk})), second_post
+
+    def assert_case_test(self, response: Response, *args) -> None:
+        assert response.status_code == status.HTTP_204_NO_CONTENT
+        for post_image in PostImage.objects.filter(post=args[0]):  # noqa
+            assert post_image.image.storage.exists(post_image.image.name)
+            assert MediaBlob.objects.get(name=post_image.image.name).references == 1  # noqa
+
+
+class TestPostsImagesReprocessing(GenericTest):
+    def test_posts_images_reprocessing(self, api_client):
+        super().make_test(api_client)
+
+    def case_test(self, client: APIClient, instance: User) -> typing.Tuple[None, Post, Post]:
+        with mock.patch("users.images.open_downscaled", wraps=open_downscaled) as decoded:
+            first_post = self.register_post(client, instance)
+            first_decodes = decoded.call_count
+            second_post = self.register_post(client, instance)
+        # Each source is decoded once, an already processed file isn't decoded again.
+        assert first_decodes <= first_post.images.count()
+        assert decoded.call_count == first_decodes
+        return None, first_post, second_post
+
+    def assert_case_test(self, response: None, *args) -> None:
+        fields = ("width", "height", "dominant_color", "placeholder", "phash", "has_derivatives")
+        processed = {image.image.name: image for image in args[0].images.all()}
+        for post_image in args[1].images.all():
+            source = processed[post_image.image.name]
+            assert [getattr(post_image, field) for field in fields] == [getattr(source, field) for field in fields]
+            assert post_image.has_derivatives
+            assert get_image_features(post_image.pk) is not None
+
+
+class TestPostImagesCopies(GenericTest):
+    endpoint_copies = "posts:post-images-copies"
+
+    def test_post_images_copies(self, api_client):
+        super().make_test(api_client)
+
+    def case_test(self, client: APIClient, instance: User) -> typing.Tuple[Response, Post, Response]:
+        first_post = self.register_post(client, instance)
+        second_post = self.register_post(client, instance)
+        url = reverse_lazy(self.endpoint_copies, kwargs={"id": first_post.images.first().pk})
+
+        client.force_authenticate(instance)
+        forbidden_response = client.get(url)
+        instance.is_staff = True
+        instance.save()
+        return client.get(url), second_post, forbidden_response
+
+    def assert_case_test(self, response: Response, *args) -> None:
+        assert args[1].status_code == status.HTTP_403_FORBIDDEN
+        assert response.status_code == status.HTTP_200_OK
+        copies = json.loads(response.content)
+        assert copies[0]["post"] == args[0].pk
+        assert copies[0]["distance"] == 0
+
+
+class TestPostsSimilar(GenericTest):
+    endpoint_similar = "posts:posts-similar"
+
+    def test_posts_similar(self, api_client):
+        super().make_test(api_client)
+
+    def case_test(self, client: APIClient, instance: User) -> typing.Tuple[Response, Post, Post]:
+        first_post = self.register_post(client, instance)
+        second_post = self.register_post(client, instance)
+        client.force_authenticate(instance)
+        return client.get(reverse_lazy(self.endpoint_similar, kwargs={"id": first_post.pk})), first_post, second_post
+
+    def assert_case_test(self, response: Response, *args) -> None:
+        assert response.status_code == status.HTTP_200_OK
+        post_ids = [post["id"] for post in json.loads(response.content)]
+        assert post_ids == [args[1].pk]
+
+
+class TestPostsRecentTop(GenericTest):
+    endpoint_list = "posts:posts-list"
+    endpoint_detail = "posts:posts-detail"
+
+    def test_posts_recent_top(self, api_client):
+        super().make_test(api_client)
+
+    def case_test(self, client: APIClient, instance: User) -> typing.Tuple[Response, Post, Post]:
+        old_post = self.register_post(client, instance)
+        client.force_authenticate(instance)
+        assert client.get(f"{reverse_lazy(self.endpoint_list)}?top=recent").status_code == status.HTTP_200_OK
+
+        # New posts are merged into the stored ids instead of invalidating them.
+        new_post = self.register_post(client, instance)
+        with mock.patch("posts.services.leaderboard.compute_recent_top") as compute_recent_top:
+            assert get_recent_top()[:2] == [new_post.pk, old_post.pk]
+        compute_recent_top.assert_not_called()
+
+        client.force_authenticate(instance)
+        response = client.delete(reverse_lazy(self.endpoint_detail, kwargs={"id": old_post.pk}))
+        assert response.status_code == status.HTTP_204_NO_CONTENT
+        return client.get(f"{reverse_lazy(self.endpoint_list)}?top=recent"), old_post, new_post
+
+    def assert_case_test(self, response: Response, *args) -> None:
+        posts = json.loads(response.content)["results"]
+        assert posts[0]["id"] == args[1].pk
+        assert args[0].pk not in {post["id"] for post in posts}
+        assert args[0].pk not in get_recent_top()
+        assert all(post["likes_count"] == 0 and len(post["images"]) == 2 for post in posts)
+
+
+class TestPostsLikedTop(GenericTest):
+    endpoint_list = "posts:posts-list"
+
+    def test_posts_liked_top(self, api_client):
+        super().make_test(api_client)
+
+    def case_test(
+        self, client: APIClient, instance: User
+    ) -> typing.Tuple[typing.Dict[str, Response], Post, Post, User]:
+        old_post, new_post = self.register_post(client, instance), self.register_post(client, instance)
+        users = self.register_users(client, 2)
+        for user in users:
+            PostLike.objects.create(author=user, post=old_post)  # noqa
+        PostLike.objects.create(author=users[0], post=new_post)  # noqa
+
+        # Likes are moved to the past behind the signals' back, so counters are repaired from the database.
+        PostLike.objects.filter(post=old_post).update(time_added=timezone.now() - timedelta(days=10))  # noqa
+        rebuild_liked_tops()
+        refresh_liked_tops()
+
+        client.force_authenticate(instance)
+        responses = {
+            window: client.get(f"{reverse_lazy(self.endpoint_list)}?top=likes&window={window}")
+            for window in settings.POSTS_LIKED_TOP_WINDOWS
+        }
+        return responses, old_post, new_post, instance
+
+    def assert_case_test(self, response: typing.Dict[str, Response], *args) -> None:
+        post_ids = {
+            window: [post["id"] for post in json.loads(res.content)["results"]] for window, res in response.items()
+        }
+        assert post_ids == {"24h": [args[1].pk], "7d": [args[1].pk], "all": [args[0].pk, args[1].pk]}
+
+    def after_assert(self, client: APIClient, *args) -> None:
+        old_post, new_post, instance = args
+        # The all-time top follows like events at once, windows on the next refresh.
+        PostLike.objects.create(author=instance, post=new_post)  # noqa
+        PostLike.objects.create(author=old_post.likes.first().author, post=new_post)  # noqa
+        assert get_liked_top("all") == [new_post.pk, old_post.pk]
+        PostLike.objects.filter(post=old_post).delete()  # noqa
+        refresh_liked_tops()
+        assert {window: get_liked_top(window) for window in settings.POSTS_LIKED_TOP_WINDOWS} == {
+            "24h": [new_post.pk],
+            "7d": [new_post.pk],
+            "all": [new_post.pk],
+        }
+
+        # A missing top is served empty and rebuilt in background, never aggregated on the request.
+        get_leaderboard_client().flushdb()
+        cache.clear()
+        with mock.patch.object(refresh_posts_liked_tops, "apply_async") as apply_async:
+            with CaptureQueriesContext(connection) as queries:
+                response = client.get(f"{reverse_lazy(self.endpoint_list)}?top=likes&window=7d")
+        assert json.loads(response.content)["results"] == []
+        assert not any("COUNT(" in query["sql"] for query in queries.captured_queries)
+        apply_async.assert_called_once()
+
+
+class TestPostsRecommended(GenericTest):
+    endpoint_list = "posts:posts-list"
+    endpoint_follow = "users:followings-list"
+
+    def test_posts_recommended(self, api_client):
+        super().make_test(api_client)
+
+    def case_test(self, client: APIClient, instance: User) -> typing.Tuple[Response, User, Post, typing.List[Post]]:
+        followed, author, other_author = self.register_users(client, 3)
+        own_post, followed_post = self.register_post(client, instance), self.register_post(client, followed)
+        liked_post, affine_post = self.register_post(client, author), self.register_post(client, other_author)
+        affine_post.tags.add(*liked_post.tags.all())
+        PostLike.objects.create(author=instance, post=liked_post)  # noqa
+
+        client.force_authenticate(instance)
+        response = client.post(reverse_lazy(self.endpoint_follow), data={"following": followed.pk})
+        assert response.status_code == status.HTTP_201_CREATED
+
+        build_recommendations([instance.pk])
+        response = client.get(f"{reverse_lazy(self.endpoint_list)}?top=recommended")
+        return response, instance, affine_post, [own_post, followed_post, liked_post]
+
+    def assert_case_test(self, response: Response, *args) -> None:
+        assert response.status_code == status.HTTP_200_OK
+        post_ids = [post["id"] for post in json.loads(response.content)["results"]]
+        # Tags of liked posts outweigh popularity, own, liked and followed authors' posts are never recommended.
+        assert post_ids[0] == args[1].pk
+        assert not {post.pk for post in args[2]} & set(post_ids)
+
+    def after_assert(self, client: APIClient, *args) -> None:
+        cache.clear()
+        client.force_authenticate(args[0])
+        response = client.get(f"{reverse_lazy(self.endpoint_list)}?top=recommended")
+        assert response.status_code == status.HTTP_200_OK
+        assert not lock_user_recommendations_refresh(args[0].pk)
+
+
+class TestPostsUpdates(AssertPaginatedResponseMixin, GenericTest):
+    endpoint_list = "posts:posts-list"
+    endpoint_follow = "users:followings-list"
+    endpoint_disfollow = "users:followings-disfollow"
+
+    def test_posts_updates(self, api_client):
+        super().make_test(api_client)
+
+    def case_test(self, client: APIClient, instance: User) -> Response:
+        author = self.register_users(client, 1)[0]
+        self.register_post(client, author)
+
+        client.force_authenticate(instance)
+        response = client.post(reverse_lazy(self.endpoint_follow), data={"following": author.pk})
+        assert response.status_code == status.HTTP_201_CREATED
+
+        for _ in range(self.list_tests_count - 1):
+            self.register_post(client, author)
+
+        client.force_authenticate(instance)
+        return client.get(f"{reverse_lazy(self.endpoint_list)}?top=updates"), instance, author
+
+    def assert_case_test(self, response: Response, *args) -> None:
+        content = self.assert_paginated_response(response)
+        for post in content["results"]:
+            assert post["author"]["id"] == args[1].id
+
+    def after_assert(self, client: APIClient, *args) -> None:
+        client.force_authenticate(args[0])
+        client.post(reverse_lazy(self.endpoint_disfollow), data={"following": args[1].pk})
+        response = client.get(f"{reverse_lazy(self.endpoint_list)}?top=updates")
+        assert len(json.loads(response.content)["results"]) == 0
+
+
+class TestPostsTimelineLength(GenericTest):
+    endpoint_list = "posts:posts-list"
+    endpoint_follow = "users:followings-list"
+
+    def test_posts_timeline_length(self, api_client):
+        super().make_test(api_client)
+
+    def case_test(self, client: APIClient, instance: User) -> typing.Tuple[Response, User, typing.List[Post]]:
+        author = self.register_users(client, 1)[0]
+        client.force_authenticate(instance)
+        response = client.post(reverse_lazy(self.endpoint_follow), data={"following": author.pk})
+        assert response.status_code == status.HTTP_201_CREATED
+        posts = [self.register_post(client, author) for _ in range(3)]
+
+        client.force_authenticate(instance)
+        with override_settings(TIMELINE_MAX_LENGTH=2):
+            response = client.get(f"{reverse_lazy(self.endpoint_list)}?top=updates")
+        return response, instance, posts
+
+    def assert_case_test(self, response: Response, *args) -> None:
+        assert response.status_code == status.HTTP_200_OK
+        # Only the newest entries of an overflowing timeline are read.
+        post_ids = [post["id"] for post in json.loads(response.content)["results"]]
+        assert post_ids == [post.pk for post in reversed(args[1][1:])]
+
+    def after_assert(self, client: APIClient, *args) -> None:
+        assert TimelineEntry.objects.filter(owner=args[0]).count() == 3  # noqa
+        with override_settings(TIMELINE_MAX_LENGTH=2):
+            assert trim_timelines(batch_size=10) == 1
+        timeline = TimelineEntry.objects.filter(owner=args[0]).values_list("post_id", flat=True)  # noqa
+        assert set(timeline) == {post.pk for post in args[1][1:]}
+
+
+class TestPostsFragmentInvalidation(GenericTest):
+    endpoint_detail = "posts:posts-detail"
+    endpoint_like = "posts:likes-list"
+
+    def test_posts_fragment_invalidation(self, api_client):
+        super().make_test(api_client)
+
+    def case_test(self, client: APIClient, instance: User) -> Response:
+        post = self.register_post(client, instance)
+        client.force_authenticate(instance)
+        url = reverse_lazy(self.endpoint_detail, kwargs={"id": post.pk})
+        assert json.loads(client.get(url).content)["likes_count"] == 0
+
+        client.post(reverse_lazy(self.endpoint_like), data={"post_id": post.pk})
+        return client.get(url), instance
+
+    def assert_case_test(self, response: Response, *args) -> None:
+        content = json.loads(response.content)
+        assert response.status_code == status.HTTP_200_OK
+        assert content["likes_count"] == 1
+        assert content["is_liked"] is True
+        assert content["author"]["username"] == args[0].username
@@ -1,11 +1,14 @@
+import io
+
 import pytest
 from django.contrib.auth import get_user_model
+from django.core.management import call_command
 from django.urls import reverse_lazy
 from rest_framework import status
 from rest_framework.response import Response
 from rest_framework.test import APIClient
 
-from posts.models import PostLike
+from posts.models import Post, PostLike
 from tests import GenericTest
 
 User = get_user_model()
@@ -38,3 +41,23 @@ class TestLikesDelete(GenericTest):
     def assert_case_test(self, response: Response, *args) -> None:
         assert response.status_code == status.HTTP_204_NO_CONTENT
         assert PostLike.objects.filter().count() == 0  # noqa
+
+
+class TestLikesCounter(GenericTest):
+    endpoint_list = "posts:likes-list"
+    endpoint_detail = "posts:likes-detail"
+
+    def test_likes_counter(self, api_client):
+        super().make_test(api_client)
+
+    def case_test(self, client: APIClient, instance: User) -> None:
+        user, post_id = self.register_like(client, instance)
+        assert Post.objects.get(pk=post_id).likes_count == 1  # noqa
+
+        Post.objects.filter(pk=post_id).update(likes_count=10)  # noqa
+        call_command("reconcile_counters", stdout=io.StringIO())
+        assert Post.objects.get(pk=post_id).likes_count == 1  # noqa
+
+        client.force_authenticate(instance)
+        client.delete(reverse_lazy(self.endpoint_detail, kwargs={"post_id": post_id}))
+        assert Post.objects.get(pk=post_id).likes_count == 0  # noqa
@@ -0,0 +1,67 @@
+import json
+import os
+
+import pytest
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.urls import reverse_lazy
+from rest_framework import status
+from rest_framework.response import Response
+from rest_framework.test import APIClient
+
+from posts.models import Post
+from tests import GenericTest
+from tests.mixins import IMAGES_FOR_TEST_NAMES
+from uploads.models import UploadSession
+
+User = get_user_model()
+pytestmark = [pytest.mark.django_db]
+
+
+class TestChunkedUploadPost(GenericTest):
+    endpoint_list = "uploads:sessions-list"
+    endpoint_detail = "uploads:sessions-detail"
+    endpoint_finalize = "uploads:sessions-finalize"
+    endpoint_posts = "posts:posts-list"
+
+    def test_chunked_upload_post(self, api_client):
+        super().make_test(api_client)
+
+    def upload_chunk(self, client: APIClient, upload_id: str, content: bytes, start: int) -> Response:
+        end = start + len(content) - 1
+        return client.put(
+            reverse_lazy(self.endpoint_detail, kwargs={"id": upload_id}),
+            data=content,
+            content_type="application/octet-stream",
+            HTTP_CONTENT_RANGE=f"bytes {start}-{end}/{self.size}",
+        )
+
+    def case_test(self, client: APIClient, instance: User) -> Response:
+        path = os.path.join(settings.STATICFILES_DIRS[0], settings.TEST_IMAGES_DIR, IMAGES_FOR_TEST_NAMES[0])
+        with open(path, "rb") as image:
+            content = image.read()
+        self.size = len(content)
+        middle = self.size // 2
+
+        client.force_authenticate(instance)
+        response = client.post(reverse_lazy(self.endpoint_list), data={"filename": "image.jpeg", "size": self.size})
+        assert response.status_code == status.HTTP_201_CREATED
+        upload_id = json.loads(response.content)["id"]
+
+        assert self.upload_chunk(client, upload_id, content[:middle], 0).status_code == status.HTTP_200_OK
+        response = self.upload_chunk(client, upload_id, content[middle + 1 :], middle + 1)
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+        response = client.get(reverse_lazy(self.endpoint_detail, kwargs={"id": upload_id}))
+        assert json.loads(response.content)["received"] == middle
+
+        assert self.upload_chunk(client, upload_id, content[middle:], middle).status_code == status.HTTP_200_OK
+        response = client.post(reverse_lazy(self.endpoint_finalize, kwargs={"id": upload_id}))
+        assert json.loads(response.content)["status"] == UploadSession.Status.COMPLETE
+
+        return client.post(reverse_lazy(self.endpoint_posts), data={"signature": "uploaded", "uploads": upload_id})
+
+    def assert_case_test(self, response: Response, *args) -> None:
+        assert response.status_code == status.HTTP_201_CREATED
+        post = Post.objects.get(signature="uploaded")  # noqa
+        assert post.images.count() == 1
+        assert UploadSession.objects.count() == 0  # noqa
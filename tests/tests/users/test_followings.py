@@ -8,6 +8,7 @@ from rest_framework.response import Response
 from rest_framework.test import APIClient
 
 from tests import FollowTestMode, FollowTestService, GenericTest, IterableFollowingRelationsMixin
+from users.graph import following_ids, is_following
 
 User = get_user_model()
 pytestmark = [pytest.mark.django_db]
@@ -33,11 +34,21 @@ class TestFollowingsDisfollow(IterableFollowingRelationsMixin, GenericTest):
 
     def case_test(self, client: APIClient, instance: typing.Tuple) -> typing.Tuple[Response, User]:
         client.force_authenticate(instance[0])
-        return client.post(reverse_lazy(self.endpoint_disfollow), data={"following": instance[1].pk}), instance[0]
+        follower, following = instance
+        follower.refresh_from_db()
+        following.refresh_from_db()
+        assert follower.followings_count == 1 and following.followers_count == following.followers.count()
+        assert is_following(follower.pk, following.pk)
+        response = client.post(reverse_lazy(self.endpoint_disfollow), data={"following": following.pk})
+        return response, follower, following
 
     def assert_case_test(self, response: Response, *args) -> None:
         assert response.status_code == status.HTTP_204_NO_CONTENT
         assert args[0].following.count() == 0
+        args[0].refresh_from_db()
+        args[1].refresh_from_db()
+        assert args[0].followings_count == 0 and args[1].followers_count == args[1].followers.count()
+        assert not is_following(args[0].pk, args[1].pk)
 
 
 class TestFollowingsOfUser(GenericTest):
@@ -70,3 +81,21 @@ class TestFollowingsOfEachUser(GenericTest):
 
     def case_test(self, client: APIClient, instance: User) -> None:
         self.service.make_follow_test(client)
+
+
+class TestFollowingsUserDeletion(GenericTest):
+    endpoint_list = "users:followings-list"
+
+    def test_followings_user_deletion(self, api_client):
+        super().make_test(api_client)
+
+    def case_test(self, client: APIClient, instance: User) -> None:
+        following = self.register_users(client, 1)[0]
+        client.force_authenticate(instance)
+        response = client.post(reverse_lazy(self.endpoint_list), data={"following": following.pk})
+        assert response.status_code == status.HTTP_201_CREATED
+        assert following.pk in following_ids(instance.pk)
+
+        following_pk = following.pk
+        following.delete()
+        assert following_pk not in following_ids(instance.pk)
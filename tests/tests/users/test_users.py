@@ -1,19 +1,31 @@
 import json
+import os
 import random
 import secrets
 import string
 import typing
+import urllib.parse
+from unittest import mock
 
 import pytest
 import pytz
+from django.conf import settings
 from django.contrib.auth import authenticate, get_user_model
+from django.core.files.uploadhandler import MemoryFileUploadHandler
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse_lazy
 from rest_framework import status
 from rest_framework.response import Response
 from rest_framework.test import APIClient
 
+from common.models import MediaBlob
+from common.pagination import CursorPagination
 from tests import AssertPaginatedResponseMixin, AssertResponseMixin, GenericTest
+from users.images import get_media_path
 from users.models import ExwonderUser
+from users.services import PathImageTypeEnum, get_upload_crop_path, get_upload_derivative_path
 
 User = get_user_model()
 pytestmark = [pytest.mark.django_db]
@@ -71,6 +83,71 @@ class TestUsersSearch(AssertPaginatedResponseMixin, GenericTest):
         User.objects.filter(username__startswith="searchu").delete()
 
 
+class TestUsersSearchPagination(GenericTest):
+    endpoint_list = "users:account-list"
+
+    def test_users_search_pagination(self, api_client):
+        super().make_test(api_client)
+
+    def case_test(
+        self, client: APIClient, instance: User
+    ) -> typing.Tuple[typing.List[ResponseContent], typing.List[User], ResponseContent]:
+        users = [self.User.stub(username=f"pageu{index}{secrets.token_hex(4)}") for index in range(5)]
+        users = self.register_users(client, len(users), users=users)
+        # Ties on followers_count used to be split by offsets, which skip or repeat rows once counters change.
+        User.objects.filter(pk__in=[user.pk for user in users[:2]]).update(followers_count=1)  # noqa
+
+        client.force_authenticate(instance)
+        url, pages = f"{reverse_lazy(self.endpoint_list)}?search=pageu", []
+        with mock.patch.object(CursorPagination, "page_size", 2):
+            while url:
+                content = json.loads(client.get(url).content)
+                pages.append(content)
+                url = content["next"]
+            previous = json.loads(client.get(pages[1]["previous"]).content)
+        return pages, users, previous
+
+    def assert_case_test(self, response: typing.List[ResponseContent], *args) -> None:
+        results = [user for page in response for user in page["results"]]
+        assert [len(page["results"]) for page in response] == [2, 2, 1]
+        assert sorted(user["id"] for user in results) == sorted(user.pk for user in args[0])
+        assert [user["followers_count"] for user in results] == [1, 1, 0, 0, 0]
+        assert args[1]["results"] == response[0]["results"]
+
+    def after_assert(self, client: APIClient, *args) -> None:
+        User.objects.filter(username__startswith="pageu").delete()
+
+
+class TestUsersSearchFollowed(GenericTest):
+    endpoint_list = "users:account-list"
+    endpoint_follow = "users:followings-list"
+
+    def test_users_search_followed(self, api_client):
+        super().make_test(api_client)
+
+    def case_test(self, client: APIClient, instance: User) -> typing.Tuple[Response, User, typing.List[User]]:
+        users = [self.User.stub(username=f"followu{index}{secrets.token_hex(4)}") for index in range(2)]
+        users = self.register_users(client, len(users), users=users)
+        client.force_authenticate(instance)
+        response = client.post(reverse_lazy(self.endpoint_follow), data={"following": users[0].pk})
+        assert response.status_code == status.HTTP_201_CREATED
+
+        with CaptureQueriesContext(connection) as queries:
+            response = client.get(f"{reverse_lazy(self.endpoint_list)}?search=followu")
+        return response, queries, users
+
+    def assert_case_test(self, response: Response, *args) -> None:
+        assert response.status_code == status.HTTP_200_OK
+        followed = {user["id"]: user["is_followed"] for user in json.loads(response.content)["results"]}
+        assert followed == {args[1][0].pk: True, args[1][1].pk: False}
+        # Follow state comes from the social graph, the following set is never inlined into the list query.
+        users_queries = [query["sql"] for query in args[0].captured_queries if "LIKE" in query["sql"]]
+        assert users_queries and not any(" IN (" in query for query in users_queries)
+
+    def after_assert(self, client: APIClient, *args) -> None:
+        User.objects.filter(username__startswith="followu").delete()
+
+
 class TestUsersFull(AssertResponseMixin, GenericTest):
     endpoint_list = "users:full-user"
 
@@ -143,6 +220,94 @@ class TestUsersUpdate(GenericTest):
         return content
 
 
+class TestUsersAvatarDerivatives(GenericTest):
+    endpoint_detail = "users:full-user"
+    endpoint_update = "users:account-update"
+
+    def test_users_avatar_derivatives(self, api_client):
+        super().make_test(api_client)
+
+    def case_test(self, client: APIClient, instance: User) -> Response:
+        client.force_authenticate(instance)
+        url = f"{reverse_lazy(self.endpoint_detail)}?username={instance.username}&fields=all"
+        assert json.loads(client.get(url).content)["avatar_srcset"] is None
+
+        image_path = os.path.join(settings.STATICFILES_DIRS[0], settings.TEST_IMAGES_DIR, "image_1.jpeg")
+        with open(image_path, "rb") as image:
+            response = client.patch(reverse_lazy(self.endpoint_update), data={"avatar": image}, format="multipart")
+        assert response.status_code == status.HTTP_204_NO_CONTENT
+        return client.get(url)
+
+    def assert_case_test(self, response: Response, *args) -> None:
+        media_url = urllib.parse.urljoin(settings.HOST, settings.MEDIA_URL)
+        srcset = json.loads(response.content)["avatar_srcset"]
+        assert set(srcset) == set(settings.IMAGE_DERIVATIVE_FORMATS)
+        for sources in srcset.values():
+            for source in sources.split(", "):
+                url, _ = source.split(" ")
+                assert os.path.isfile(os.path.join(settings.MEDIA_ROOT, url.removeprefix(media_url)))
+
+
+class TestUsersAvatarReplacement(GenericTest):
+    endpoint_update = "users:account-update"
+
+    def test_users_avatar_replacement(self, api_client):
+        super().make_test(api_client)
+
+    def __update_avatar(self, client: APIClient, image_name: str) -> Response:
+        image_path = os.path.join(settings.STATICFILES_DIRS[0], settings.TEST_IMAGES_DIR, image_name)
+        with open(image_path, "rb") as image, TestCase.captureOnCommitCallbacks(execute=True):
+            return client.patch(reverse_lazy(self.endpoint_update), data={"avatar": image}, format="multipart")
+
+    def case_test(self, client: APIClient, instance: User) -> typing.Tuple[Response, str, typing.List[str]]:
+        client.force_authenticate(instance)
+        assert self.__update_avatar(client, "image_1.jpeg").status_code == status.HTTP_204_NO_CONTENT
+        old_avatar = str(User.objects.get(pk=instance.pk).avatar)
+        old_paths = [old_avatar, get_upload_crop_path(old_avatar, PathImageTypeEnum.AVATAR)]
+        for size in settings.IMAGE_DERIVATIVE_SIZES:
+            for image_format in settings.IMAGE_DERIVATIVE_FORMATS:
+                old_paths.append(get_upload_derivative_path(old_avatar, PathImageTypeEnum.AVATAR, size, image_format))
+        assert all(os.path.isfile(get_media_path(path)) for path in old_paths)
+
+        return self.__update_avatar(client, "image_2.jpg"), old_avatar, old_paths
+
+    def assert_case_test(self, response: Response, *args) -> None:
+        assert response.status_code == status.HTTP_204_NO_CONTENT
+        # The replaced avatar has no other references, so its blob, crop and derivatives are removed.
+        assert not MediaBlob.objects.filter(name=args[0]).exists()  # noqa
+        assert not any(os.path.exists(get_media_path(path)) for path in args[1])
+
+
+class TestUsersAvatarTooLarge(GenericTest):
+    endpoint_update = "users:account-update"
+
+    def test_users_avatar_too_large(self, api_client):
+        super().make_test(api_client)
+
+    def case_test(self, client: APIClient, instance: User) -> typing.Tuple[Response, User, int, mock.MagicMock]:
+        client.force_authenticate(instance)
+        image_path = os.path.join(settings.STATICFILES_DIRS[0], settings.TEST_IMAGES_DIR, "image_1.jpeg")
+        max_size = os.path.getsize(image_path) // 4
+        receive = MemoryFileUploadHandler.receive_data_chunk
+
+        with (
+            override_settings(IMAGE_UPLOAD_MAX_SIZE=max_size),
+            mock.patch.object(
+                MemoryFileUploadHandler, "receive_data_chunk", autospec=True, side_effect=receive
+            ) as chunks,
+            open(image_path, "rb") as image,
+        ):
+            response = client.patch(reverse_lazy(self.endpoint_update), data={"avatar": image}, format="multipart")
+        return response, instance, max_size, chunks
+
+    def assert_case_test(self, response: Response, *args) -> None:
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+        # Reading stops at the limit, the rest of the file is never passed to the storing handlers.
+        assert sum(len(call.args[1]) for call in args[2].call_args_list) <= args[1]
+        user = User.objects.get(pk=args[0].pk)
+        assert str(user.avatar) == str(args[0].avatar)
+
+
 class TestUsersLogin(GenericTest):
     endpoint_list = "users:account-list"
     endpoint_detail = "users:account-detail"
@@ -0,0 +1,13 @@
+from django.contrib import admin
+
+from uploads.models import UploadSession
+
+
+@admin.register(UploadSession)
+class UploadSessionAdmin(admin.ModelAdmin):
+    list_display = "id", "owner__username", "filename", "size", "received", "status", "time_added"
+    list_display_links = "id", "owner__username"
+    ordering = ("-time_added",)
+    list_per_page = 50
+    search_fields = "owner__username", "filename"
+    list_filter = ("status",)
@@ -0,0 +1,46 @@
+# Generated by Django 5.1.1 on 2026-10-18 05:29
+
+import uuid
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    initial = True
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="UploadSession",
+            fields=[
+                ("id", models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ("filename", models.CharField(max_length=255, verbose_name="File name")),
+                ("size", models.PositiveBigIntegerField(verbose_name="Size")),
+                ("received", models.PositiveBigIntegerField(default=0, verbose_name="Received bytes")),
+                (
+                    "status",
+                    models.CharField(
+                        choices=[("pending", "Pending"), ("complete", "Complete")], default="pending", max_length=10
+                    ),
+                ),
+                ("time_added", models.DateTimeField(auto_now_add=True)),
+                (
+                    "owner",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE, related_name="uploads", to=settings.AUTH_USER_MODEL
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "Upload session",
+                "verbose_name_plural": "Upload sessions",
+                "db_table": "upload_sessions",
+                "ordering": ("-time_added",),
+            },
+        ),
+    ]
@@ -0,0 +1,48 @@
+import os
+import uuid
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import models, transaction
+from django.db.models.signals import post_delete
+from django.dispatch.dispatcher import receiver
+from django.utils.translation import gettext_lazy as _
+
+User = get_user_model()
+
+
+class UploadSession(models.Model):
+    class Status(models.TextChoices):
+        PENDING = "pending", _("Pending")
+        COMPLETE = "complete", _("Complete")
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    owner = models.ForeignKey(User, related_name="uploads", on_delete=models.CASCADE)
+    filename = models.CharField(_("File name"), max_length=255)
+    size = models.PositiveBigIntegerField(_("Size"))
+    received = models.PositiveBigIntegerField(_("Received bytes"), default=0)
+    status = models.CharField(choices=Status.choices, max_length=10, default=Status.PENDING)
+    time_added = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ("-time_added",)
+        verbose_name = _("Upload session")
+        verbose_name_plural = _("Upload sessions")
+
+        db_table = "upload_sessions"
+
+    def __str__(self):
+        return f"Upload {self.pk} by {self.owner_id}"
+
+    @property
+    def part_path(self) -> str:
+        return os.path.join(settings.UPLOADS_TEMP_DIR, f"{self.pk}.part")
+
+
+@receiver(post_delete, sender=UploadSession)
+def upload_session_deleted(sender, instance, **kwargs):
+    def remove_part():
+        if os.path.exists(instance.part_path):
+            os.remove(instance.part_path)
+
+    transaction.on_commit(remove_part)
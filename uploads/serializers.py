@@ -0,0 +1,26 @@
+import os
+
+from django.conf import settings
+from rest_framework import serializers
+
+from uploads.models import UploadSession
+
+
+class UploadSessionSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = UploadSession
+        fields = "id", "filename", "size", "received", "status"
+        read_only_fields = "id", "received", "status"
+
+    def validate_filename(self, value):
+        value = os.path.basename(value)
+        if not value:
+            raise serializers.ValidationError("Invalid file name.", code="invalid")
+        return value
+
+    def validate_size(self, value):
+        if not 0 < value <= settings.UPLOADS_MAX_SIZE:
+            raise serializers.ValidationError(
+                f"Upload size must be between 1 and {settings.UPLOADS_MAX_SIZE} bytes.", code="invalid"
+            )
+        return value
@@ -0,0 +1,141 @@
+import contextlib
+import os
+import re
+import shutil
+import typing
+import uuid
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.files import File
+from django.db import transaction
+from django.shortcuts import get_object_or_404
+from django.utils import timezone
+from rest_framework import serializers
+
+from uploads.models import UploadSession
+
+User = get_user_model()
+
+CONTENT_RANGE_PATTERN = re.compile(r"^bytes (\d+)-(\d+)/(\d+)$")
+
+
+def parse_content_range(header: typing.Optional[str]) -> typing.Tuple[int, int, int]:
+    match = CONTENT_RANGE_PATTERN.match(header or "")
+    if not match:
+        raise serializers.ValidationError({"detail": "Invalid Content-Range header.", "code": "invalid"})
+
+    start, end, total = map(int, match.groups())
+    if end < start:
+        raise serializers.ValidationError({"detail": "Invalid Content-Range header.", "code": "invalid"})
+    return start, end, total
+
+
+def _copy_stream(stream: typing.BinaryIO, file: typing.BinaryIO, length: int) -> int:
+    remaining = length
+    while remaining:
+        chunk = stream.read(min(settings.UPLOADS_STREAM_BUFFER_SIZE, remaining))
+        if not chunk:
+            break
+        file.write(chunk)
+        remaining -= len(chunk)
+    return length - remaining
+
+
+def write_upload_chunk(
+    session_id: str, owner: User, stream: typing.BinaryIO, content_range: typing.Optional[str]
+) -> UploadSession:
+    return write_upload_range(session_id, owner, stream, *parse_content_range(content_range))
+
+
+def _check_upload_range(session: UploadSession, start: int, end: int, total: typing.Optional[int]) -> None:
+    if session.status != UploadSession.Status.PENDING:
+        raise serializers.ValidationError({"detail": "Upload is already finalized.", "code": "invalid"})
+    if total not in {None, session.size} or end >= session.size:
+        raise serializers.ValidationError({"detail": "Content-Range doesn't match upload size.", "code": "invalid"})
+    if start != session.received:
+        raise serializers.ValidationError({"detail": "Chunk must start at the received offset.", "code": "invalid"})
+
+
+def write_upload_range(
+    session_id: str, owner: User, stream: typing.BinaryIO, start: int, end: int, total: typing.Optional[int] = None
+) -> UploadSession:
+    length = end - start + 1
+    if length > settings.UPLOADS_MAX_CHUNK_SIZE:
+        raise serializers.ValidationError({"detail": "Chunk is too large.", "code": "invalid"})
+
+    session = get_object_or_404(UploadSession, pk=session_id, owner=owner)
+    _check_upload_range(session, start, end, total)
+
+    # Chunk is read from the client before the row is locked, so slow clients never hold a connection or a lock.
+    os.makedirs(settings.UPLOADS_TEMP_DIR, exist_ok=True)
+    chunk_path = f"{session.part_path}.{uuid.uuid4().hex}.chunk"
+    try:
+        with open(chunk_path, "wb") as chunk:
+            written = _copy_stream(stream, chunk, length)
+        if written != length:
+            raise serializers.ValidationError({"detail": "Chunk is shorter than its Content-Range.", "code": "invalid"})
+
+        with transaction.atomic():
+            session = get_object_or_404(UploadSession.objects.select_for_update(), pk=session_id, owner=owner)  # noqa
+            _check_upload_range(session, start, end, total)
+
+            with open(session.part_path, "r+b" if os.path.exists(session.part_path) else "wb") as file:
+                file.seek(start)
+                with open(chunk_path, "rb") as chunk:
+                    shutil.copyfileobj(chunk, file, settings.UPLOADS_STREAM_BUFFER_SIZE)
+                file.truncate()
+
+            session.received = end + 1
+            session.save(update_fields=("received",))
+    finally:
+        with contextlib.suppress(FileNotFoundError):
+            os.remove(chunk_path)
+
+    return session
+
+
+def finalize_upload(session: UploadSession) -> UploadSession:
+    if session.received != session.size:
+        raise serializers.ValidationError({"detail": "Upload isn't complete.", "code": "invalid"})
+
+    session.status = UploadSession.Status.COMPLETE
+    session.save(update_fields=("status",))
+    return session
+
+
+def _parse_upload_ids(upload_ids: typing.Iterable[str]) -> typing.List[uuid.UUID]:
+    try:
+        return [uuid.UUID(str(upload_id)) for upload_id in upload_ids]
+    except ValueError:
+        raise serializers.ValidationError({"detail": "Invalid upload id.", "code": "invalid"})
+
+
+def get_finished_uploads(owner: User, upload_ids: typing.Iterable[str]) -> typing.Dict[uuid.UUID, UploadSession]:
+    upload_ids = _parse_upload_ids(upload_ids)
+    sessions = UploadSession.objects.filter(  # noqa
+        owner=owner, pk__in=upload_ids, status=UploadSession.Status.COMPLETE
+    ).in_bulk()
+
+    if len(sessions) != len(set(upload_ids)):
+        raise serializers.ValidationError({"detail": "Unknown or unfinished upload.", "code": "invalid"})
+    return sessions
+
+
+@contextlib.contextmanager
+def open_finished_uploads(owner: User, upload_ids: typing.Iterable[str]) -> typing.Iterator[typing.List[File]]:
+    upload_ids = _parse_upload_ids(upload_ids)
+    sessions = get_finished_uploads(owner, upload_ids)
+    files = [File(open(sessions[pk].part_path, "rb"), name=sessions[pk].filename) for pk in upload_ids]
+    try:
+        yield files
+    finally:
+        for file in files:
+            file.close()
+
+    UploadSession.objects.filter(pk__in=sessions.keys()).delete()  # noqa
+
+
+def remove_expired_uploads() -> int:
+    expired = UploadSession.objects.filter(time_added__lt=timezone.now() - settings.UPLOADS_SESSION_LIFETIME)  # noqa
+    return expired.delete()[0]
@@ -0,0 +1,8 @@
+from celery import shared_task
+
+from uploads.services import remove_expired_uploads
+
+
+@shared_task
+def remove_expired_upload_sessions() -> None:
+    remove_expired_uploads()
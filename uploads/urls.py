@@ -0,0 +1,13 @@
+from django.urls import include, path
+from rest_framework.routers import SimpleRouter
+
+from uploads.views import UploadSessionViewSet
+
+app_name = "uploads"
+
+router = SimpleRouter()
+router.register(r"sessions", UploadSessionViewSet, basename="sessions")
+
+urlpatterns = [
+    path("", include(router.urls)),
+]
@@ -0,0 +1,84 @@
+import io
+
+from drf_spectacular.utils import OpenApiParameter, extend_schema, extend_schema_view
+from rest_framework import mixins, permissions, status, viewsets
+from rest_framework.decorators import action
+from rest_framework.request import Request
+from rest_framework.response import Response
+
+from uploads.models import UploadSession
+from uploads.serializers import UploadSessionSerializer
+from uploads.services import finalize_upload, write_upload_chunk
+from users.serializers import DetailedCodeSerializer
+
+
+@extend_schema_view(
+    create=extend_schema(
+        request=UploadSessionSerializer,
+        responses={
+            status.HTTP_201_CREATED: UploadSessionSerializer,
+            status.HTTP_400_BAD_REQUEST: DetailedCodeSerializer,
+        },
+        description="Endpoint to start a resumable upload.",
+    ),
+    retrieve=extend_schema(
+        request=None,
+        responses={status.HTTP_200_OK: UploadSessionSerializer, status.HTTP_404_NOT_FOUND: DetailedCodeSerializer},
+        description="Endpoint to get upload state. Resume the upload from 'received' bytes.",
+    ),
+    update=extend_schema(
+        request={"application/octet-stream": bytes},
+        parameters=[
+            OpenApiParameter(
+                name="Content-Range",
+                location=OpenApiParameter.HEADER,
+                description="Range of the chunk, e.g. 'bytes 0-1048575/5242880'. Must start at 'received' bytes.",
+                type=str,
+                required=True,
+            )
+        ],
+        responses={
+            status.HTTP_200_OK: UploadSessionSerializer,
+            status.HTTP_400_BAD_REQUEST: DetailedCodeSerializer,
+            status.HTTP_404_NOT_FOUND: DetailedCodeSerializer,
+        },
+        description="Endpoint to upload next chunk of file as raw body.",
+    ),
+    finalize=extend_schema(
+        request=None,
+        responses={
+            status.HTTP_200_OK: UploadSessionSerializer,
+            status.HTTP_400_BAD_REQUEST: DetailedCodeSerializer,
+            status.HTTP_404_NOT_FOUND: DetailedCodeSerializer,
+        },
+        description="Endpoint to finish upload. Finished upload id can be passed instead of file.",
+    ),
+    destroy=extend_schema(
+        request=None,
+        responses={status.HTTP_204_NO_CONTENT: None, status.HTTP_404_NOT_FOUND: DetailedCodeSerializer},
+        description="Endpoint to cancel upload.",
+    ),
+)
+class UploadSessionViewSet(
+    mixins.CreateModelMixin, mixins.RetrieveModelMixin, mixins.DestroyModelMixin, viewsets.GenericViewSet
+):
+    serializer_class = UploadSessionSerializer
+    permission_classes = (permissions.IsAuthenticated,)
+    lookup_url_kwarg = "id"
+
+    def get_queryset(self):
+        return UploadSession.objects.filter(owner=self.request.user)  # noqa
+
+    def perform_create(self, serializer):
+        serializer.save(owner=self.request.user)
+
+    def update(self, request: Request, id: str) -> Response:
+        session = write_upload_chunk(
+            id, request.user, request.stream or io.BytesIO(), request.headers.get("Content-Range")
+        )
+        return Response(self.get_serializer(session).data)
+
+    @action(methods=["post"], detail=True, url_name="finalize")
+    def finalize(self, request: Request, id: str) -> Response:
+        session = finalize_upload(self.get_object())
+        return Response(self.get_serializer(session).data)
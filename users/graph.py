@@ -0,0 +1,191 @@
+import enum
+import functools
+import threading
+import time
+import typing
+from collections import OrderedDict
+
+import redis
+from django.conf import settings
+
+from users.models import Follow
+
+# Marks a set as fully loaded from the database, so an empty graph still has a key and a set that only
+# received write-through updates is never mistaken for the complete one. User ids are never 0.
+LOADED_MARKER = 0
+
+
+class GraphDirection(enum.StrEnum):
+    FOLLOWING = "following"
+    FOLLOWERS = "followers"
+
+
+_DIRECTION_FIELDS = {
+    GraphDirection.FOLLOWING: ("follower_id", "following_id"),
+    GraphDirection.FOLLOWERS: ("following_id", "follower_id"),
+}
+
+
+class _LocalGraphCache:
+    def __init__(self, max_size: int, timeout: float):
+        self.max_size = max_size
+        self.timeout = timeout
+        self.__entries: OrderedDict[str, typing.Tuple[float, typing.FrozenSet[int]]] = OrderedDict()
+        self.__lock = threading.Lock()
+
+    def get(self, key: str) -> typing.Optional[typing.FrozenSet[int]]:
+        with self.__lock:
+            entry = self.__entries.get(key)
+            if entry is None:
+                return None
+            if entry[0] < time.monotonic():
+                del self.__entries[key]
+                return None
+            self.__entries.move_to_end(key)
+            return entry[1]
+
+    def set(self, key: str, ids: typing.FrozenSet[int]) -> None:
+        with self.__lock:
+            self.__entries[key] = (time.monotonic() + self.timeout, ids)
+            self.__entries.move_to_end(key)
+            while len(self.__entries) > self.max_size:
+                self.__entries.popitem(last=False)
+
+    def delete(self, *keys: str) -> None:
+        with self.__lock:
+            for key in keys:
+                self.__entries.pop(key, None)
+
+    def clear(self) -> None:
+        with self.__lock:
+            self.__entries.clear()
+
+
+local_cache = _LocalGraphCache(settings.SOCIAL_GRAPH_LOCAL_CACHE_SIZE, settings.SOCIAL_GRAPH_LOCAL_CACHE_TIME)
+
+
+@functools.cache
+def get_graph_client() -> redis.Redis:
+    return redis.Redis.from_url(settings.SOCIAL_GRAPH_REDIS_URL)
+
+
+def get_graph_cache_key(direction: GraphDirection, user_id: int) -> str:
+    sep = settings.USER_RELATED_CACHE_NAME_SEP
+    return f"{settings.SOCIAL_GRAPH_CACHE_NAME}{sep}{direction}{sep}{user_id}"
+
+
+def _load_from_database(direction: GraphDirection, user_ids: typing.List[int]) -> typing.Dict[int, typing.Set[int]]:
+    owner_field, member_field = _DIRECTION_FIELDS[direction]
+    graph = {user_id: set() for user_id in user_ids}
+    rows = Follow.objects.filter(**{owner_field + "__in": user_ids}).values_list(owner_field, member_field)  # noqa
+
+    for owner_id, member_id in rows:
+        graph[owner_id].add(member_id)
+
+    return graph
+
+
+def _get_ids_many(direction: GraphDirection, user_ids: typing.Iterable[int]) -> typing.Dict[int, typing.FrozenSet[int]]:
+    keys = {user_id: get_graph_cache_key(direction, user_id) for user_id in set(user_ids)}
+    graph = {}
+
+    for user_id, key in keys.items():
+        ids = local_cache.get(key)
+        if ids is not None:
+            graph[user_id] = ids
+
+    missing = [user_id for user_id in keys if user_id not in graph]
+    if not missing:
+        return graph
+
+    client = get_graph_client()
+    pipeline = client.pipeline(transaction=False)
+    for user_id in missing:
+        pipeline.smembers(keys[user_id])
+
+    not_loaded = []
+    for user_id, members in zip(missing, pipeline.execute()):
+        members = {int(member) for member in members}
+        if LOADED_MARKER not in members:
+            not_loaded.append(user_id)
+            continue
+        members.discard(LOADED_MARKER)
+        graph[user_id] = frozenset(members)
+
+    stale = set()
+    if not_loaded:
+        with client.pipeline(transaction=True) as pipeline:
+            # Write-through of a follow committed while the snapshot is read touches a watched set, so a removed
+            # id is never added back from the old snapshot.
+            pipeline.watch(*[keys[user_id] for user_id in not_loaded])
+            loaded = _load_from_database(direction, not_loaded)
+            pipeline.multi()
+            for user_id, members in loaded.items():
+                pipeline.sadd(keys[user_id], LOADED_MARKER, *members)
+                pipeline.expire(keys[user_id], settings.SOCIAL_GRAPH_CACHE_TIME)
+                graph[user_id] = frozenset(members)
+            try:
+                pipeline.execute()
+            except redis.WatchError:
+                stale.update(not_loaded)
+
+    for user_id in missing:
+        if user_id not in stale:
+            local_cache.set(keys[user_id], graph[user_id])
+
+    return graph
+
+
+def following_ids_many(user_ids: typing.Iterable[int]) -> typing.Dict[int, typing.FrozenSet[int]]:
+    return _get_ids_many(GraphDirection.FOLLOWING, user_ids)
+
+
+def follower_ids_many(user_ids: typing.Iterable[int]) -> typing.Dict[int, typing.FrozenSet[int]]:
+    return _get_ids_many(GraphDirection.FOLLOWERS, user_ids)
+
+
+def following_ids(user_id: int) -> typing.FrozenSet[int]:
+    return following_ids_many([user_id])[user_id]
+
+
+def follower_ids(user_id: int) -> typing.FrozenSet[int]:
+    return follower_ids_many([user_id])[user_id]
+
+
+def is_following(follower_id: int, following_id: int) -> bool:
+    return following_id in following_ids(follower_id)
+
+
+def is_following_many(follower_id: int, user_ids: typing.Iterable[int]) -> typing.Set[int]:
+    return following_ids(follower_id).intersection(user_ids)
+
+
+def _write_through(follower_id: int, following_id: int, add: bool) -> None:
+    following_key = get_graph_cache_key(GraphDirection.FOLLOWING, follower_id)
+    followers_key = get_graph_cache_key(GraphDirection.FOLLOWERS, following_id)
+    pipeline = get_graph_client().pipeline(transaction=True)
+
+    for key, member in ((following_key, following_id), (followers_key, follower_id)):
+        if add:
+            pipeline.sadd(key, member)
+        else:
+            pipeline.srem(key, member)
+        pipeline.expire(key, settings.SOCIAL_GRAPH_CACHE_TIME)
+
+    pipeline.execute()
+    local_cache.delete(following_key, followers_key)
+
+
+def add_follow_to_graph(follower_id: int, following_id: int) -> None:
+    _write_through(follower_id, following_id, add=True)
+
+
+def remove_follow_from_graph(follower_id: int, following_id: int) -> None:
+    _write_through(follower_id, following_id, add=False)
+
+
+def invalidate_follow_in_graph(follower_id: int, following_id: int) -> None:
+    following_key = get_graph_cache_key(GraphDirection.FOLLOWING, follower_id)
+    followers_key = get_graph_cache_key(GraphDirection.FOLLOWERS, following_id)
+    get_graph_client().delete(following_key, followers_key)
+    local_cache.delete(following_key, followers_key)
@@ -0,0 +1,258 @@
+import math
+import os
+import shutil
+import typing
+
+import numpy as np
+import PIL.Image
+from django.conf import settings
+from django.core.files import File
+from PIL import ExifTags, ImageOps
+from PIL.Image import Image, Resampling
+from PIL.Image import open as open_image
+from rest_framework import serializers
+
+from posts.services import get_image_hash_fields
+from users.services import (
+    PathImageTypeEnum,
+    get_processed_image_metadata,
+    get_stored_image_size,
+    get_upload_crop_path,
+    get_upload_derivative_path,
+)
+
+# Same pixel budget for uploads and for decoding in workers, twice of it raises instead of warning.
+PIL.Image.MAX_IMAGE_PIXELS = settings.IMAGE_MAX_PIXELS
+
+BASE83_ALPHABET = "0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz#$%*+,-.:;=?@[]^_{|}~"
+
+SAVE_OPTIONS = {
+    "webp": {"format": "WEBP", "quality": settings.IMAGE_DERIVATIVE_QUALITY, "method": 4},
+    "jpeg": {"format": "JPEG", "quality": settings.IMAGE_DERIVATIVE_QUALITY, "optimize": True, "progressive": True},
+}
+
+
+def get_media_path(path: str) -> str:
+    return str(settings.BASE_DIR / settings.MEDIA_ROOT / path)
+
+
+def open_downscaled(path: str, width: int) -> typing.Tuple[Image, typing.Tuple[int, int]]:
+    image = open_image(get_media_path(path))
+    # JPEG decoding skips DCT scales the widest derivative does not need, so huge originals are never decoded in full.
+    is_transposed = image.getexif().get(ExifTags.Base.Orientation, 1) in {5, 6, 7, 8}
+    size = image.size[::-1] if is_transposed else image.size
+    image.draft("RGB", (1, width) if is_transposed else (width, 1))
+    return ImageOps.exif_transpose(image).convert("RGB"), size
+
+
+def read_image_header(file: typing.BinaryIO) -> typing.Dict[str, typing.Any]:
+    # Pillow parses only the container headers on open, pixels are decoded lazily and never touched here.
+    position = file.tell()
+    try:
+        image = open_image(file, formats=settings.IMAGE_UPLOAD_FORMATS)
+        # EXIF is read from the header bytes, Pillow would load the whole image for it in some formats.
+        exif = PIL.Image.Exif()
+        if image.info.get("exif"):
+            exif.load(image.info["exif"])
+    finally:
+        file.seek(position)
+
+    is_transposed = exif.get(ExifTags.Base.Orientation, 1) in {5, 6, 7, 8}
+
+    width, height = image.size[::-1] if is_transposed else image.size
+    return {"format": image.format, "width": width, "height": height}
+
+
+def validate_image_upload(file: typing.Any) -> typing.Dict[str, int]:
+    if hasattr(file, "image_metadata"):
+        return file.image_metadata
+    if not isinstance(file, File):
+        raise serializers.ValidationError({"detail": "Image must be a file.", "code": "invalid"})
+    if file.size > settings.IMAGE_UPLOAD_MAX_SIZE:
+        raise serializers.ValidationError(
+            {"detail": f"Image must be at most {settings.IMAGE_UPLOAD_MAX_SIZE} bytes.", "code": "invalid"}
+        )
+
+    try:
+        header = read_image_header(file)
+    except PIL.Image.DecompressionBombError:
+        header = None
+    except (OSError, SyntaxError, ValueError):
+        raise serializers.ValidationError(
+            {"detail": f"Image must be one of {', '.join(settings.IMAGE_UPLOAD_FORMATS)}.", "code": "invalid"}
+        )
+
+    if header is None or header["width"] * header["height"] > settings.IMAGE_MAX_PIXELS:
+        raise serializers.ValidationError(
+            {"detail": f"Image must have at most {settings.IMAGE_MAX_PIXELS} pixels.", "code": "invalid"}
+        )
+
+    # Kept on the file, so dimensions are saved with the instance and the file isn't parsed again.
+    file.image_metadata = {"width": header["width"], "height": header["height"]}
+    return file.image_metadata
+
+
+def center_crop(image: Image) -> Image:
+    width, height = image.size
+    if width / height == 1:
+        return image
+
+    left = (width - min(width, height)) / 2
+    top = (height - min(width, height)) / 2
+    right = (width + min(width, height)) / 2
+    bottom = (height + min(width, height)) / 2
+
+    return image.crop((int(left), int(top), int(right), int(bottom)))
+
+
+def resize_to_width(image: Image, width: int) -> Image:
+    if image.width <= width:
+        return image
+    height = max(round(image.height * width / image.width), 1)
+    return image.resize((width, height), Resampling.LANCZOS, reducing_gap=3.0)
+
+
+def _encode_base83(value: int, length: int) -> str:
+    return "".join(BASE83_ALPHABET[value // 83 ** (length - index - 1) % 83] for index in range(length))
+
+
+def _srgb_to_linear(values: np.ndarray) -> np.ndarray:
+    values = values / 255
+    return np.where(values <= 0.04045, values / 12.92, ((values + 0.055) / 1.055) ** 2.4)
+
+
+def _linear_to_srgb(value: float) -> int:
+    value = min(max(value, 0.0), 1.0)
+    if value <= 0.0031308:
+        return int(value * 12.92 * 255 + 0.5)
+    return int((1.055 * value ** (1 / 2.4) - 0.055) * 255 + 0.5)
+
+
+def encode_placeholder(image: Image) -> str:
+    # BlurHash, so clients can decode placeholder with any of the standard decoders.
+    x_components, y_components = settings.IMAGE_PLACEHOLDER_COMPONENTS
+    pixels = _srgb_to_linear(np.asarray(image, dtype=np.float64))
+    height, width = pixels.shape[:2]
+
+    basis_y = np.cos(np.pi * np.outer(np.arange(y_components), np.arange(height)) / height)
+    basis_x = np.cos(np.pi * np.outer(np.arange(x_components), np.arange(width)) / width)
+    factors = np.einsum("jy,ix,yxc->jic", basis_y, basis_x, pixels) * 2 / (width * height)
+    factors[0, 0] /= 2
+    factors = factors.reshape(-1, 3)
+    dc, ac = factors[0], factors[1:]
+
+    placeholder = _encode_base83((x_components - 1) + (y_components - 1) * 9, 1)
+
+    max_value = 1.0
+    if len(ac):
+        quantised_max_value = max(0, min(82, math.floor(np.abs(ac).max() * 166 - 0.5)))
+        max_value = (quantised_max_value + 1) / 166
+        placeholder += _encode_base83(quantised_max_value, 1)
+    else:
+        placeholder += _encode_base83(0, 1)
+
+    red, green, blue = (_linear_to_srgb(value) for value in dc)
+    placeholder += _encode_base83((red << 16) + (green << 8) + blue, 4)
+
+    quantised = np.clip(np.floor(np.sign(ac) * np.sqrt(np.abs(ac / max_value)) * 9 + 9.5), 0, 18).astype(int)
+    for red, green, blue in quantised:
+        placeholder += _encode_base83(red * 19 * 19 + green * 19 + blue, 2)
+
+    return placeholder
+
+
+def get_dominant_color(image: Image) -> str:
+    palette_image = image.quantize(settings.IMAGE_DOMINANT_COLOR_PALETTE_SIZE)
+    _, index = max(palette_image.getcolors())
+    red, green, blue = palette_image.getpalette()[index * 3 : index * 3 + 3]
+    return f"#{red:02x}{green:02x}{blue:02x}"
+
+
+def compute_dhash(image: Image) -> int:
+    pixels = np.asarray(image.convert("L").resize((9, 8), Resampling.BOX), dtype=np.int16)
+    return int.from_bytes(np.packbits(pixels[:, 1:] > pixels[:, :-1]).tobytes(), "big")
+
+
+def compute_features(image: Image) -> np.ndarray:
+    hsv = np.asarray(image.convert("HSV")).reshape(-1, 3)
+    histogram, _ = np.histogramdd(hsv, bins=(8, 3, 3), range=((0, 256), (0, 256), (0, 256)))
+    histogram = np.sqrt(histogram.flatten() / histogram.sum())
+
+    luminance = np.asarray(image.convert("L").resize((8, 8), Resampling.BOX), dtype=np.float64).flatten()
+    luminance -= luminance.mean()
+    luminance_norm = np.linalg.norm(luminance)
+
+    features = np.concatenate((histogram / np.linalg.norm(histogram), luminance / (luminance_norm or 1)))
+    return (features / np.linalg.norm(features)).astype(np.float32)
+
+
+def read_image_features(image_path: str) -> np.ndarray:
+    image, _ = open_downscaled(image_path, settings.IMAGE_PLACEHOLDER_SIZE)
+    return compute_features(resize_to_width(image, settings.IMAGE_PLACEHOLDER_SIZE))
+
+
+def read_image_metadata(
+    image: Image, size: typing.Tuple[int, int], image_type: PathImageTypeEnum
+) -> typing.Dict[str, typing.Any]:
+    # Placeholder, color, hash and features share one small copy of the image decoded for derivatives.
+    small = resize_to_width(image, settings.IMAGE_PLACEHOLDER_SIZE)
+    metadata = {
+        "width": size[0],
+        "height": size[1],
+        "dominant_color": get_dominant_color(small),
+        "placeholder": encode_placeholder(small),
+    }
+    if image_type == PathImageTypeEnum.POST:
+        metadata.update(get_image_hash_fields(compute_dhash(small)))
+        metadata["features"] = compute_features(small)
+    return metadata
+
+
+def make_derivatives(image_path: str, image_type: PathImageTypeEnum) -> typing.Optional[typing.Dict[str, typing.Any]]:
+    if settings.DEFAULT_USER_AVATAR_PATH in image_path:
+        return None
+
+    metadata = get_processed_image_metadata(image_path, image_type)
+    if metadata is not None:
+        return metadata
+
+    max_width = max(settings.IMAGE_DERIVATIVE_SIZES.values())
+    image, source_size = open_downscaled(image_path, max_width)
+    # Dimensions are saved from the upload headers, only images stored before that take them from the source.
+    metadata = read_image_metadata(image, get_stored_image_size(image_path, image_type) or source_size, image_type)
+    resize_to_width(center_crop(image), max_width).save(get_media_path(get_upload_crop_path(image_path, image_type)))
+
+    saved = {}
+
+    # Widest first, so every smaller size is resampled from an already reduced image.
+    for size, width in sorted(settings.IMAGE_DERIVATIVE_SIZES.items(), key=lambda item: -item[1]):
+        resized = resize_to_width(image, width)
+        for image_format in settings.IMAGE_DERIVATIVE_FORMATS:
+            path = get_media_path(get_upload_derivative_path(image_path, image_type, size, image_format))
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            if resized is image and image_format in saved:
+                shutil.copyfile(saved[image_format], path)
+            else:
+                resized.save(path, **SAVE_OPTIONS[image_format])
+            saved[image_format] = path
+        image = resized
+
+    metadata["has_derivatives"] = True
+    return metadata
+
+
+def delete_derivatives(image_path: str) -> None:
+    image_type = next((image_type for image_type in PathImageTypeEnum if image_path.startswith(f"{image_type}/")), None)
+    if image_type is None:
+        return
+
+    paths = [get_upload_crop_path(image_path, image_type)]
+    for size in settings.IMAGE_DERIVATIVE_SIZES:
+        for image_format in settings.IMAGE_DERIVATIVE_FORMATS:
+            paths.append(get_upload_derivative_path(image_path, image_type, size, image_format))
+
+    for path in paths:
+        try:
+            os.remove(get_media_path(path))
+        except FileNotFoundError:
+            pass
@@ -0,0 +1,56 @@
+import os
+import typing
+from concurrent.futures import ProcessPoolExecutor
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from users.images import make_derivatives
+from users.services import PathImageTypeEnum, get_images_without_metadata, save_image_metadata
+
+
+def _make_derivatives(image_path: str, image_type: PathImageTypeEnum) -> typing.Optional[typing.Dict[str, typing.Any]]:
+    try:
+        return make_derivatives(image_path, image_type)
+    except OSError:
+        return None
+
+
+class Command(BaseCommand):
+    help = (
+        "Make derivatives and compute dimensions, dominant color, placeholder and hash of post images and avatars "
+        "which don't have them."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--workers", type=int, default=os.cpu_count())
+        parser.add_argument("--batch-size", type=int, default=settings.IMAGE_METADATA_BACKFILL_BATCH_SIZE)
+
+    def handle(self, *args, **options):
+        with ProcessPoolExecutor(max_workers=options["workers"]) as executor:
+            for image_type in PathImageTypeEnum:
+                processed, failed = self.backfill(executor, image_type, options["batch_size"])
+                self.stdout.write(
+                    self.style.SUCCESS(f"Processed {processed} images in '{image_type}', failed {failed} images.")
+                )
+
+    def backfill(
+        self, executor: ProcessPoolExecutor, image_type: PathImageTypeEnum, batch_size: int
+    ) -> typing.Tuple[int, int]:
+        processed = failed = 0
+        last_pk = 0
+
+        while batch := list(get_images_without_metadata(image_type).filter(pk__gt=last_pk)[:batch_size]):
+            last_pk = batch[-1][0]
+            paths = [str(path) for _, path in batch]
+
+            results = executor.map(_make_derivatives, paths, [image_type] * len(paths), chunksize=16)
+
+            for path, metadata in zip(paths, results):
+                if metadata is None:
+                    failed += 1
+                    continue
+                save_image_metadata(path, image_type, metadata)
+                processed += 1
+
+        return processed, failed
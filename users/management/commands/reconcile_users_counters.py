@@ -0,0 +1,15 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from users.services import reconcile_users_counters
+
+
+class Command(BaseCommand):
+    help = "Recalculate posts, followers and followings counters of users which drifted from real values."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=settings.COUNTERS_RECONCILE_BATCH_SIZE)
+
+    def handle(self, *args, **options):
+        repaired = reconcile_users_counters(options["batch_size"])
+        self.stdout.write(self.style.SUCCESS(f"Repaired counters of {repaired} users."))
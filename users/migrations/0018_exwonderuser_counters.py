@@ -0,0 +1,54 @@
+# Generated by Django 5.1.1 on 2026-10-18 04:57
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+
+
+def count_subquery(model, field):
+    count = model.objects.filter(**{field: OuterRef('pk')}).order_by().values(field).annotate(count=Count('pk'))
+    return Coalesce(Subquery(count.values('count')), Value(0))
+
+
+def fill_counters(apps, schema_editor):
+    ExwonderUser = apps.get_model('users', 'ExwonderUser')
+    Follow = apps.get_model('users', 'Follow')
+    Post = apps.get_model('posts', 'Post')
+
+    ExwonderUser.objects.update(
+        posts_count=count_subquery(Post, 'author'),
+        followers_count=count_subquery(Follow, 'following'),
+        followings_count=count_subquery(Follow, 'follower'),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auth', '0012_alter_user_first_name_max_length'),
+        ('posts', '0016_postlike_time_added_and_more'),
+        ('users', '0017_exwonderuser_comments_private_status'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='exwonderuser',
+            name='followers_count',
+            field=models.PositiveIntegerField(default=0, verbose_name='Followers count'),
+        ),
+        migrations.AddField(
+            model_name='exwonderuser',
+            name='followings_count',
+            field=models.PositiveIntegerField(default=0, verbose_name='Followings count'),
+        ),
+        migrations.AddField(
+            model_name='exwonderuser',
+            name='posts_count',
+            field=models.PositiveIntegerField(default=0, verbose_name='Posts count'),
+        ),
+        migrations.AddIndex(
+            model_name='exwonderuser',
+            index=models.Index(fields=['-followers_count', '-id'], name='user_followers_count_index'),
+        ),
+        migrations.RunPython(fill_counters, migrations.RunPython.noop),
+    ]
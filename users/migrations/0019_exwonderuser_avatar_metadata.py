@@ -0,0 +1,33 @@
+# Generated by Django 5.1.1 on 2026-10-18 05:33
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0018_exwonderuser_counters'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='exwonderuser',
+            name='avatar_dominant_color',
+            field=models.CharField(default='', max_length=7, verbose_name='Avatar dominant color'),
+        ),
+        migrations.AddField(
+            model_name='exwonderuser',
+            name='avatar_height',
+            field=models.PositiveIntegerField(blank=True, null=True, verbose_name='Avatar height'),
+        ),
+        migrations.AddField(
+            model_name='exwonderuser',
+            name='avatar_placeholder',
+            field=models.CharField(default='', max_length=64, verbose_name='Avatar placeholder'),
+        ),
+        migrations.AddField(
+            model_name='exwonderuser',
+            name='avatar_width',
+            field=models.PositiveIntegerField(blank=True, null=True, verbose_name='Avatar width'),
+        ),
+    ]
@@ -0,0 +1,20 @@
+# Generated by Django 5.1.1 on 2026-10-18 05:37
+
+import common.storage
+import users.models
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0019_exwonderuser_avatar_metadata'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='exwonderuser',
+            name='avatar',
+            field=models.ImageField(default='default-user-icon.jpg', storage=common.storage.ContentAddressedStorage(), upload_to=users.models.get_uploaded_avatar_path, verbose_name='Avatar'),
+        ),
+    ]
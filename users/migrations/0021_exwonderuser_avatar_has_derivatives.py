@@ -0,0 +1,18 @@
+# Generated by Django 5.1.1 on 2026-10-18 06:54
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0020_alter_exwonderuser_avatar'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='exwonderuser',
+            name='avatar_has_derivatives',
+            field=models.BooleanField(default=False, verbose_name='Avatar has derivatives'),
+        ),
+    ]
@@ -1,12 +1,19 @@
+import functools
 from typing import Optional
 
 from django.conf import settings
 from django.contrib.auth.models import AbstractBaseUser, BaseUserManager, PermissionsMixin
 from django.contrib.auth.validators import UnicodeUsernameValidator
 from django.core.validators import MinLengthValidator
-from django.db import models
+from django.db import models, transaction
+from django.db.models.signals import post_delete, post_save, pre_delete
+from django.dispatch.dispatcher import receiver
 from django.utils.translation import gettext_lazy as _
 
+from common.models import MediaBlob
+from common.services import increment_counter
+from common.storage import content_addressed_storage
+
 
 def get_uploaded_avatar_path(instance: Optional["ExwonderUser"] = None, filename: Optional[str] = None) -> str:
     return f"{settings.CUSTOM_USER_AVATARS_DIR}/{filename}"
@@ -64,8 +71,16 @@ class ExwonderUser(AbstractBaseUser, PermissionsMixin):
     name = models.CharField(verbose_name=_("Name"), max_length=32, default="")
     desc = models.CharField(verbose_name=_("Description"), max_length=1024, default="")
     avatar = models.ImageField(
-        verbose_name=_("Avatar"), upload_to=get_uploaded_avatar_path, default=settings.DEFAULT_USER_AVATAR_PATH
+        verbose_name=_("Avatar"),
+        upload_to=get_uploaded_avatar_path,
+        storage=content_addressed_storage,
+        default=settings.DEFAULT_USER_AVATAR_PATH,
     )
+    avatar_width = models.PositiveIntegerField(verbose_name=_("Avatar width"), null=True, blank=True)
+    avatar_height = models.PositiveIntegerField(verbose_name=_("Avatar height"), null=True, blank=True)
+    avatar_dominant_color = models.CharField(verbose_name=_("Avatar dominant color"), max_length=7, default="")
+    avatar_placeholder = models.CharField(verbose_name=_("Avatar placeholder"), max_length=64, default="")
+    avatar_has_derivatives = models.BooleanField(verbose_name=_("Avatar has derivatives"), default=False)
     timezone = models.CharField(verbose_name=_("Time zone"), max_length=64, default=settings.DEFAULT_USER_TIMEZONE)
     date_joined = models.DateTimeField(verbose_name=_("Date joined"), auto_now_add=True)
     penultimate_login = models.DateTimeField(verbose_name=_("Penultimate login"), blank=True, null=True)
@@ -80,6 +95,9 @@ class ExwonderUser(AbstractBaseUser, PermissionsMixin):
         default=False,
     )
     is_online = models.BooleanField(_("Is user online"), default=False)
+    posts_count = models.PositiveIntegerField(_("Posts count"), default=0)
+    followers_count = models.PositiveIntegerField(_("Followers count"), default=0)
+    followings_count = models.PositiveIntegerField(_("Followings count"), default=0)
 
     USERNAME_FIELD = "username"
     objects = ExwonderUserManager()
@@ -92,7 +110,10 @@ class ExwonderUser(AbstractBaseUser, PermissionsMixin):
 
         db_table = "exwonder_users"
 
-        indexes = (models.Index(fields=("username",), name="Username index"),)
+        indexes = (
+            models.Index(fields=("username",), name="Username index"),
+            models.Index(fields=("-followers_count", "-id"), name="user_followers_count_index"),
+        )
 
     def __str__(self):
         return f"{self.username}"
@@ -109,3 +130,48 @@ class Follow(models.Model):
 
     def __str__(self):
         return f"{self.follower.pk} following for {self.following.pk}"  # noqa
+
+
+def _sync_follow_graph(follower_id: int, following_id: int, add: bool) -> None:
+    from users.graph import add_follow_to_graph, invalidate_follow_in_graph, remove_follow_from_graph
+
+    # Inside a transaction cached sets are dropped, so its own reads see the change and a rollback leaves nothing.
+    if transaction.get_connection().in_atomic_block:
+        invalidate_follow_in_graph(follower_id, following_id)
+    write_through = add_follow_to_graph if add else remove_follow_from_graph
+    transaction.on_commit(functools.partial(write_through, follower_id, following_id))
+
+
+@receiver(post_save, sender=Follow)
+def follow_created(sender, instance, created, **kwargs):
+    if created:
+        increment_counter(ExwonderUser, instance.follower_id, "followings_count", 1)
+        increment_counter(ExwonderUser, instance.following_id, "followers_count", 1)
+        _sync_follow_graph(instance.follower_id, instance.following_id, add=True)
+
+
+@receiver(post_delete, sender=Follow)
+def follow_deleted(sender, instance, **kwargs):
+    increment_counter(ExwonderUser, instance.follower_id, "followings_count", -1)
+    increment_counter(ExwonderUser, instance.following_id, "followers_count", -1)
+    _sync_follow_graph(instance.follower_id, instance.following_id, add=False)
+
+
+@receiver(pre_delete, sender=ExwonderUser)
+def user_deleted(sender, instance, **kwargs):
+    from users.services import release_avatar
+
+    release_avatar(str(instance.avatar))
+
+
+def _delete_unreferenced_derivatives(name: str) -> None:
+    from users.images import delete_derivatives
+
+    if not MediaBlob.objects.filter(name=name).exists():  # noqa
+        delete_derivatives(name)
+
+
+@receiver(post_delete, sender=MediaBlob)
+def media_blob_deleted(sender, instance, **kwargs):
+    # Crops and derivatives are named after the original, so they go once no image references it.
+    transaction.on_commit(functools.partial(_delete_unreferenced_derivatives, instance.name))
@@ -6,35 +6,86 @@ from dj_rest_auth.serializers import PasswordResetSerializer as PasswordResetSer
 from django.conf import settings
 from django.contrib.auth import get_user_model
 from rest_framework import serializers
+from rest_framework.fields import SkipField
 
+from posts.services import add_author_posts_to_timeline
 from users.forms import PasswordResetForm
+from users.images import validate_image_upload
 from users.models import Follow
-from users.services import PathImageTypeEnum, get_upload_crop_path
-from users.tasks import make_center_crop
+from users.services import PathImageTypeEnum, get_image_srcset, get_upload_crop_path, release_avatar
+from users.tasks import make_image_derivatives
 
 User = get_user_model()
 
 
 class UserAvatarField(serializers.ImageField):
+    def to_internal_value(self, data):
+        # Only headers are parsed, unlike Django image field, which loads and verifies the whole image.
+        file = serializers.FileField.to_internal_value(self, data)
+        validate_image_upload(file)
+        return file
+
     def to_representation(self, value):
         media_url = urllib.parse.urljoin(settings.HOST, settings.MEDIA_URL)
         return urllib.parse.urljoin(media_url, get_upload_crop_path(str(value), PathImageTypeEnum.AVATAR))
 
 
+class FollowedField(serializers.BooleanField):
+    def __init__(self, user_field: typing.Optional[str] = None, **kwargs):
+        self.user_field = user_field
+        kwargs["read_only"] = True
+        super().__init__(**kwargs)
+
+    def get_attribute(self, instance):
+        followed_ids = self.context.get("followed_ids")
+        if followed_ids is None:
+            if self.allow_null:
+                return None
+            raise SkipField()
+
+        return (getattr(instance, f"{self.user_field}_id") if self.user_field else instance.pk) in followed_ids
+
+
+class ImageSrcsetField(serializers.ReadOnlyField):
+    def __init__(self, image_type: PathImageTypeEnum, image_field: str, ready_field: str, **kwargs):
+        self.image_type = image_type
+        self.image_field = image_field
+        self.ready_field = ready_field
+        super().__init__(source="*", **kwargs)
+
+    def to_representation(self, value):
+        # Derivatives are made by the images worker, until then clients fall back to the original image.
+        if not getattr(value, self.ready_field):
+            return None
+        return get_image_srcset(str(getattr(value, self.image_field)), self.image_type)
+
+
 class UserDefaultSerializer(serializers.ModelSerializer):
     avatar = UserAvatarField()
+    avatar_srcset = ImageSrcsetField(PathImageTypeEnum.AVATAR, "avatar", "avatar_has_derivatives")
 
     class Meta:
         model = User
-        fields = "id", "username", "avatar", "is_online"
+        fields = (
+            "id",
+            "username",
+            "avatar",
+            "avatar_srcset",
+            "avatar_width",
+            "avatar_height",
+            "avatar_dominant_color",
+            "avatar_placeholder",
+            "is_online",
+        )
 
 
 class UserCustomSerializer(serializers.ModelSerializer):
     avatar = UserAvatarField()
+    avatar_srcset = ImageSrcsetField(PathImageTypeEnum.AVATAR, "avatar", "avatar_has_derivatives")
     description = serializers.CharField(source="desc")
 
     posts_count = serializers.IntegerField()
-    is_followed = serializers.BooleanField()
+    is_followed = FollowedField(allow_null=True)
     followers_count = serializers.IntegerField()
     followings_count = serializers.IntegerField()
 
@@ -46,6 +97,11 @@ class UserCustomSerializer(serializers.ModelSerializer):
             "name",
             "description",
             "avatar",
+            "avatar_srcset",
+            "avatar_width",
+            "avatar_height",
+            "avatar_dominant_color",
+            "avatar_placeholder",
             "posts_count",
             "is_followed",
             "followers_count",
@@ -53,7 +109,6 @@ class UserCustomSerializer(serializers.ModelSerializer):
         )
         extra_kwargs = {
             "posts_count": {"allow_null": True},
-            "is_followed": {"allow_null": True},
             "followers_count": {"allow_null": True},
             "followings_count": {"allow_null": True},
         }
@@ -103,11 +158,19 @@ class UserDetailSerializer(serializers.ModelSerializer):
             is_private=validated_data.get("is_private", False),
         )
         user.set_password(validated_data["password"])
+        if "avatar" in validated_data:
+            avatar_size = validate_image_upload(validated_data["avatar"])
+            user.avatar_width, user.avatar_height = avatar_size["width"], avatar_size["height"]
         user.save()
+
+        if "avatar" in validated_data:
+            make_image_derivatives.apply_async(args=[str(user.avatar), PathImageTypeEnum.AVATAR], queue="images")
+
         return user
 
     def update(self, instance, validated_data):
         is_avatar_updated = validated_data.get("avatar", instance.avatar) != instance.avatar
+        avatar_before_update = str(instance.avatar)
         email_before_update = instance.email
 
         instance.email = validated_data.get("email", instance.email)
@@ -124,10 +187,17 @@ class UserDetailSerializer(serializers.ModelSerializer):
         if not validated_data.get("email") or len(validated_data.get("email")) == 0:
             instance.email = email_before_update
 
+        if is_avatar_updated:
+            avatar_size = validate_image_upload(validated_data["avatar"])
+            instance.avatar_width, instance.avatar_height = avatar_size["width"], avatar_size["height"]
+            instance.avatar_dominant_color = instance.avatar_placeholder = ""
+            instance.avatar_has_derivatives = False
+
         instance.save()
 
         if is_avatar_updated:
-            make_center_crop.apply_async(args=[str(instance.avatar), PathImageTypeEnum.AVATAR], queue="high_priority")
+            release_avatar(avatar_before_update)
+            make_image_derivatives.apply_async(args=[str(instance.avatar), PathImageTypeEnum.AVATAR], queue="images")
 
         return instance
 
@@ -161,14 +231,16 @@ class FollowingCreateSerializer(serializers.ModelSerializer):
         filter = Follow.objects.filter(follower=follower, following=following)  # noqa
 
         if not filter.exists():
-            return Follow.objects.create(follower=follower, following=following)  # noqa
+            follow = Follow.objects.create(follower=follower, following=following)  # noqa
+            add_author_posts_to_timeline(follower, following)
+            return follow
         return filter.first()
 
 
 class FollowerSerializer(serializers.ModelSerializer):
     follower = UserDefaultSerializer()
     posts_count = serializers.IntegerField()
-    is_followed = serializers.BooleanField()
+    is_followed = FollowedField("follower")
     followers_count = serializers.IntegerField()
     followings_count = serializers.IntegerField()
 
@@ -180,7 +252,7 @@ class FollowerSerializer(serializers.ModelSerializer):
 class FollowingSerializer(serializers.ModelSerializer):
     following = UserDefaultSerializer()
     posts_count = serializers.IntegerField()
-    is_followed = serializers.BooleanField()
+    is_followed = FollowedField("following")
     followers_count = serializers.IntegerField()
     followings_count = serializers.IntegerField()
 
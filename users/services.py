@@ -3,13 +3,19 @@ import os
 import secrets
 import string
 import typing
+import urllib.parse
 
 from django.conf import settings
 from django.contrib.auth import get_user_model
 from django.contrib.sessions.backends.base import SessionBase
-from django.db.models import Count, Exists, OuterRef, Q, QuerySet
+from django.db.models import F, Q, QuerySet
 from rest_framework.authtoken.models import Token
 
+from common.services import reconcile_counters, related_count_subquery
+from common.storage import content_addressed_storage
+from posts.models import Post, PostImage
+from posts.services import add_images_to_similar_index, get_image_features, get_image_hash_fields
+from users.graph import is_following_many
 from users.models import Follow
 
 User = get_user_model()
@@ -28,13 +34,103 @@ def make_2fa_authentication(session: SessionBase, user: User) -> str:
     return code
 
 
+def release_avatar(avatar_path: str) -> None:
+    # The default avatar is a static file shared by everyone, it is never referenced in the storage.
+    if avatar_path and settings.DEFAULT_USER_AVATAR_PATH not in avatar_path:
+        content_addressed_storage.delete(avatar_path)
+
+
 def get_upload_crop_path(path: str, image_type: PathImageTypeEnum) -> str:
     if settings.DEFAULT_USER_AVATAR_PATH in path:
         return path
 
-    file = os.path.basename(path)
+    directory, file = os.path.split(path)
     name, extension = file.rsplit(".", 1)
-    return os.path.join(image_type, f"{name}{settings.CROPPED_IMAGE_POSTFIX}.{extension}")
+    return os.path.join(directory or image_type, f"{name}{settings.CROPPED_IMAGE_POSTFIX}.{extension}")
+
+
+def get_upload_derivative_path(path: str, image_type: PathImageTypeEnum, size: str, image_format: str) -> str:
+    if settings.DEFAULT_USER_AVATAR_PATH in path:
+        return path
+
+    directory, file = os.path.split(path)
+    name = file.rsplit(".", 1)[0]
+    shards = directory.removeprefix(image_type).strip("/")
+    extension = settings.IMAGE_DERIVATIVE_FORMATS[image_format]
+    return os.path.join(image_type, settings.IMAGE_DERIVATIVES_DIR, shards, f"{name}_{size}.{extension}")
+
+
+def get_image_srcset(path: str, image_type: PathImageTypeEnum) -> typing.Dict[str, str]:
+    media_url = urllib.parse.urljoin(settings.HOST, settings.MEDIA_URL)
+    srcset = {}
+    for image_format in settings.IMAGE_DERIVATIVE_FORMATS:
+        urls = (
+            (urllib.parse.urljoin(media_url, get_upload_derivative_path(path, image_type, size, image_format)), width)
+            for size, width in settings.IMAGE_DERIVATIVE_SIZES.items()
+        )
+        srcset[image_format] = ", ".join(f"{url} {width}w" for url, width in urls)
+    return srcset
+
+
+def _get_image_source(image_type: PathImageTypeEnum) -> typing.Tuple[QuerySet, str, str]:
+    if image_type == PathImageTypeEnum.POST:
+        return PostImage.objects.all(), "image", ""  # noqa
+    return User.objects.exclude(avatar=settings.DEFAULT_USER_AVATAR_PATH), "avatar", "avatar_"
+
+
+def get_images_without_metadata(image_type: PathImageTypeEnum) -> QuerySet:
+    queryset, image_field, prefix = _get_image_source(image_type)
+    lookup = Q(**{f"{prefix}width__isnull": True}) | Q(**{f"{prefix}has_derivatives": False})
+    if image_type == PathImageTypeEnum.POST:
+        lookup |= Q(phash__isnull=True)
+    return queryset.filter(lookup).order_by("pk").values_list("pk", image_field)
+
+
+def get_stored_image_size(image_path: str, image_type: PathImageTypeEnum) -> typing.Optional[typing.Tuple[int, int]]:
+    queryset, image_field, prefix = _get_image_source(image_type)
+    queryset = queryset.filter(**{image_field: image_path, f"{prefix}width__isnull": False})
+    return queryset.values_list(f"{prefix}width", f"{prefix}height").first()
+
+
+def get_processed_image_metadata(
+    image_path: str, image_type: PathImageTypeEnum
+) -> typing.Optional[typing.Dict[str, typing.Any]]:
+    # Files are named by their content hash, so a processed instance with the same file already has its derivatives.
+    queryset, image_field, prefix = _get_image_source(image_type)
+    instance = queryset.filter(**{image_field: image_path, f"{prefix}has_derivatives": True}).first()
+    if instance is None:
+        return None
+
+    fields = ("width", "height", "dominant_color", "placeholder", "has_derivatives")
+    metadata = {field: getattr(instance, f"{prefix}{field}") for field in fields}
+    if image_type != PathImageTypeEnum.POST:
+        return metadata
+
+    features = get_image_features(instance.pk)
+    if instance.phash is None or features is None:
+        return None
+    return {**metadata, **get_image_hash_fields(instance.phash % 2**64), "features": features}
+
+
+def save_image_metadata(
+    image_path: str, image_type: PathImageTypeEnum, metadata: typing.Optional[typing.Dict[str, typing.Any]]
+) -> None:
+    if not metadata:
+        return
+
+    queryset, image_field, prefix = _get_image_source(image_type)
+    features = metadata.pop("features", None)
+    fields = {f"{prefix}{field}": value for field, value in metadata.items()}
+    instances = list(queryset.filter(**{image_field: image_path}))
+
+    # Saved one by one, so fragment cache versions of posts and authors are bumped by signals.
+    for instance in instances:
+        for field, value in fields.items():
+            setattr(instance, field, value)
+        instance.save(update_fields=list(fields))
+
+    if features is not None:
+        add_images_to_similar_index((instance.pk, instance.post_id, features) for instance in instances)
 
 
 def get_user_login_token(user: User) -> str:
@@ -43,36 +139,51 @@ def get_user_login_token(user: User) -> str:
     return token.key
 
 
-def annotate_users_queryset(user: User, queryset: QuerySet, fields: typing.Optional[typing.List] = None) -> QuerySet:
-    if not fields:
-        fields = ["posts_count", "is_followed", "followers_count", "followings_count"]
+def get_followed_ids(user: User, user_ids: typing.Iterable[int]) -> typing.Set[int]:
+    user = user[0] if isinstance(user, (list, tuple, QuerySet)) else user
+    if not user.is_authenticated:
+        return set()
+    return is_following_many(user.pk, user_ids)
 
-    annotate = {
-        "posts_count": Count("posts", distinct=True) if "posts_count" in fields else None,
-        "is_followed": Count("followers", distinct=True, filter=Q(followers__follower__pk=user.id))
-        if "is_followed" in fields
-        else None,
-        "followers_count": Count("followers", distinct=True) if "followers_count" in fields else None,
-        "followings_count": Count("following", distinct=True) if "followings_count" in fields else None,
-    }
 
-    queryset = queryset.annotate(**{key: value for key, value in annotate.items() if value})
+class ViewerFollowsStateMixin:
+    # Follow state is read from the social graph only for the serialized page, never inlined into the list query.
+    user_field = None
+
+    def get_serializer(self, *args, **kwargs):
+        if args and args[0] is not None:
+            instances = args[0] if kwargs.get("many") else [args[0]]
+            user_ids = [
+                getattr(instance, f"{self.user_field}_id") if self.user_field else instance.pk for instance in instances
+            ]
+            kwargs["context"] = self.get_serializer_context()  # noqa
+            kwargs["context"]["followed_ids"] = get_followed_ids(self.request.user, user_ids)  # noqa
+        return super().get_serializer(*args, **kwargs)  # noqa
+
 
-    return queryset.order_by("-id" if "followers_count" not in fields else "-followers_count")
+def annotate_users_queryset(queryset: QuerySet, fields: typing.Optional[typing.List] = None) -> QuerySet:
+    return queryset.order_by("-id" if fields and "followers_count" not in fields else "-followers_count")
 
 
 def annotate_follows_queryset(
-    user: User, queryset: QuerySet, mode: typing.Literal["follower"] | typing.Literal["following"]
+    queryset: QuerySet, mode: typing.Literal["follower"] | typing.Literal["following"]
 ) -> QuerySet:
-    user = user if isinstance(user, User) else user[0]
-    queryset = queryset.prefetch_related(mode)
+    queryset = queryset.select_related(mode)
     annotate = {
-        "posts_count": Count(mode + "__posts", distinct=True),
-        "is_followed": Exists(Follow.objects.filter(follower_id=user.pk, following_id=OuterRef(mode + "__pk"))),  # noqa
-        "followers_count": Count(mode + "__followers", distinct=True),
-        "followings_count": Count(mode + "__following", distinct=True),
+        "posts_count": F(mode + "__posts_count"),
+        "followers_count": F(mode + "__followers_count"),
+        "followings_count": F(mode + "__followings_count"),
     }
 
     queryset = queryset.annotate(**annotate)
 
     return queryset.order_by("-followers_count")
+
+
+def reconcile_users_counters(batch_size: int = 1000) -> int:
+    counters = {
+        "posts_count": related_count_subquery(Post, "author"),
+        "followers_count": related_count_subquery(Follow, "following"),
+        "followings_count": related_count_subquery(Follow, "follower"),
+    }
+    return reconcile_counters(User, counters, batch_size)
@@ -1,4 +1,3 @@
-import os
 import typing
 
 from celery import shared_task
@@ -8,10 +7,9 @@ from django.contrib.auth.forms import PasswordResetForm
 from django.core.mail import send_mail
 from django.template.loader import render_to_string
 from django.utils.html import strip_tags
-from PIL.Image import Image
-from PIL.Image import open as open_image
 
-from users.services import PathImageTypeEnum, get_upload_crop_path
+from users.images import make_derivatives
+from users.services import PathImageTypeEnum, save_image_metadata
 
 User = get_user_model()
 
@@ -55,22 +53,5 @@ def send_reset_password_mail(
 
 
 @shared_task
-def make_center_crop(image_path: str, image_type: PathImageTypeEnum) -> None:
-    image_full_path = str(settings.BASE_DIR / settings.MEDIA_ROOT / image_path)
-    image = open_image(os.path.join(image_full_path))
-    new_crop_image_path = str(settings.BASE_DIR / settings.MEDIA_ROOT / get_upload_crop_path(image_path, image_type))
-    _center_crop(image).save(new_crop_image_path)
-    return
-
-
-def _center_crop(img: Image) -> Image:
-    width, height = img.size
-    if width / height == 1:
-        return img
-
-    left = (width - min(width, height)) / 2
-    top = (height - min(width, height)) / 2
-    right = (width + min(width, height)) / 2
-    bottom = (height + min(width, height)) / 2
-
-    return img.crop((int(left), int(top), int(right), int(bottom)))
+def make_image_derivatives(image_path: str, image_type: PathImageTypeEnum) -> None:
+    save_image_metadata(image_path, image_type, make_derivatives(image_path, image_type))
@@ -9,6 +9,7 @@ from rest_framework.decorators import action
 from rest_framework.request import Request
 from rest_framework.response import Response
 
+from posts.services import remove_author_posts_from_timeline
 from users.models import Follow
 from users.permissions import UserPermission
 from users.serializers import (
@@ -25,8 +26,10 @@ from users.serializers import (
     UserDetailTimezonesSerializer,
 )
 from users.services import (
+    ViewerFollowsStateMixin,
     annotate_follows_queryset,
     annotate_users_queryset,
+    get_followed_ids,
     get_user_login_token,
     make_2fa_authentication,
 )
@@ -84,10 +87,11 @@ User = get_user_model()
         description="Endpoint to send 2FA code to log in.",
     ),
 )
-class UserViewSet(mixins.ListModelMixin, mixins.CreateModelMixin, viewsets.GenericViewSet):
+class UserViewSet(ViewerFollowsStateMixin, mixins.ListModelMixin, mixins.CreateModelMixin, viewsets.GenericViewSet):
     serializer_class = UserDetailSerializer
     queryset = User.objects.filter()
     permission_classes = (UserPermission,)
+    pagination_ordering = "-followers_count"
 
     def get_serializer_class(self, *args, **kwargs):
         if self.action == "list":  # noqa
@@ -98,9 +102,9 @@ class UserViewSet(mixins.ListModelMixin, mixins.CreateModelMixin, viewsets.Gener
         if self.action == "list":  # noqa
             query = self.request.query_params.get("search", "")
             if len(query) < 3:
-                return User.objects.none()
+                return annotate_users_queryset(User.objects.none())
             queryset = User.objects.filter(username__startswith=query, is_private=False)
-            return annotate_users_queryset(self.request.user, queryset)
+            return annotate_users_queryset(queryset)
 
         return self.queryset
 
@@ -202,6 +206,7 @@ class FollowingsViewSet(mixins.CreateModelMixin, viewsets.GenericViewSet):
 
         if follow.exists():
             follow.delete()
+            remove_author_posts_from_timeline(request.user, following)
 
             return Response(status=status.HTTP_204_NO_CONTENT)
         return Response(status=status.HTTP_400_BAD_REQUEST)
@@ -215,15 +220,17 @@ class FollowingsViewSet(mixins.CreateModelMixin, viewsets.GenericViewSet):
         description="Endpoint to get user followings and search it.",
     )
 )
-class FollowingsUserAPIView(generics.ListAPIView):
+class FollowingsUserAPIView(ViewerFollowsStateMixin, generics.ListAPIView):
     serializer_class = FollowingSerializer
+    user_field = "following"
     lookup_url_kwarg = "pk"
+    pagination_ordering = "-followers_count"
 
     def get_queryset(self):
         user = get_object_or_404(User, pk=self.kwargs[self.lookup_url_kwarg])
         query = self.request.query_params.get("search", None)
         queryset = user.following if not query else user.following.filter(following__username__startswith=query)
-        return annotate_follows_queryset(self.request.user, queryset, "following")
+        return annotate_follows_queryset(queryset, "following")
 
 
 @extend_schema_view(
@@ -235,13 +242,15 @@ class FollowingsUserAPIView(generics.ListAPIView):
         description="Endpoint to get your followers.",
     )
 )
-class FollowersViewSet(mixins.ListModelMixin, viewsets.GenericViewSet):
+class FollowersViewSet(ViewerFollowsStateMixin, mixins.ListModelMixin, viewsets.GenericViewSet):
     serializer_class = FollowerSerializer
+    user_field = "follower"
     permission_classes = (permissions.IsAuthenticated,)
+    pagination_ordering = "-followers_count"
 
     def get_queryset(self):
         queryset = self.request.user.followers
-        return annotate_follows_queryset(self.request.user, queryset, "follower")
+        return annotate_follows_queryset(queryset, "follower")
 
 
 class GetUserInfoAPIView(views.APIView):
@@ -271,8 +280,10 @@ class GetUserInfoAPIView(views.APIView):
         else:
             fields = None
 
-        queryset = annotate_users_queryset(request.user, queryset, fields)
-        user = queryset.first()
-        serialized_user = UserCustomSerializer(user)
+        user = annotate_users_queryset(queryset, fields).first()
+        context = {}
+        if user is not None and (not fields or "is_followed" in fields):
+            context["followed_ids"] = get_followed_ids(request.user, [user.pk])
+        serialized_user = UserCustomSerializer(user, context=context)
 
         return Response(serialized_user.data, status=status.HTTP_200_OK)